@@ -0,0 +1,281 @@
+"""
+asv benchmarks (https://asv.readthedocs.io/) for the main stages of
+regridding: cropping, deriving the lat/lon coordinates of the source data,
+creating the target grid and computing and applying the regridding weights.
+
+The `scipy` backend is used throughout so that the benchmarks can be run
+without ESMF. The in-memory caches are cleared before every benchmark so that
+everything is computed from scratch, for this the benchmarks which would
+otherwise hit a cache are only run once per sample (`number = 1`). Run with
+
+    $ asv run --quick --show-stderr
+
+or `asv dev` to use the current environment.
+"""
+import cartopy.crs as ccrs
+import numpy as np
+
+import regridcart as rc
+from regridcart.coords import get_latlon_coords_using_crs
+from regridcart.interpolation.common import get_source_grid
+from regridcart.transform import lonlat_to_xy, xy_to_lonlat
+
+from .data import (
+    CONVENTIONS,
+    SIZES,
+    TARGET_DOMAIN,
+    TARGET_DX,
+    clear_caches,
+    make_domain_data,
+    make_global_data,
+    make_source_data,
+)
+
+
+class Crop:
+    params = (CONVENTIONS, SIZES)
+    param_names = ["convention", "size"]
+
+    def setup(self, convention, size):
+        self.da = make_source_data(convention, size)
+        clear_caches()
+
+    def time_crop_field_to_domain(self, convention, size):
+        rc.crop_field_to_domain(domain=TARGET_DOMAIN, da=self.da)
+
+    def peakmem_crop_field_to_domain(self, convention, size):
+        rc.crop_field_to_domain(domain=TARGET_DOMAIN, da=self.da)
+
+
+class CropGlobal:
+    """
+    Cropping global lat/lon aligned data to a domain away from and crossing
+    the antimeridian (where the longitudes wrap around), which should cost
+    the same
+    """
+
+    params = ([-50.0, 180.0], [1440, 7200])
+    param_names = ["central_longitude", "n_lon"]
+
+    def setup(self, central_longitude, n_lon):
+        self.da = make_global_data(n_lon)
+        self.domain = rc.LocalCartesianDomain(
+            central_latitude=15.0,
+            central_longitude=central_longitude,
+            l_meridional=1000.0e3,
+            l_zonal=2000.0e3,
+        )
+
+    def time_crop_field_to_domain(self, central_longitude, n_lon):
+        rc.crop_field_to_domain(domain=self.domain, da=self.da).load()
+
+    def peakmem_crop_field_to_domain(self, central_longitude, n_lon):
+        rc.crop_field_to_domain(domain=self.domain, da=self.da).load()
+
+
+class CropSpatialIndex:
+    """
+    Cropping 2D lat/lon grids with a spatial index built once per source grid
+    (as when cropping many domains from the same grid)
+    """
+
+    params = SIZES
+    param_names = ["size"]
+
+    def setup(self, size):
+        self.da = make_source_data("latlon_aux", size)
+        self.spatial_index = rc.SpatialIndex(self.da)
+
+    def time_build_index(self, size):
+        rc.SpatialIndex(self.da)
+
+    def time_crop_field_to_domain(self, size):
+        rc.crop_field_to_domain(
+            domain=TARGET_DOMAIN, da=self.da, spatial_index=self.spatial_index
+        )
+
+
+class LatLonFromCRS:
+    params = (["cf_grid_mapping", "rioxarray"], SIZES)
+    param_names = ["convention", "size"]
+    number = 1
+    warmup_time = 0
+
+    def setup(self, convention, size):
+        self.da = make_source_data(convention, size)
+        clear_caches()
+
+    def time_get_latlon_coords_using_crs(self, convention, size):
+        get_latlon_coords_using_crs(da=self.da)
+
+    def peakmem_get_latlon_coords_using_crs(self, convention, size):
+        get_latlon_coords_using_crs(da=self.da)
+
+
+class TargetGrid:
+    # target grid resolutions (in meters) for the target domain
+    params = [10.0e3, 2.0e3, 1.0e3]
+    param_names = ["dx"]
+    number = 1
+    warmup_time = 0
+
+    def setup(self, dx):
+        clear_caches()
+
+    def time_get_grid(self, dx):
+        TARGET_DOMAIN.get_grid(dx=dx)
+
+    def peakmem_get_grid(self, dx):
+        TARGET_DOMAIN.get_grid(dx=dx)
+
+
+class Weights:
+    params = (CONVENTIONS, SIZES, ["bilinear", "nearest_s2d"])
+    param_names = ["convention", "size", "method"]
+    number = 1
+    warmup_time = 0
+    timeout = 300
+
+    def setup(self, convention, size, method):
+        self.da = make_source_data(convention, size)
+        clear_caches()
+
+    def time_regridder(self, convention, size, method):
+        rc.Regridder(
+            domain=TARGET_DOMAIN,
+            source_template=self.da,
+            dx=TARGET_DX,
+            method=method,
+            backend="scipy",
+        )
+
+    def peakmem_regridder(self, convention, size, method):
+        rc.Regridder(
+            domain=TARGET_DOMAIN,
+            source_template=self.da,
+            dx=TARGET_DX,
+            method=method,
+            backend="scipy",
+        )
+
+
+class ApplyWeights:
+    params = (CONVENTIONS, SIZES)
+    param_names = ["convention", "size"]
+
+    def setup(self, convention, size):
+        da = make_source_data(convention, size)
+        # a short time-series of fields on the same grid
+        self.da = da.expand_dims(time=8).copy()
+        self.regridder = rc.Regridder(
+            domain=TARGET_DOMAIN, source_template=da, dx=TARGET_DX, backend="scipy"
+        )
+
+    def time_apply(self, convention, size):
+        self.regridder(self.da)
+
+    def peakmem_apply(self, convention, size):
+        self.regridder(self.da)
+
+
+class Resample:
+    """
+    End-to-end resampling, without any cached state
+    """
+
+    params = (CONVENTIONS, SIZES)
+    param_names = ["convention", "size"]
+    number = 1
+    warmup_time = 0
+    timeout = 300
+
+    def setup(self, convention, size):
+        self.da = make_source_data(convention, size)
+        clear_caches()
+
+    def time_resample(self, convention, size):
+        rc.resample(domain=TARGET_DOMAIN, da=self.da, dx=TARGET_DX, backend="scipy")
+
+    def peakmem_resample(self, convention, size):
+        rc.resample(domain=TARGET_DOMAIN, da=self.da, dx=TARGET_DX, backend="scipy")
+
+    def time_source_grid(self, convention, size):
+        get_source_grid(da=self.da)
+
+
+class CartesianResample:
+    """
+    Resampling data already on the tangent plane of the target domain, which
+    skips the lat/lon coordinates and regridding weights
+    """
+
+    params = ([2.0e3, 1.0e3], ["bilinear", "conservative"])
+    param_names = ["source_dx", "method"]
+
+    def setup(self, source_dx, method):
+        self.da = make_domain_data(dx=source_dx)
+        clear_caches()
+
+    def time_resample(self, source_dx, method):
+        rc.resample(domain=TARGET_DOMAIN, da=self.da, dx=TARGET_DX, method=method)
+
+
+class TransformCoords:
+    """
+    Transforming the points of a grid (1e6 and 1e7 points) from the target
+    domain's projection to lat/lon, in closed form (as used by regridcart,
+    with numpy or numba) compared to cached pyproj transformers and cartopy's
+    `transform_points`
+    """
+
+    params = [1000, 3163]
+    param_names = ["n"]
+
+    def setup(self, n):
+        self.crs = TARGET_DOMAIN.crs
+        self.x = np.linspace(-1.0e6, 1.0e6, n)
+        self.y = np.linspace(-0.5e6, 0.5e6, n)
+        # compile the numba kernels before timing
+        with rc.set_options(laea_engine="numba"):
+            xy_to_lonlat(x=self.x[:4], y=self.y[:4], crs=self.crs)
+            lonlat_to_xy(lon=self.x[:4] * 1.0e-5, lat=self.y[:4] * 1.0e-5, crs=self.crs)
+
+    def time_cartopy_transform_points(self, n):
+        ccrs.PlateCarree().transform_points(self.crs, *np.meshgrid(self.x, self.y))
+
+    def peakmem_cartopy_transform_points(self, n):
+        ccrs.PlateCarree().transform_points(self.crs, *np.meshgrid(self.x, self.y))
+
+    def time_xy_to_lonlat(self, n):
+        xy_to_lonlat(x=self.x[None, :], y=self.y[:, None], crs=self.crs)
+
+    def time_xy_to_lonlat_numba(self, n):
+        with rc.set_options(laea_engine="numba"):
+            xy_to_lonlat(x=self.x[None, :], y=self.y[:, None], crs=self.crs)
+
+    def time_xy_to_lonlat_proj(self, n):
+        with rc.set_options(laea_engine="proj"):
+            xy_to_lonlat(x=self.x[None, :], y=self.y[:, None], crs=self.crs)
+
+    def time_lonlat_to_xy(self, n):
+        lonlat_to_xy(
+            lon=self.x[None, :] * 1.0e-5, lat=self.y[:, None] * 1.0e-5, crs=self.crs
+        )
+
+    def time_lonlat_to_xy_proj(self, n):
+        with rc.set_options(laea_engine="proj"):
+            lonlat_to_xy(
+                lon=self.x[None, :] * 1.0e-5, lat=self.y[:, None] * 1.0e-5, crs=self.crs
+            )
+
+    def peakmem_xy_to_lonlat(self, n):
+        xy_to_lonlat(x=self.x[None, :], y=self.y[:, None], crs=self.crs)
+
+    def peakmem_xy_to_lonlat_float32(self, n):
+        xy_to_lonlat(
+            x=self.x[None, :], y=self.y[:, None], crs=self.crs, dtype=np.float32
+        )
+
+    def time_latlon_from_xy_small(self, n):
+        # per-call overhead, e.g. when transforming the corners of a domain
+        TARGET_DOMAIN.latlon_from_xy(x=self.x[:4], y=self.y[:4])
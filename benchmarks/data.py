@@ -0,0 +1,164 @@
+"""
+Synthetic source data for the benchmarks, covering each of the ways the
+lat/lon positions of the source data can be given (see `rc.resample`). All
+the data covers roughly the same region of the tropical Atlantic so that the
+same target domain can be used with each
+"""
+import cartopy.crs as ccrs
+import numpy as np
+import xarray as xr
+
+import regridcart as rc
+
+CONVENTIONS = ["latlon_aligned", "latlon_aux", "cf_grid_mapping", "rioxarray"]
+
+# number of source grid points along each horizontal direction
+SIZES = [200, 1000, 3000]
+
+# extent of the source data in degrees
+LAT_RANGE = (5.0, 25.0)
+LON_RANGE = (-70.0, -30.0)
+
+GEOSTATIONARY_HEIGHT = 35786023.0
+GEOSTATIONARY_LON = -75.0
+
+TARGET_DOMAIN = rc.LocalCartesianDomain(
+    central_latitude=15.0,
+    central_longitude=-50.0,
+    l_meridional=1000.0e3,
+    l_zonal=2000.0e3,
+)
+TARGET_DX = 10.0e3
+
+
+def _values(ny, nx):
+    y, x = np.meshgrid(np.linspace(0, 1, ny), np.linspace(0, 1, nx), indexing="ij")
+    return np.sin(10.0 * x) * np.cos(6.0 * y)
+
+
+def _make_latlon_aligned(n):
+    lat = np.linspace(*LAT_RANGE, n)
+    lon = np.linspace(*LON_RANGE, n)
+    return xr.DataArray(
+        _values(n, n), dims=("lat", "lon"), coords=dict(lat=lat, lon=lon), name="phi"
+    )
+
+
+def _make_latlon_aux(n):
+    # grid rotated relative to lat/lon so that the lat/lon positions of every
+    # point must be given
+    x, y = np.meshgrid(np.linspace(-1, 1, n), np.linspace(-1, 1, n))
+    theta = np.deg2rad(20.0)
+    lat_c, lon_c = np.mean(LAT_RANGE), np.mean(LON_RANGE)
+    lon = lon_c + 18.0 * (np.cos(theta) * x - np.sin(theta) * y)
+    lat = lat_c + 9.0 * (np.sin(theta) * x + np.cos(theta) * y)
+    return xr.DataArray(
+        _values(n, n),
+        dims=("y", "x"),
+        coords=dict(lat=(("y", "x"), lat), lon=(("y", "x"), lon)),
+        name="phi",
+    )
+
+
+def _geostationary_xy(n):
+    crs = ccrs.Geostationary(
+        central_longitude=GEOSTATIONARY_LON,
+        satellite_height=GEOSTATIONARY_HEIGHT,
+        sweep_axis="x",
+    )
+    corners = crs.transform_points(
+        ccrs.PlateCarree(), np.array(LON_RANGE), np.array(LAT_RANGE)
+    )
+    x = np.linspace(corners[0, 0], corners[1, 0], n)
+    y = np.linspace(corners[1, 1], corners[0, 1], n)
+    return x, y
+
+
+def _make_cf_grid_mapping(n):
+    x, y = _geostationary_xy(n)
+    da_proj = xr.DataArray(
+        0,
+        attrs=dict(
+            grid_mapping_name="geostationary",
+            perspective_point_height=GEOSTATIONARY_HEIGHT,
+            semi_major_axis=6378137.0,
+            semi_minor_axis=6356752.31414,
+            longitude_of_projection_origin=GEOSTATIONARY_LON,
+            latitude_of_projection_origin=0.0,
+            sweep_angle_axis="x",
+        ),
+    )
+    return xr.DataArray(
+        _values(n, n),
+        dims=("y", "x"),
+        coords=dict(x=x, y=y, goes_imager_projection=da_proj),
+        attrs=dict(grid_mapping="goes_imager_projection"),
+        name="phi",
+    )
+
+
+def _make_rioxarray(n):
+    import rioxarray  # noqa
+
+    x, y = _geostationary_xy(n)
+    da = xr.DataArray(_values(n, n), dims=("y", "x"), coords=dict(x=x, y=y), name="phi")
+    return da.rio.write_crs(
+        f"+proj=geos +h={GEOSTATIONARY_HEIGHT} +lon_0={GEOSTATIONARY_LON}"
+        " +sweep=x +ellps=GRS80"
+    )
+
+
+def make_source_data(convention, n):
+    """
+    Create a `n` x `n` source data-array using coordinate `convention`
+    """
+    fn = dict(
+        latlon_aligned=_make_latlon_aligned,
+        latlon_aux=_make_latlon_aux,
+        cf_grid_mapping=_make_cf_grid_mapping,
+        rioxarray=_make_rioxarray,
+    )[convention]
+    return fn(n)
+
+
+def make_global_data(n):
+    """
+    Create a global `n/2` x `n` data-array aligned with lat/lon, with
+    longitudes from -180 to 180
+    """
+    lat = -90.0 + (np.arange(n // 2) + 0.5) * 360.0 / n
+    lon = -180.0 + np.arange(n) * 360.0 / n
+    return xr.DataArray(
+        _values(lat.size, lon.size),
+        dims=("lat", "lon"),
+        coords=dict(lat=lat, lon=lon),
+        name="phi",
+    )
+
+
+def make_domain_data(dx):
+    """
+    Create a data-array on the tangent plane of `TARGET_DOMAIN` at resolution
+    `dx` (as produced by a model run on the domain)
+    """
+    ds_grid = TARGET_DOMAIN.get_grid(dx=dx)
+    da = xr.DataArray(
+        _values(ds_grid.y.size, ds_grid.x.size),
+        dims=("y", "x"),
+        coords=dict(x=ds_grid.x, y=ds_grid.y),
+    )
+    return da.assign_coords(lat=ds_grid.lat, lon=ds_grid.lon)
+
+
+def clear_caches():
+    """
+    Clear all the in-memory caches so that the benchmarks measure computing
+    everything from scratch
+    """
+    from regridcart.coords import latlon_coords_cache
+    from regridcart.domain import grid_cache
+    from regridcart.interpolation import weights_cache
+    from regridcart.interpolation.backends.scipy import kdtree_cache
+
+    for cache in [latlon_coords_cache, grid_cache, weights_cache, kdtree_cache]:
+        cache.clear()
@@ -1,5 +1,51 @@
-from .cropping import crop_field_to_domain
-from .domain import CartesianDomain, LocalCartesianDomain, deserialise_domain  # noqa
-from .interpolation import resample
+import importlib
 
 __version__ = "0.1.0"
+
+# the public functions and classes are imported from their submodules on first
+# access (rather than when regridcart is imported) so that importing
+# regridcart is fast, e.g. for command-line use
+_LAZY_ATTRS = dict(
+    crop_field_to_domain="cropping",
+    SpatialIndex="cropping",
+    CartesianDomain="domain",
+    LocalCartesianDomain="domain",
+    deserialise_domain="domain",
+    instrument="instrumentation",
+    Regridder="interpolation",
+    resample="interpolation",
+    resample_many="interpolation",
+    set_options="options",
+    resample_to_store="streaming",
+)
+
+_SUBMODULES = [
+    "batch",
+    "cache",
+    "coords",
+    "cropping",
+    "crs",
+    "domain",
+    "instrumentation",
+    "interpolation",
+    "options",
+    "streaming",
+]
+
+__all__ = list(_LAZY_ATTRS)
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRS:
+        module = importlib.import_module(f".{_LAZY_ATTRS[name]}", __name__)
+        value = getattr(module, name)
+    elif name in _SUBMODULES:
+        value = importlib.import_module(f".{name}", __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | set(_SUBMODULES))
@@ -0,0 +1,332 @@
+"""
+Regridding of large collections of files onto a single domain, spreading the
+work over a pool of processes. Available both as a python function
+(`regrid_files`) and on the command line:
+
+    $ regridcart "data/*.nc" --domain domain.json --dx 1000 --output-dir out/
+
+where `domain.json` contains a domain as returned by `domain.serialize()`
+"""
+import argparse
+import glob
+import json
+import os
+import tempfile
+import traceback
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import xarray as xr
+
+from .domain import deserialise_domain
+from .interpolation import resample
+from .interpolation.common import _get_variable
+from .options import OPTIONS, set_options
+
+BatchResult = namedtuple("BatchResult", ["input_path", "output_path", "error"])
+
+RASTER_SUFFIXES = [".tif", ".tiff"]
+
+
+def open_input(path, variable=None):
+    """
+    Open the data-array to regrid from `path`, either a raster file (opened
+    with rioxarray) or a file readable by `xr.open_dataset`. If the file
+    contains more than one variable the one to regrid must be given with
+    `variable`
+    """
+    if Path(path).suffix.lower() in RASTER_SUFFIXES:
+        import rioxarray
+
+        da = rioxarray.open_rasterio(path)
+        if "band" in da.dims and da.band.size == 1:
+            da = da.squeeze("band", drop=True)
+        if variable is not None:
+            da.name = variable
+        return da
+
+    ds = xr.open_dataset(path)
+    if variable is None:
+        auxiliary_vars = _auxiliary_variables(ds)
+        data_vars = [v for v in ds.data_vars if v not in auxiliary_vars]
+        if len(data_vars) != 1:
+            raise ValueError(
+                f"`{path}` contains more than one variable"
+                f" ({', '.join(data_vars)}), please select the one to regrid"
+            )
+        variable = data_vars[0]
+    return _get_variable(ds, variable)
+
+
+def _auxiliary_variables(ds):
+    """
+    Names of the variables in `ds` which describe the grid of other variables
+    (CF grid-mapping and cell bounds variables) rather than being data
+    """
+    names = set()
+    for var in ds.variables.values():
+        for attr in ["grid_mapping", "bounds"]:
+            if isinstance(var.attrs.get(attr), str):
+                names.add(var.attrs[attr])
+    names |= {v for v in ds.variables if "grid_mapping_name" in ds[v].attrs}
+    return names
+
+
+def output_path_for(path, output_dir):
+    return Path(output_dir) / f"{Path(path).stem}.nc"
+
+
+def _write_atomic(ds, path):
+    # write to a temporary file first so that a file which fails part-way
+    # through writing isn't left behind looking complete
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-", suffix=".nc")
+    os.close(fd)
+    try:
+        ds.to_netcdf(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if Path(tmp_path).exists():
+            Path(tmp_path).unlink()
+
+
+def _init_worker(options):
+    set_options(**options)
+
+
+def _regrid_file(path, output_path, domain_data, dx, method, backend, variable):
+    """
+    Regrid a single file, returning a `BatchResult`. Any exception raised is
+    caught and returned (formatted) as `BatchResult.error` so that one bad
+    file doesn't abort the whole batch.
+
+    The regridding weights (and target grids) are cached in-memory in each
+    worker process, so files on the same source grid only have the weights
+    computed once per worker
+    """
+    try:
+        domain = deserialise_domain(domain_data)
+        da = open_input(path, variable=variable)
+        da_regridded = resample(
+            domain=domain,
+            da=da,
+            dx=dx,
+            method=method,
+            backend=backend,
+            keep_attrs=True,
+        )
+        if da_regridded.name is None:
+            da_regridded.name = variable or "data"
+        # the projection of the target grid isn't serialisable to netCDF, and
+        # the grid-mapping of the source data doesn't apply to the new grid
+        da_regridded.attrs.pop("crs", None)
+        grid_mapping = da_regridded.attrs.pop("grid_mapping", None)
+        if grid_mapping in da_regridded.coords:
+            da_regridded = da_regridded.drop_vars(grid_mapping)
+        ds_regridded = da_regridded.to_dataset()
+        ds_regridded.attrs["domain"] = json.dumps(domain_data)
+        _write_atomic(ds_regridded.load(), output_path)
+    except Exception:
+        return BatchResult(
+            input_path=path, output_path=None, error=traceback.format_exc()
+        )
+    return BatchResult(input_path=path, output_path=output_path, error=None)
+
+
+def regrid_files(
+    paths,
+    domain,
+    dx,
+    output_dir,
+    method="bilinear",
+    backend="scipy",
+    variable=None,
+    n_workers=None,
+    overwrite=False,
+):
+    """
+    Regrid each of the files in `paths` onto `domain` at resolution `dx`,
+    writing the regridded data to netCDF files (with the same name as the
+    input files) in `output_dir`. Files for which the output already exists
+    are skipped unless `overwrite=True`.
+
+    The files are regridded by a pool of `n_workers` processes (`None` to use
+    the current process), the current regridcart options (see
+    `rc.set_options`) are used in every worker. Returns a `BatchResult` for
+    each of the input files, in the same order as `paths`, with the error
+    (formatted traceback) for files that failed to be regridded, including
+    files which crashed the worker process regridding them. A `ValueError`
+    is raised if two input files would be written to the same output file.
+    """
+    output_dir = Path(output_dir)
+
+    # inputs with the same name (e.g. in different directories) would be
+    # written to the same output file
+    inputs_by_output = {}
+    for path in paths:
+        output_path = output_path_for(path, output_dir=output_dir)
+        inputs_by_output.setdefault(output_path, set()).add(str(path))
+    duplicates = [
+        sorted(inputs) for inputs in inputs_by_output.values() if len(inputs) > 1
+    ]
+    if len(duplicates) > 0:
+        raise ValueError(
+            "Some of the input files would be written to the same output file:"
+            f" {', '.join(' and '.join(inputs) for inputs in duplicates)}"
+        )
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    domain_data = domain.serialize()
+
+    tasks = []
+    results = {}
+    for path in paths:
+        output_path = output_path_for(path, output_dir=output_dir)
+        if output_path.exists() and not overwrite:
+            results[path] = BatchResult(
+                input_path=path, output_path=output_path, error=None
+            )
+        else:
+            tasks.append((path, output_path))
+
+    kwargs = dict(
+        domain_data=domain_data,
+        dx=dx,
+        method=method,
+        backend=backend,
+        variable=variable,
+    )
+    if n_workers is None:
+        for path, output_path in tasks:
+            results[path] = _regrid_file(path, output_path, **kwargs)
+    else:
+        max_workers = n_workers
+        while len(tasks) > 0:
+            results_pool, lost = _regrid_in_pool(tasks, max_workers, kwargs)
+            results.update(results_pool)
+            if len(lost) > 0 and max_workers == 1:
+                # with a single worker the files are regridded in order, so
+                # the first file without a result is the one which crashed
+                # the worker
+                path, _, error = lost.pop(0)
+                results[path] = BatchResult(
+                    input_path=path, output_path=None, error=error
+                )
+                max_workers = n_workers
+            elif len(lost) > 0:
+                # rerun the files which didn't complete one at a time to find
+                # the file which crashed the worker
+                max_workers = 1
+            tasks = [(path, output_path) for (path, output_path, _) in lost]
+
+    return [results[path] for path in paths]
+
+
+def _regrid_in_pool(tasks, n_workers, kwargs):
+    """
+    Regrid the files in `tasks` with a pool of `n_workers` processes,
+    returning the `BatchResult` for each file and a list of the tasks (with
+    the formatted error) which were lost because a worker crashed (e.g. was
+    killed for running out of memory), which breaks the pool
+    """
+    results = {}
+    lost = []
+    with ProcessPoolExecutor(
+        max_workers=n_workers, initializer=_init_worker, initargs=(dict(OPTIONS),)
+    ) as executor:
+        futures = [
+            (
+                path,
+                output_path,
+                executor.submit(_regrid_file, path, output_path, **kwargs),
+            )
+            for (path, output_path) in tasks
+        ]
+        for path, output_path, future in futures:
+            try:
+                results[path] = future.result()
+            except BrokenProcessPool:
+                lost.append((path, output_path, traceback.format_exc()))
+    return results, lost
+
+
+def _parse_domain(s):
+    if Path(s).exists():
+        with open(s) as fh:
+            return deserialise_domain(json.load(fh))
+    return deserialise_domain(json.loads(s))
+
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(
+        prog="regridcart",
+        description="Regrid a collection of files onto a cartesian domain",
+    )
+    argparser.add_argument(
+        "inputs", nargs="+", help="input files (or glob patterns) to regrid"
+    )
+    argparser.add_argument(
+        "--domain",
+        required=True,
+        help="domain to regrid onto, either as a path to a JSON file or a JSON"
+        " string (as returned by `domain.serialize()`)",
+    )
+    argparser.add_argument(
+        "--dx", type=float, required=True, help="grid resolution [m]"
+    )
+    argparser.add_argument("--output-dir", default=".", type=Path)
+    argparser.add_argument("--method", default="bilinear")
+    argparser.add_argument(
+        "--backend",
+        default="scipy",
+        help="regridding backend (`scipy`, `xesmf` or `pyresample`)",
+    )
+    argparser.add_argument(
+        "--variable", default=None, help="variable to regrid from each file"
+    )
+    argparser.add_argument(
+        "--n-workers",
+        type=int,
+        default=None,
+        help="number of worker processes to use (default: use a single process)",
+    )
+    argparser.add_argument("--overwrite", action="store_true", default=False)
+    argparser.add_argument(
+        "--cache-dir", default=None, help="directory to cache regridding weights in"
+    )
+    args = argparser.parse_args(argv)
+
+    paths = []
+    for pattern in args.inputs:
+        matches = sorted(glob.glob(pattern))
+        if len(matches) == 0:
+            raise FileNotFoundError(f"No files found matching `{pattern}`")
+        paths += matches
+
+    if args.cache_dir is not None:
+        set_options(cache_dir=args.cache_dir)
+
+    results = regrid_files(
+        paths=paths,
+        domain=_parse_domain(args.domain),
+        dx=args.dx,
+        output_dir=args.output_dir,
+        method=args.method,
+        backend=args.backend,
+        variable=args.variable,
+        n_workers=args.n_workers,
+        overwrite=args.overwrite,
+    )
+
+    failed = [r for r in results if r.error is not None]
+    for result in failed:
+        print(f"Failed to regrid `{result.input_path}`:\n{result.error}")
+    print(f"Regridded {len(results) - len(failed)} of {len(results)} files")
+
+    return 1 if len(failed) > 0 else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,303 @@
+"""
+Caching of intermediate results which are expensive to compute (for example
+regridding weights), identified by a fingerprint of the inputs used to compute
+them
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import zipfile
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+from .options import OPTIONS
+
+# errors raised when reading a file from the cache directory which has been
+# evicted by another process since it was looked up, or which is truncated or
+# corrupt (for example if a process writing to a network filesystem was
+# killed), all of these are treated as cache misses
+READ_ERRORS = (
+    OSError,
+    EOFError,
+    ValueError,
+    KeyError,
+    pickle.UnpicklingError,
+    zipfile.BadZipFile,
+)
+
+
+def _update_hash(h, item):
+    if isinstance(item, xr.Dataset):
+        for name in sorted(item.variables):
+            h.update(str(name).encode())
+            _update_hash(h, item[name])
+    elif isinstance(item, xr.DataArray):
+        h.update(str(item.dims).encode())
+        _update_hash(h, item.values)
+    elif isinstance(item, np.ndarray):
+        arr = np.ascontiguousarray(item)
+        h.update(f"{arr.dtype.str}{arr.shape}".encode())
+        if arr.dtype.hasobject:
+            h.update(repr(arr.tolist()).encode())
+        else:
+            h.update(arr.data)
+    elif isinstance(item, (list, tuple)):
+        h.update(f"{type(item).__name__}{len(item)}".encode())
+        for v in item:
+            _update_hash(h, v)
+    elif isinstance(item, dict):
+        _update_hash(h, sorted(item.items()))
+    else:
+        h.update(repr(item).encode())
+
+
+def fingerprint(*items):
+    """
+    Compute a hex-digest which identifies the content of `items`, these may be
+    xarray Datasets/DataArrays, numpy arrays or builtin python types. For a
+    DataArray only the dimension names and the values (including their type
+    and shape) are used, not its coordinates or attributes. For a Dataset
+    every variable (including the coordinates) is used in this way
+    """
+    h = hashlib.sha1()
+    for item in items:
+        _update_hash(h, item)
+    return h.hexdigest()
+
+
+CacheInfo = namedtuple(
+    "CacheInfo", ["hits", "misses", "maxsize", "maxbytes", "currsize", "currbytes"]
+)
+
+
+class LRUCache:
+    """
+    In-memory mapping from keys to values from which the least-recently-used
+    entries are removed once there are more than `maxsize` entries or the
+    entries take up more than `maxbytes` bytes in total (either limit may be
+    `None` to not apply it). The limits can be changed on an existing cache by
+    setting the `maxsize` and `maxbytes` attributes, and usage statistics
+    (useful for tuning the limits) are returned by `info()`
+    """
+
+    def __init__(self, maxsize=None, maxbytes=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._currbytes = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                self._misses += 1
+                return default
+            self._hits += 1
+            self._entries.move_to_end(key)
+            value, _ = self._entries[key]
+            return value
+
+    def put(self, key, value, nbytes=0):
+        with self._lock:
+            if key in self._entries:
+                _, nbytes_old = self._entries.pop(key)
+                self._currbytes -= nbytes_old
+            self._entries[key] = (value, nbytes)
+            self._currbytes += nbytes
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > 0 and (
+            (self.maxsize is not None and len(self._entries) > self.maxsize)
+            or (self.maxbytes is not None and self._currbytes > self.maxbytes)
+        ):
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self._currbytes -= nbytes
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(
+                hits=self._hits,
+                misses=self._misses,
+                maxsize=self.maxsize,
+                maxbytes=self.maxbytes,
+                currsize=len(self._entries),
+                currbytes=self._currbytes,
+            )
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._currbytes = 0
+            self._hits = 0
+            self._misses = 0
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskCache:
+    """
+    A directory of files (one per key) from which the least-recently-used
+    files are removed once the total size exceeds `max_bytes`.
+
+    Files are first written to a temporary file in the cache directory and
+    then atomically moved into place, so that several processes can safely
+    share the same cache directory: a file is either complete or absent.
+    Because another process may evict a file at any time, callers should
+    treat a file which has disappeared between `get` and reading it the same
+    as a cache miss (as `get_or_compute` does).
+    """
+
+    _tmp_prefix = ".tmp-"
+
+    def __init__(self, path, max_bytes=None, suffix=".nc"):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+
+    def filepath(self, key):
+        return self.path / f"{key}{self.suffix}"
+
+    def get(self, key):
+        """
+        Return the path of the file stored for `key` (or `None` if there
+        isn't one), marking it as recently used
+        """
+        fp = self.filepath(key)
+        try:
+            os.utime(fp)
+        except FileNotFoundError:
+            return None
+        return fp
+
+    def put(self, key, write_fn):
+        """
+        Store a new file for `key`, `write_fn` is called with the (temporary)
+        path that the content should be written to
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        fd, tmp_fp = tempfile.mkstemp(
+            dir=self.path, prefix=self._tmp_prefix, suffix=self.suffix
+        )
+        os.close(fd)
+        fp = self.filepath(key)
+        try:
+            write_fn(tmp_fp)
+            os.replace(tmp_fp, fp)
+        finally:
+            if Path(tmp_fp).exists():
+                Path(tmp_fp).unlink()
+
+        self.evict()
+        return fp
+
+    def get_or_compute(self, key, compute_fn, load_fn, dump_fn):
+        """
+        Get the value stored for `key` by loading it with `load_fn(path)`, or
+        if there isn't one (or it can't be read) compute it with
+        `compute_fn()` and store it with `dump_fn(value, path)`
+        """
+        fp = self.get(key)
+        if fp is not None:
+            try:
+                return load_fn(fp)
+            except READ_ERRORS:
+                pass
+
+        value = compute_fn()
+        self.put(key, lambda filename: dump_fn(value, filename))
+        return value
+
+    def evict(self):
+        """
+        Remove least-recently-used files until the total size of the cache is
+        below `max_bytes`
+        """
+        if self.max_bytes is None:
+            return
+
+        entries = []
+        for fp in self.path.glob(f"*{self.suffix}"):
+            if fp.name.startswith(self._tmp_prefix):
+                continue
+            try:
+                stat = fp.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, fp))
+
+        total_bytes = sum(size for (_, size, _) in entries)
+        for _, size, fp in sorted(entries, key=lambda e: e[0]):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                fp.unlink()
+            except FileNotFoundError:
+                # already removed by another process
+                pass
+            total_bytes -= size
+
+    def clear(self):
+        for fp in self.path.glob(f"*{self.suffix}"):
+            try:
+                fp.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def get_disk_cache(name, suffix):
+    """
+    Get the `DiskCache` in subdirectory `name` of the cache directory (set
+    with `regridcart.set_options(cache_dir=...)`), or `None` if no cache
+    directory is set
+    """
+    if OPTIONS["cache_dir"] is None:
+        return None
+    return DiskCache(
+        path=Path(OPTIONS["cache_dir"]) / name,
+        max_bytes=OPTIONS["cache_max_bytes"],
+        suffix=suffix,
+    )
+
+
+def get_or_compute(
+    key,
+    compute_fn,
+    memory_cache,
+    disk_cache=None,
+    load_fn=None,
+    dump_fn=None,
+    nbytes_fn=None,
+):
+    """
+    Get the value for `key` from `memory_cache` (a `LRUCache`), else from
+    `disk_cache` (a `DiskCache`, if given, read and written with `load_fn`
+    and `dump_fn`, see `DiskCache.get_or_compute`) or else by computing it
+    with `compute_fn()`. Values not found in `memory_cache` are added to it,
+    with their size in bytes given by `nbytes_fn(value)`
+    """
+    value = memory_cache.get(key)
+    if value is not None:
+        return value
+
+    if disk_cache is None:
+        value = compute_fn()
+    else:
+        value = disk_cache.get_or_compute(
+            key, compute_fn=compute_fn, load_fn=load_fn, dump_fn=dump_fn
+        )
+
+    nbytes = nbytes_fn(value) if nbytes_fn is not None else 0
+    memory_cache.put(key, value, nbytes=nbytes)
+    return value
@@ -7,15 +7,14 @@ import cartopy.crs as ccrs
 import numpy as np
 import xarray as xr
 
+from .cache import LRUCache, fingerprint, get_disk_cache, get_or_compute
 from .crs import NoProjectionInformationFound, parse_cf
+from .transform import xy_to_lonlat
 
-try:
-    # ensures xr.DataArray.rio is available
-    import rioxarray  # noqa
-
-    HAS_RIO = True
-except ImportError:
-    HAS_RIO = False
+# in-memory cache of lat/lon coordinates computed from projection information,
+# so that the projection of a fixed grid (e.g. from a geostationary satellite)
+# is only calculated once
+latlon_coords_cache = LRUCache(maxsize=8, maxbytes=1024 ** 3)
 
 
 def has_latlon_coords(da):
@@ -29,6 +28,19 @@ def on_latlon_aligned_grid(da):
     return len(da.lat.shape) == 1 and len(da.lon.shape)
 
 
+def _has_rio_accessor():
+    """
+    Import rioxarray (if installed), which registers the `.rio` accessor on
+    xarray objects. This is done on first use rather than when regridcart is
+    imported as rioxarray is slow to import
+    """
+    try:
+        import rioxarray  # noqa
+    except ImportError:
+        return False
+    return True
+
+
 def parse_crs(da):
     """
     Get the lat/lon coordinate positions using projection information stored in
@@ -44,7 +56,7 @@ def parse_crs(da):
 
     # second, if the data was loaded with rioxarray there may be a `crs`
     # attribute available that way
-    if crs is None and hasattr(da, "rio"):
+    if crs is None and _has_rio_accessor() and da.rio.crs is not None:
         crs_rio = getattr(da.rio, "crs")
         # rio returns its own projection class type, let's turn it into a
         # cartopy projection
@@ -57,29 +69,193 @@ def parse_crs(da):
     return crs
 
 
-def get_latlon_coords_using_crs(da, x_coord="x", y_coord="y"):
+def _crs_key(crs):
+    if hasattr(crs, "to_wkt"):
+        return crs.to_wkt()
+    return str(crs)
+
+
+def _compute_latlon_values(crs, x, y, dtype=np.float64):
+    lons, lats = xy_to_lonlat(x=x[None, :], y=y[:, None], crs=crs, dtype=dtype)
+    return np.ascontiguousarray(lats), np.ascontiguousarray(lons)
+
+
+def _load_latlon_values(filename):
+    with np.load(filename) as data:
+        return data["lat"], data["lon"]
+
+
+def _dump_latlon_values(values, filename):
+    with open(filename, "wb") as fh:
+        np.savez(fh, lat=values[0], lon=values[1])
+
+
+def _get_latlon_values(crs, x, y, dtype=np.float64):
+    """
+    Get the lat/lon positions (with type `dtype`) of the grid points `(x, y)`
+    in projection `crs` either from the in-memory cache, the cache directory
+    on disk (if `regridcart.set_options(cache_dir=...)` is set) or by
+    computing them
+    """
+    key = fingerprint(_crs_key(crs), x, y, np.dtype(dtype).str)
+    values = get_or_compute(
+        key,
+        compute_fn=lambda: _compute_latlon_values(crs=crs, x=x, y=y, dtype=dtype),
+        memory_cache=latlon_coords_cache,
+        disk_cache=get_disk_cache("coords", suffix=".npz"),
+        load_fn=_load_latlon_values,
+        dump_fn=_dump_latlon_values,
+        nbytes_fn=lambda values: sum(arr.nbytes for arr in values),
+    )
+
+    # the arrays are shared between calls, so we make sure they aren't
+    # changed in-place
+    for arr in values:
+        arr.flags.writeable = False
+    return values
+
+
+def get_latlon_coords_using_crs(da, x_coord="x", y_coord="y", dtype=np.float64):
     """
     Get the lat/lon coordinate positions using projection information stored in
-    a xarray.DataArray
+    a xarray.DataArray. The computed positions are cached (keyed on the
+    projection and the x/y coordinate values) so that they are only computed
+    once for a given grid. The positions are returned with type `dtype` (use
+    `np.float32` to halve the memory used for large grids)
     """
     crs = parse_crs(da)
 
     if crs is None:
         raise NoProjectionInformationFound
 
-    latlon = ccrs.PlateCarree().transform_points(
-        crs,
-        *np.meshgrid(da[x_coord].values, da[y_coord].values),
-    )[:, :, :2]
+    lats, lons = _get_latlon_values(
+        crs=crs, x=da[x_coord].values, y=da[y_coord].values, dtype=dtype
+    )
     da_lat = xr.DataArray(
-        latlon[..., 1],
+        lats,
         dims=(y_coord, x_coord),
         coords={x_coord: da[x_coord], y_coord: da[y_coord]},
     )
     da_lon = xr.DataArray(
-        latlon[..., 0],
+        lons,
         dims=(y_coord, x_coord),
         coords={x_coord: da[x_coord], y_coord: da[y_coord]},
     )
 
     return dict(lat=da_lat, lon=da_lon)
+
+
+def _infer_bounds_1d(c):
+    """
+    Edges of the cells centered on the 1D positions `c`, taken half-way
+    between the cell centres and extrapolated at the ends
+    """
+    c = np.asarray(c, dtype=np.float64)
+    if c.size < 2:
+        raise ValueError("At least two grid points are needed to infer cell bounds")
+    c_mid = 0.5 * (c[1:] + c[:-1])
+    return np.concatenate([[2.0 * c[0] - c_mid[0]], c_mid, [2.0 * c[-1] - c_mid[-1]]])
+
+
+def _infer_corners_2d(c):
+    """
+    Corner positions (shape `(N0+1, N1+1)`) of the cells centred on the 2D
+    positions `c` (shape `(N0, N1)`), given by the mean of the (linearly
+    extrapolated at the edges) four cell centres sharing each corner
+    """
+    c = np.asarray(c, dtype=np.float64)
+    if c.shape[0] < 2 or c.shape[1] < 2:
+        raise ValueError("At least two grid points are needed to infer cell bounds")
+    n0, n1 = c.shape
+    c_ext = np.empty((n0 + 2, n1 + 2))
+    c_ext[1:-1, 1:-1] = c
+    c_ext[0, 1:-1] = 2.0 * c[0] - c[1]
+    c_ext[-1, 1:-1] = 2.0 * c[-1] - c[-2]
+    c_ext[:, 0] = 2.0 * c_ext[:, 1] - c_ext[:, 2]
+    c_ext[:, -1] = 2.0 * c_ext[:, -2] - c_ext[:, -3]
+    return 0.25 * (c_ext[:-1, :-1] + c_ext[1:, :-1] + c_ext[:-1, 1:] + c_ext[1:, 1:])
+
+
+def _cf_bounds_to_edges(bounds):
+    # CF bounds for 1D coordinates have shape (N, 2)
+    bounds = np.asarray(bounds)
+    return np.concatenate([bounds[:, 0], bounds[-1:, 1]])
+
+
+def _cf_bounds_to_corners(bounds):
+    # CF bounds for 2D coordinates have shape (N0, N1, 4) with the vertices
+    # given counter-clockwise starting from the (i, j) corner
+    bounds = np.asarray(bounds)
+    n0, n1, _ = bounds.shape
+    corners = np.empty((n0 + 1, n1 + 1), dtype=bounds.dtype)
+    corners[:-1, :-1] = bounds[..., 0]
+    corners[:-1, -1] = bounds[:, -1, 1]
+    corners[-1, -1] = bounds[-1, -1, 2]
+    corners[-1, :-1] = bounds[-1, :, 3]
+    return corners
+
+
+def _cf_bounds(da, coord, ds):
+    name = da[coord].attrs.get("bounds")
+    if ds is not None and name is not None and name in ds.variables:
+        return ds.variables[name].values
+    return None
+
+
+def get_latlon_bounds(da, x_coord="x", y_coord="y", ds=None):
+    """
+    Get the lat/lon positions of the corners of the grid cells of `da` (as
+    `lat_b` and `lon_b`, as used for conservative regridding). These are taken
+    from the CF-compliant bounds variables of the `lat` and `lon` coordinates
+    (if `da` comes from dataset `ds` which contains them), computed exactly
+    from the projection information of `da` or otherwise inferred from the
+    cell centres.
+
+    For lat/lon aligned grids `lat_b` and `lon_b` are 1D (with dimensions
+    `lat_b` and `lon_b`), otherwise they are 2D with dimensions named after
+    the grid dimensions (suffixed with `_b`) in the same order as `lon`
+    """
+    if has_latlon_coords(da) and on_latlon_aligned_grid(da):
+        bounds = {}
+        for c in ["lat", "lon"]:
+            cf_bounds = _cf_bounds(da, c, ds=ds)
+            if cf_bounds is not None:
+                values = _cf_bounds_to_edges(cf_bounds)
+            else:
+                values = _infer_bounds_1d(da[c].values)
+            bounds[f"{c}_b"] = xr.DataArray(values, dims=(f"{c}_b",))
+        return bounds
+
+    if has_latlon_coords(da):
+        dims = da.lon.dims
+        bounds = {}
+        for c in ["lat", "lon"]:
+            cf_bounds = _cf_bounds(da, c, ds=ds)
+            if cf_bounds is not None:
+                # the bounds are assumed to be given with the grid dimensions
+                # first, in the same order as the coordinate itself
+                if da[c].dims != dims:
+                    cf_bounds = np.swapaxes(cf_bounds, 0, 1)
+                values = _cf_bounds_to_corners(cf_bounds)
+            else:
+                values = da[c].transpose(*dims).values
+                if c == "lon":
+                    # avoid averaging across the dateline
+                    values = np.rad2deg(
+                        np.unwrap(np.unwrap(np.deg2rad(values), axis=0), axis=1)
+                    )
+                values = _infer_corners_2d(values)
+            bounds[f"{c}_b"] = xr.DataArray(values, dims=tuple(f"{d}_b" for d in dims))
+        return bounds
+
+    crs = parse_crs(da)
+    if crs is None:
+        raise NoProjectionInformationFound
+
+    x_b = _infer_bounds_1d(da[x_coord].values)
+    y_b = _infer_bounds_1d(da[y_coord].values)
+    lats, lons = _get_latlon_values(crs=crs, x=x_b, y=y_b)
+    dims = (f"{y_coord}_b", f"{x_coord}_b")
+    return dict(
+        lat_b=xr.DataArray(lats, dims=dims), lon_b=xr.DataArray(lons, dims=dims)
+    )
@@ -5,10 +5,18 @@ from .coords import (
     get_latlon_coords_using_crs,
     has_latlon_coords,
     on_latlon_aligned_grid,
+    parse_crs,
 )
+from .transform import transform
 
 
-def crop_field_to_bbox(da, x_range, y_range, pad_pct=0.1, x_dim="x", y_dim="y"):
+def _bbox_indexers(da, x_range, y_range, pad_pct=0.1, x_dim="x", y_dim="y"):
+    """
+    Get the integer-index slices along `x_dim` and `y_dim` which select the
+    region of `da` within `x_range` and `y_range` (given in the coordinate
+    values along `x_dim` and `y_dim`), padded by `pad_pct` of the range on
+    either side
+    """
     if x_dim not in da.dims or y_dim not in da.dims:
         raise Exception(
             f"The coordinates selected for cropping (`{x_dim}` and `{y_dim}`)"
@@ -27,23 +35,31 @@ def crop_field_to_bbox(da, x_range, y_range, pad_pct=0.1, x_dim="x", y_dim="y"):
     x_max += pad_pct * lx
     y_max += pad_pct * ly
 
-    # handle coordinates that aren't monotonically increasing
-    if da[x_dim][0] > da[x_dim][-1]:
-        x_slice = slice(x_max, x_min)
-    else:
-        x_slice = slice(x_min, x_max)
+    indexers = {}
+    for dim, v_min, v_max in [(x_dim, x_min, x_max), (y_dim, y_min, y_max)]:
+        index = da.get_index(dim)
+        # handle coordinates that aren't monotonically increasing
+        if index[0] > index[-1]:
+            indexers[dim] = index.slice_indexer(v_max, v_min)
+        else:
+            indexers[dim] = index.slice_indexer(v_min, v_max)
 
-    if da[y_dim][0] > da[y_dim][-1]:
-        y_slice = slice(y_max, y_min)
-    else:
-        y_slice = slice(y_min, y_max)
+        if len(range(da[dim].size)[indexers[dim]]) == 0:
+            raise DomainBoundsOutsideOfInputException
 
-    da_cropped = da.sel({x_dim: x_slice, y_dim: y_slice})
+    return indexers
 
-    if da_cropped[x_dim].count() == 0 or da_cropped[y_dim].count() == 0:
-        raise DomainBoundsOutsideOfInputException
 
-    return da_cropped
+def crop_field_to_bbox(da, x_range, y_range, pad_pct=0.1, x_dim="x", y_dim="y"):
+    indexers = _bbox_indexers(
+        da=da,
+        x_range=x_range,
+        y_range=y_range,
+        pad_pct=pad_pct,
+        x_dim=x_dim,
+        y_dim=y_dim,
+    )
+    return da.isel(indexers)
 
 
 class DomainBoundsOutsideOfInputException(Exception):
@@ -51,7 +67,7 @@ class DomainBoundsOutsideOfInputException(Exception):
 
 
 def _has_spatial_coord(da, c):
-    return c in da and da[c].attrs.get("units") == "m"
+    return c in da.coords and da[c].attrs.get("units") == "m"
 
 
 def _latlon_box_adjust_sigfigs(bbox, decimals=2):
@@ -71,34 +87,112 @@ def _latlon_box_adjust_sigfigs(bbox, decimals=2):
     return bbox_truncated
 
 
-def _crop_with_latlon_aligned_crid(domain, da, pad_pct):
+def _is_periodic_lon(lons):
+    """
+    Check whether the (ascending) longitudes `lons` cover the whole globe, so
+    that they wrap around from the last to the first
+    """
+    if lons.size < 2 or np.any(np.diff(lons) <= 0.0):
+        return False
+    dlon = (lons[-1] - lons[0]) / (lons.size - 1)
+    return lons[-1] - lons[0] + dlon >= 360.0 - 0.5 * dlon
+
+
+def _wrapped_lon_indexer(lons, lon_min, lon_max):
+    """
+    Get the indexer selecting the longitudes `lons` (ascending and covering
+    the whole globe) between `lon_min` and `lon_max`, which may cross the
+    seam where `lons` wrap around (e.g. the antimeridian for longitudes in
+    -180 to 180, or the Greenwich meridian for 0 to 360). Returns a slice if
+    the selected longitudes are contiguous, otherwise an integer array
+    selecting the longitudes east of `lon_min` up to the seam followed by
+    those from the seam up to `lon_max`
+    """
+    if lon_max - lon_min >= 360.0:
+        return slice(None)
+    lon_offset = (lons - lon_min) % 360.0
+    idx = np.flatnonzero(lon_offset <= lon_max - lon_min)
+    if idx.size == 0:
+        raise DomainBoundsOutsideOfInputException
+    idx = idx[np.argsort(lon_offset[idx], kind="stable")]
+    if np.all(np.diff(idx) == 1):
+        return slice(idx[0], idx[-1] + 1)
+    return idx
+
+
+def _unwrap_lon(da):
+    """
+    Make the 1D `lon` (and `lon_b`) coordinates of `da` continuous, i.e.
+    without a jump of 360 degrees where data cropped across the seam of
+    global longitudes has been joined
+    """
+    coords = {}
+    for v in ["lon", "lon_b"]:
+        if v not in da.coords or da[v].ndim != 1 or da[v].size < 2:
+            continue
+        da_lon = da[v]
+        lons = da_lon.values
+        dlon = (np.diff(lons) + 180.0) % 360.0 - 180.0
+        lons_new = lons[0] + np.concatenate([[0.0], np.cumsum(dlon)])
+        coords[v] = (da_lon.dims, lons_new, da_lon.attrs)
+    return da.assign_coords(coords)
+
+
+def _apply_crop_indexers(da, indexers):
+    """
+    Crop `da` with `indexers` (as returned by `get_crop_indexers`), keeping
+    longitudes continuous if the crop crosses the seam of global longitudes
+    """
+    da_cropped = da.isel(indexers)
+    if isinstance(indexers.get("lon"), np.ndarray):
+        da_cropped = _unwrap_lon(da_cropped)
+    return da_cropped
+
+
+def _crop_indexers_latlon_aligned_crid(domain, da, pad_pct):
     x_dim, y_dim = "lon", "lat"
-    latlon_box = _latlon_box_adjust_sigfigs(domain.latlon_bounds)
+    latlon_bounds = domain.latlon_bounds
+    # make the longitudes of the corners continuous (for domains crossing the
+    # antimeridian)
+    corner_lons = latlon_bounds[..., 0]
+    latlon_bounds[..., 0] = (
+        corner_lons[0] + (corner_lons - corner_lons[0] + 180.0) % 360.0 - 180.0
+    )
+    latlon_box = _latlon_box_adjust_sigfigs(latlon_bounds)
     xs = latlon_box[..., 0]
     ys = latlon_box[..., 1]
     x_min, x_max = np.min(xs), np.max(xs)
     y_min, y_max = np.min(ys), np.max(ys)
-    if da[x_dim][-1] > 180.0:
-        if x_max < 0.0:
-            x_min += 360.0
-            x_max += 360.0
-        else:
-            raise NotImplementedError
+
+    # shift the domain's longitudes by a multiple of 360 degrees to be closest
+    # to the longitudes of the data (e.g. when given as 0 to 360)
+    lons = da[x_dim].values
+    lon_centre = 0.5 * (lons.min() + lons.max())
+    lon_shift = 360.0 * np.round((0.5 * (x_min + x_max) - lon_centre) / 360.0)
+    x_min -= lon_shift
+    x_max -= lon_shift
     x_range = [x_min, x_max]
     y_range = [y_min, y_max]
 
+    lon_periodic = _is_periodic_lon(lons)
+    if lon_periodic:
+        # the longitudes are cropped below, allowing for the domain crossing
+        # the seam where the longitudes wrap around
+        x_range = [lons[0], lons[-1]]
+
+    lats = da[y_dim].values
     bounds_checks = [
-        ("W", x_min, da[x_dim].min().data),
-        ("E", da[x_dim].max().data, x_max),
-        ("S", y_min, da[y_dim].min().data),
-        ("N", da[y_dim].max().data, y_max),
+        ("W", x_range[0], lons.min()),
+        ("E", lons.max(), x_range[1]),
+        ("S", y_min, lats.min()),
+        ("N", lats.max(), y_max),
     ]
 
     for edge, v1, v2 in bounds_checks:
         if v1 < v2:
             raise DomainBoundsOutsideOfInputException(f"{edge}: {v1} < {v2}")
 
-    return crop_field_to_bbox(
+    indexers = _bbox_indexers(
         da=da,
         x_range=x_range,
         y_range=y_range,
@@ -107,92 +201,297 @@ def _crop_with_latlon_aligned_crid(domain, da, pad_pct):
         y_dim=y_dim,
     )
 
+    if lon_periodic:
+        lx = x_max - x_min
+        indexers[x_dim] = _wrapped_lon_indexer(
+            lons, lon_min=x_min - pad_pct * lx, lon_max=x_max + pad_pct * lx
+        )
 
-def _crop_with_latlon_aux_grid(domain, da, da_lat, da_lon, pad_pct):
-    assert da_lat.dims == da_lon.dims
-    assert len(da_lat.dims) == 2
-    y_dim, x_dim = da_lat.dims
+    return indexers
 
+
+def _domain_latlon_bbox(domain):
+    """
+    The lat/lon bounding box of `domain` as `(lon_min, lon_max, lat_min,
+    lat_max)`, rounded outwards
+    """
     latlon_box = _latlon_box_adjust_sigfigs(domain.latlon_bounds)
     bbox_lons = latlon_box[..., 0]
     bbox_lats = latlon_box[..., 1]
+    return bbox_lons.min(), bbox_lons.max(), bbox_lats.min(), bbox_lats.max()
+
 
-    mask = (
-        (bbox_lons.min() < da_lon)
-        * (bbox_lons.max() > da_lon)
-        * (bbox_lats.min() < da_lat)
-        * (bbox_lats.max() > da_lat)
+def _outside_of_domain_exception(lon_range, lat_range, bbox):
+    lon_min, lon_max, lat_min, lat_max = bbox
+    return Exception(
+        "lat/lon bounds are outside of the domain",
+        f"domain bounds (W, E), (S, N): ({lon_range[0]}, {lon_range[1]})"
+        f", ({lat_range[0]}, {lat_range[1]}). "
+        f"bbox bounds (W, E), (S, N): ({lon_min.item()}, {lon_max.item()})"
+        f", ({lat_min.item()}, {lat_max.item()})",
     )
 
-    if np.count_nonzero(mask) == 0:
-        raise Exception(
-            "lat/lon bounds are outside of the domain",
-            f"domain bounds (W, E), (S, N): ({da_lon.min().item()}, {da_lon.max().item()})"
-            f", ({da_lat.min().item()}, {da_lat.max().item()}). "
-            f"bbox bounds (W, E), (S, N): ({bbox_lons.min().item()}, {bbox_lons.max().item()})"
-            f", ({bbox_lats.min().item()}, {bbox_lats.max().item()})",
+
+def _padded_slice(i_min, i_max, size, pad_pct):
+    """
+    Slice selecting indices `i_min` to `i_max` (inclusive), padded on either
+    side by `pad_pct` of the range
+    """
+    n_pad = int(pad_pct * (i_max - i_min))
+    return slice(max(i_min - n_pad, 0), min(i_max + 1 + n_pad, size))
+
+
+def _crop_indexers_latlon_aux_grid(domain, da, da_lat, da_lon, pad_pct):
+    """
+    Get the integer-index slices which crop `da` to `domain` using the 2D
+    lat/lon positions of the grid points. The bounding row and column indices
+    are found directly from where the grid points are inside the domain's
+    lat/lon bounding box, so that the data in `da` isn't touched
+    """
+    assert da_lat.dims == da_lon.dims
+    assert len(da_lat.dims) == 2
+    y_dim, x_dim = da_lat.dims
+
+    bbox = _domain_latlon_bbox(domain)
+    lon_min, lon_max, lat_min, lat_max = bbox
+
+    lons = np.asarray(da_lon.values)
+    lats = np.asarray(da_lat.values)
+    mask = (lon_min < lons) & (lon_max > lons) & (lat_min < lats) & (lat_max > lats)
+
+    if not mask.any():
+        raise _outside_of_domain_exception(
+            lon_range=(np.nanmin(lons), np.nanmax(lons)),
+            lat_range=(np.nanmin(lats), np.nanmax(lats)),
+            bbox=bbox,
+        )
+
+    indexers = {}
+    for axis, dim in enumerate([y_dim, x_dim]):
+        i_inside = np.flatnonzero(mask.any(axis=1 - axis))
+        indexers[dim] = _padded_slice(
+            i_inside[0], i_inside[-1], size=mask.shape[axis], pad_pct=pad_pct
+        )
+
+    return indexers
+
+
+def _block_reduce(ufunc, values, block_size):
+    starts = [np.arange(0, n, block_size) for n in values.shape]
+    return ufunc.reduceat(ufunc.reduceat(values, starts[0], axis=0), starts[1], axis=1)
+
+
+class SpatialIndex:
+    """
+    Index over the 2D lat/lon positions of a source grid for quickly finding
+    the region of the grid covering a domain, for cropping many (small)
+    domains from the same (large) source grid. The grid is split into blocks
+    of `block_size` x `block_size` points and the lat/lon range of each block
+    is stored, so that only the points in the outermost blocks overlapping a
+    domain are compared with the domain's bounds. The crop is identical to
+    cropping without the index.
+
+    The index is built once per source grid (from the `lat` and `lon`
+    coordinates of `da`, or otherwise from its projection information) and
+    passed to `crop_field_to_domain`, `rc.resample` or `rc.Regridder`:
+
+    >>> index = rc.SpatialIndex(da)
+    >>> da_cropped = rc.crop_field_to_domain(domain, da, spatial_index=index)
+    """
+
+    def __init__(self, da, block_size=32):
+        if on_latlon_aligned_grid(da):
+            # cropping grids aligned with lat/lon is already a 1D search
+            raise NotImplementedError("lat/lon aligned grids don't need an index")
+        elif has_latlon_coords(da):
+            da_lat, da_lon = da.lat, da.lon
+        else:
+            coords = get_latlon_coords_using_crs(da)
+            da_lat, da_lon = coords["lat"], coords["lon"]
+
+        if da_lat.dims != da_lon.dims or len(da_lat.dims) != 2:
+            raise NotImplementedError(da.coords)
+
+        self.dims = da_lat.dims
+        self.shape = da_lat.shape
+        self.block_size = block_size
+        self._lats = np.asarray(da_lat.values)
+        self._lons = np.asarray(da_lon.values)
+
+        # lat/lon range of each block, ignoring missing values (blocks with
+        # only missing values have a NaN range and never overlap a domain)
+        with np.errstate(invalid="ignore"):
+            self._lat_min = _block_reduce(np.fmin, self._lats, block_size)
+            self._lat_max = _block_reduce(np.fmax, self._lats, block_size)
+            self._lon_min = _block_reduce(np.fmin, self._lons, block_size)
+            self._lon_max = _block_reduce(np.fmax, self._lons, block_size)
+
+    def __repr__(self):
+        sizes = ", ".join(f"{d}: {n}" for (d, n) in zip(self.dims, self.shape))
+        return f"SpatialIndex({sizes}, block_size={self.block_size})"
+
+    def matches(self, da):
+        """
+        Check whether `da` is on the grid this index was built for
+        """
+        return all(
+            d in da.dims and da.sizes[d] == n for (d, n) in zip(self.dims, self.shape)
         )
 
-    da_masked = da.where(mask, drop=True)
+    def _outermost_inside(self, overlap, bbox, axis, reverse):
+        """
+        Find the first (or last with `reverse=True`) index along `axis` of the
+        points inside `bbox`, searching the strips of blocks along `axis`
+        which overlap `bbox` in turn. Returns `None` if no points are inside
+        """
+        lon_min, lon_max, lat_min, lat_max = bbox
+        bs = self.block_size
+        strips = np.flatnonzero(overlap.any(axis=1 - axis))
+        if reverse:
+            strips = strips[::-1]
+
+        for n in strips:
+            blocks = np.flatnonzero(overlap.take(n, axis=axis))
+            region = [None, None]
+            region[axis] = slice(n * bs, (n + 1) * bs)
+            region[1 - axis] = slice(blocks[0] * bs, (blocks[-1] + 1) * bs)
+            lons = self._lons[tuple(region)]
+            lats = self._lats[tuple(region)]
+            mask = (
+                (lon_min < lons)
+                & (lon_max > lons)
+                & (lat_min < lats)
+                & (lat_max > lats)
+            )
+            i_inside = np.flatnonzero(mask.any(axis=1 - axis))
+            if i_inside.size > 0:
+                return n * bs + (i_inside[-1] if reverse else i_inside[0])
+        return None
+
+    def crop_indexers(self, domain, pad_pct=0.1):
+        """
+        Get the integer-index slices which crop the grid to `domain` (the same
+        as returned by `get_crop_indexers`)
+        """
+        bbox = _domain_latlon_bbox(domain)
+        lon_min, lon_max, lat_min, lat_max = bbox
+
+        # blocks which may contain points inside the domain's bounds
+        overlap = (
+            (self._lon_max > lon_min)
+            & (self._lon_min < lon_max)
+            & (self._lat_max > lat_min)
+            & (self._lat_min < lat_max)
+        )
+
+        indexers = {}
+        for axis, (dim, size) in enumerate(zip(self.dims, self.shape)):
+            i_min = self._outermost_inside(overlap, bbox, axis=axis, reverse=False)
+            if i_min is None:
+                raise _outside_of_domain_exception(
+                    lon_range=(np.nanmin(self._lon_min), np.nanmax(self._lon_max)),
+                    lat_range=(np.nanmin(self._lat_min), np.nanmax(self._lat_max)),
+                    bbox=bbox,
+                )
+            i_max = self._outermost_inside(overlap, bbox, axis=axis, reverse=True)
+            indexers[dim] = _padded_slice(i_min, i_max, size=size, pad_pct=pad_pct)
+
+        return indexers
 
-    x_min = da_masked[x_dim].min()
-    x_max = da_masked[x_dim].max()
-    y_min = da_masked[y_dim].min()
-    y_max = da_masked[y_dim].max()
 
-    x_range = (x_min, x_max)
-    y_range = (y_min, y_max)
+def _domain_boundary_xy(domain, n_pts_per_edge=50):
+    """
+    Points along the edges of the domain (in the domain's projection) so that
+    the shape of the boundary is retained when it is transformed into a
+    different projection
+    """
+    corners = domain.spatial_bounds
+    corners[..., 0] -= domain.x_c
+    corners[..., 1] -= domain.y_c
+    s = np.linspace(0.0, 1.0, n_pts_per_edge, endpoint=False)[:, None]
+    edges = [
+        corners[n] + s * (corners[(n + 1) % len(corners)] - corners[n])
+        for n in range(len(corners))
+    ]
+    pts = np.concatenate(edges)
+    return pts[..., 0], pts[..., 1]
+
 
-    return crop_field_to_bbox(
+def _crop_indexers_projected_grid(domain, da, crs, pad_pct, x_dim="x", y_dim="y"):
+    """
+    Get the integer-index slices which crop `da` (given on a grid in
+    projection `crs`) to `domain` by transforming the boundary of the domain
+    into the projection of `da` and cropping along the `x_dim` and `y_dim`
+    coordinates. This avoids computing the lat/lon position of every source
+    grid point just to work out where to crop.
+
+    Returns `None` if the boundary of the domain can't be transformed into
+    the projection of `da` (for example if part of the domain is outside the
+    visible disk of a geostationary projection)
+    """
+    if not hasattr(domain, "crs") or x_dim not in da.coords or y_dim not in da.coords:
+        return None
+
+    x_b, y_b = _domain_boundary_xy(domain=domain)
+    xs, ys = transform(x=x_b, y=y_b, crs_from=domain.crs, crs_to=crs)
+    if not (np.all(np.isfinite(xs)) and np.all(np.isfinite(ys))):
+        return None
+
+    return _bbox_indexers(
         da=da,
-        x_range=x_range,
-        y_range=y_range,
+        x_range=(xs.min(), xs.max()),
+        y_range=(ys.min(), ys.max()),
         pad_pct=pad_pct,
         x_dim=x_dim,
         y_dim=y_dim,
     )
 
 
-def crop_field_to_domain(domain, da, pad_pct=0.1):
+def get_crop_indexers(domain, da, pad_pct=0.1, spatial_index=None):
     """
-    Crop a data-array to a domain. The data-array is expected to have
-    coordinates defined using one of the following:
-
-    1. `lat` and `lon` coordinates along which the data is aligned, i.e. `lat`
-       and `lon` are given as 1D arrays
-    2. `lat` and `lon` are given as auxilliary variables so that the data isn't
-       aligned along the lat/lon directions, but rather the `lat` and `lon` of
-       every datapoint is given
-    3. the data-array has projection information defined in a CF-compliant
-       manner using the `grid_mapping` attribute
-       (http://cfconventions.org/Data/cf-conventions/cf-conventions-1.7/build/ch05s06.html)
-    4. the data-array was loaded from a raster-file using
-       `rioxarray.open_rasterio` so that the projection information is
-       available via `da.rio.crs`
-
+    Get the integer-index slices (to be used with `da.isel(...)`) which crop
+    `da` to `domain`, so that the crop can be applied cheaply to other
+    data-arrays on the same grid. The supported coordinates are the same as
+    for `crop_field_to_domain`
     """
-    da_cropped = None
+    if spatial_index is not None:
+        if not spatial_index.matches(da):
+            raise ValueError(
+                f"The spatial index ({spatial_index}) wasn't built for the grid of"
+                f" the data-array being cropped ({dict(da.sizes)})"
+            )
+        return spatial_index.crop_indexers(domain=domain, pad_pct=pad_pct)
+
+    indexers = None
 
     # first we see if the provided xr.DataArray has `lat` and `lon` coordinates
     # given with data-array defined along these coordinates
     if on_latlon_aligned_grid(da):
-        da_cropped = _crop_with_latlon_aligned_crid(
+        indexers = _crop_indexers_latlon_aligned_crid(
             domain=domain, da=da, pad_pct=pad_pct
         )
     # second option is that `lat` and `lon` are given as auxilliary variables
     # (or coordinates), but that the data isn't actually defined along the lat
     # and lon directions (i.e. `lat` and `lon` are 2D arrays in the data-array)
     elif has_latlon_coords(da):
-        da_cropped = _crop_with_latlon_aux_grid(
+        indexers = _crop_indexers_latlon_aux_grid(
             domain=domain, da=da, pad_pct=pad_pct, da_lat=da.lat, da_lon=da.lon
         )
 
     # third we try extracting projection information from the data-array and
-    # getting the lat/lon coordinates that way
-    if da_cropped is None:
+    # crop in the projected coordinates (only falling back to working out the
+    # lat/lon coordinates of every grid point if that isn't possible)
+    if indexers is None:
+        crs = parse_crs(da)
+        if crs is not None:
+            indexers = _crop_indexers_projected_grid(
+                domain=domain, da=da, crs=crs, pad_pct=pad_pct
+            )
+
+    if indexers is None:
         try:
             coords = get_latlon_coords_using_crs(da)
-            da_cropped = _crop_with_latlon_aux_grid(
+            indexers = _crop_indexers_latlon_aux_grid(
                 domain=domain,
                 da=da,
                 pad_pct=pad_pct,
@@ -202,7 +501,33 @@ def crop_field_to_domain(domain, da, pad_pct=0.1):
         except NoProjectionInformationFound:
             pass
 
-    if da_cropped is None:
+    if indexers is None:
         raise NotImplementedError(da.coords)
 
-    return da_cropped
+    return indexers
+
+
+def crop_field_to_domain(domain, da, pad_pct=0.1, spatial_index=None):
+    """
+    Crop a data-array to a domain. The data-array is expected to have
+    coordinates defined using one of the following:
+
+    1. `lat` and `lon` coordinates along which the data is aligned, i.e. `lat`
+       and `lon` are given as 1D arrays
+    2. `lat` and `lon` are given as auxilliary variables so that the data isn't
+       aligned along the lat/lon directions, but rather the `lat` and `lon` of
+       every datapoint is given
+    3. the data-array has projection information defined in a CF-compliant
+       manner using the `grid_mapping` attribute
+       (http://cfconventions.org/Data/cf-conventions/cf-conventions-1.7/build/ch05s06.html)
+    4. the data-array was loaded from a raster-file using
+       `rioxarray.open_rasterio` so that the projection information is
+       available via `da.rio.crs`
+
+    When cropping many domains from the same grid of lat/lon positions, build
+    a `SpatialIndex` of the grid once and pass it with `spatial_index`.
+    """
+    indexers = get_crop_indexers(
+        domain=domain, da=da, pad_pct=pad_pct, spatial_index=spatial_index
+    )
+    return _apply_crop_indexers(da, indexers)
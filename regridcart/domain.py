@@ -1,16 +1,73 @@
 """
 Utilities to create (approximate) regular Cartesian gridded data from lat/lon satelite data
 """
+import functools
 import itertools
 import warnings
 
 import cartopy.crs as ccrs
-import matplotlib.patches as mpatches
-import matplotlib.pyplot as plt
 import numpy as np
-import shapely.geometry as geom
 import xarray as xr
 
+from .cache import LRUCache
+from .transform import _lonlat_transform, xy_to_lonlat
+
+# in-memory cache of the grids created by `LocalCartesianDomain.get_grid` so
+# that the lat/lon position of every grid point is only computed once for a
+# given domain and resolution
+grid_cache = LRUCache(maxsize=16, maxbytes=512 * 1024 ** 2)
+
+
+def _xy_to_lonlat(x, y, crs_wkt, dtype):
+    """
+    Transform the grid of positions given by 1D `x` and `y` to (lon, lat)
+    returned as a single array with shape `(2, x.size, y.size)`. The
+    transform is done in-place in float64 and the result cast to `dtype`
+    """
+    lonlat = np.empty((2, x.size, y.size), dtype=np.float64)
+    lonlat[0] = x[:, None]
+    lonlat[1] = y[None, :]
+    apply_transform = _lonlat_transform(crs_wkt, direction="FORWARD")
+    apply_transform(lonlat)
+    return lonlat.astype(dtype, copy=False)
+
+
+def _xy_to_lonlat_grid(x, y, crs_wkt, dtype, chunks):
+    """
+    Compute the (lon, lat) positions of the grid given by 1D `x` and `y`
+    (with dimensions `(x, y)`), lazily with dask if `chunks` is given
+    """
+    transform_fn = functools.partial(_xy_to_lonlat, crs_wkt=crs_wkt, dtype=dtype)
+
+    if chunks is None:
+        lons, lats = transform_fn(x=x, y=y)
+        lons.flags.writeable = False
+        lats.flags.writeable = False
+    else:
+        try:
+            import dask.array
+        except ImportError as ex:
+            raise ImportError(
+                "Computing the grid lazily (with `chunks`) requires dask, install"
+                " it with `pip install regridcart[dask]`"
+            ) from ex
+
+        x = xr.DataArray(x, dims=("x",)).chunk(chunks).data
+        y = xr.DataArray(y, dims=("y",)).chunk(chunks).data
+        lonlat = dask.array.blockwise(
+            transform_fn,
+            "cij",
+            x,
+            "i",
+            y,
+            "j",
+            new_axes=dict(c=2),
+            dtype=dtype,
+        )
+        lons, lats = lonlat[0], lonlat[1]
+
+    return lons, lats
+
 
 class CartesianDomain:
     def __init__(self, l_meridional, l_zonal, x_c=0.0, y_c=0.0):
@@ -40,6 +97,8 @@ class CartesianDomain:
     @property
     def spatial_bounds_geometry(self):
         """return a shapely Geometry"""
+        import shapely.geometry as geom
+
         return geom.Polygon(self.spatial_bounds)
 
     def get_grid(self, dx):
@@ -84,6 +143,10 @@ class CartesianDomain:
         ]
 
     def plot_outline(self, ax=None, alpha=0.6, set_ax_extent=False, **kwargs):
+        # matplotlib is only imported when plotting as it is slow to import
+        import matplotlib.patches as mpatches
+        import matplotlib.pyplot as plt
+
         if ax is None:
             fig_height = 4
             fig_width = fig_height * self.l_zonal / self.l_meridional
@@ -171,69 +234,111 @@ class LocalCartesianDomain(CartesianDomain):
         position (in degrees) of the four corners of the domain
         """
         corners = self.spatial_bounds
-        latlon_pts = ccrs.PlateCarree().transform_points(
-            x=corners[..., 0] - self.x_c,
-            y=corners[..., 1] - self.y_c,
-            src_crs=self.crs,
-            z=np.zeros_like(corners[..., 0]),
+        lons, lats = xy_to_lonlat(
+            x=corners[..., 0] - self.x_c, y=corners[..., 1] - self.y_c, crs=self.crs
         )
 
-        return latlon_pts
+        return np.stack([lons, lats], axis=-1)
 
-    def latlon_from_xy(self, x, y):
+    def latlon_from_xy(self, x, y, dtype=np.float64):
         """
-        Calculate the latlon coordinates from xy-coordinates in the domain
+        Calculate the latlon coordinates from xy-coordinates in the domain,
+        returned as `(lon, lat)` with type `dtype`
         """
         x = np.atleast_1d(x)
         y = np.atleast_1d(y)
-        latlon_pts = ccrs.PlateCarree().transform_points(
-            x=x, y=y, src_crs=self.crs, z=np.zeros_like(x)
-        )
+        return xy_to_lonlat(x=x, y=y, crs=self.crs, dtype=dtype)
 
-        return latlon_pts[..., 0], latlon_pts[..., 1]
-
-    def get_grid(self, dx):
+    def get_grid(self, dx, dtype=np.float64, chunks=None, bounds=False):
         """
         Get an xarray Dataset containing the discrete positions (in meters)
-        with their lat/lon positions with grid resolution dx (in meters)
+        with their lat/lon positions with grid resolution dx (in meters).
+
+        The lat/lon positions are stored with type `dtype` (use `np.float32`
+        to halve the memory used for large grids). If `chunks` is given (as
+        an int or dict, as for `xr.DataArray.chunk`) the lat/lon positions are
+        computed lazily by dask in blocks of this size. With `bounds=True` the
+        lat/lon positions of the cell corners are included too (as `lat_b`
+        and `lon_b`, as needed for conservative regridding).
+
+        Grids are cached (see `regridcart.domain.grid_cache`) so that the
+        lat/lon positions are only computed once for a given domain and
+        resolution. The arrays of the returned grid are shared with the cache
+        and should not be modified in-place.
         """
-        ds_grid_cart = super().get_grid(dx=dx)
+        key = (
+            self.__class__.__name__,
+            tuple(sorted(self.serialize().items())),
+            float(dx),
+            np.dtype(dtype).str,
+            repr(chunks),
+            bool(bounds),
+        )
+        ds_grid = grid_cache.get(key)
+        if ds_grid is None:
+            ds_grid = self._make_grid(dx=dx, dtype=dtype, chunks=chunks, bounds=bounds)
+            nbytes = 0 if chunks is not None else ds_grid.nbytes
+            grid_cache.put(key, ds_grid, nbytes=nbytes)
 
-        ds_grid = ds_grid_cart.copy()
+        return ds_grid.copy(deep=False)
 
-        ds_grid["x"] = ds_grid.x - self.x_c
-        ds_grid["y"] = ds_grid.y - self.y_c
+    def _make_grid(self, dx, dtype, chunks, bounds):
+        ds_grid = super().get_grid(dx=dx)
 
-        for c in "xy":
-            ds_grid[c].attrs.update(ds_grid_cart[c].attrs)
+        # the grid-positions are given relative to the center of the domain
+        # (where the projection is centered)
+        for c, c_offset in [("x", self.x_c), ("y", self.y_c)]:
+            ds_grid[c] = ds_grid[c].copy(data=ds_grid[c].values - c_offset)
 
-        x, y = np.meshgrid(ds_grid.x, ds_grid.y, indexing="ij")
-        lons, lats = self.latlon_from_xy(x=x, y=y)
+        # the (x,y)-positions are only approximate with the projection
+        for c in ["x", "y"]:
+            ds_grid[c].attrs["long_name"] = (
+                "approximate " + ds_grid[c].attrs["long_name"]
+            )
+
+        crs_wkt = self.crs.to_wkt()
+        lons, lats = _xy_to_lonlat_grid(
+            x=ds_grid.x.values,
+            y=ds_grid.y.values,
+            crs_wkt=crs_wkt,
+            dtype=dtype,
+            chunks=chunks,
+        )
 
         ds_grid["lon"] = xr.DataArray(
             lons,
             dims=("x", "y"),
-            coords=dict(x=ds_grid.x, y=ds_grid.y),
             attrs=dict(standard_name="grid_longitude", units="degree"),
         )
         ds_grid["lat"] = xr.DataArray(
             lats,
             dims=("x", "y"),
-            coords=dict(x=ds_grid.x, y=ds_grid.y),
             attrs=dict(standard_name="grid_latitude", units="degree"),
         )
 
-        # the (x,y)-positions are only approximate with the projection
-        for c in ["x", "y"]:
-            ds_grid[c].attrs["long_name"] = (
-                "approximate " + ds_grid[c].attrs["long_name"]
+        if bounds:
+            # positions of the cell corners
+            x_b = np.append(
+                ds_grid.x.values - 0.5 * dx, ds_grid.x.values[-1] + 0.5 * dx
+            )
+            y_b = np.append(
+                ds_grid.y.values - 0.5 * dx, ds_grid.y.values[-1] + 0.5 * dx
             )
+            lons_b, lats_b = _xy_to_lonlat_grid(
+                x=x_b, y=y_b, crs_wkt=crs_wkt, dtype=dtype, chunks=chunks
+            )
+            ds_grid["lon_b"] = xr.DataArray(lons_b, dims=("x_b", "y_b"))
+            ds_grid["lat_b"] = xr.DataArray(lats_b, dims=("x_b", "y_b"))
 
         ds_grid.attrs["crs"] = self.crs
 
         return ds_grid
 
     def plot_outline(self, ax=None, alpha=0.6, set_ax_extent=False, **kwargs):
+        # matplotlib is only imported when plotting as it is slow to import
+        import matplotlib.patches as mpatches
+        import matplotlib.pyplot as plt
+
         if ax is None:
             fig_height = 4
             fig_width = fig_height * self.l_zonal / self.l_meridional
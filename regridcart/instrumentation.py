@@ -0,0 +1,203 @@
+"""
+Opt-in instrumentation of the stages of regridding (cropping, working out the
+lat/lon coordinates of the source data, creating the target grid, computing
+the regridding weights and applying them). Use `rc.instrument()` as a context
+manager to collect a report of the stages run within it:
+
+>>> with rc.instrument() as report:
+...     rc.resample(domain, da=da, dx=dx)
+>>> print(report)
+
+or pass callbacks (for example `log_stage` to log each stage with the
+`logging` module) to be called as each stage completes. When no
+instrumentation is active the overhead of the stages is negligible.
+"""
+import contextlib
+import contextvars
+import logging
+import time
+import tracemalloc
+from collections import namedtuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+StageRecord = namedtuple(
+    "StageRecord",
+    [
+        "name",
+        "duration",
+        "input_shape",
+        "output_shape",
+        "bytes_allocated",
+        "cache_hits",
+        "cache_misses",
+    ],
+)
+StageRecord.__doc__ = """
+Record of a single stage of regridding: `duration` is given in seconds,
+`input_shape` and `output_shape` as dicts of dimension sizes, and
+`bytes_allocated` is the peak memory allocated during the stage (only
+available when tracing memory, `None` otherwise). `cache_hits` and
+`cache_misses` count lookups in the cache used by the stage (`None` for
+stages which don't use a cache)
+"""
+
+# the reports currently collecting stage records
+_active_reports = contextvars.ContextVar("active_reports", default=())
+
+
+class Report:
+    """
+    Stage records collected by `instrument`
+    """
+
+    def __init__(self):
+        self.stages = []
+
+    @property
+    def total_duration(self):
+        return sum(stage.duration for stage in self.stages)
+
+    def by_stage(self):
+        """
+        Total duration (in seconds) of each stage name
+        """
+        durations = {}
+        for stage in self.stages:
+            durations[stage.name] = durations.get(stage.name, 0.0) + stage.duration
+        return durations
+
+    def __str__(self):
+        lines = []
+        for s in self.stages:
+            line = f"{s.name:<12} {s.duration * 1.0e3:10.2f}ms"
+            line += (
+                f"  {_format_shape(s.input_shape)} -> {_format_shape(s.output_shape)}"
+            )
+            if s.bytes_allocated is not None:
+                line += f"  {s.bytes_allocated / 1024 ** 2:.1f}MB"
+            if s.cache_hits is not None:
+                line += f"  cache hits={s.cache_hits} misses={s.cache_misses}"
+            lines.append(line)
+        lines.append(f"{'total':<12} {self.total_duration * 1.0e3:10.2f}ms")
+        return "\n".join(lines)
+
+
+def _format_shape(shape):
+    if shape is None:
+        return "?"
+    return "(" + ", ".join(f"{d}: {n}" for (d, n) in shape.items()) + ")"
+
+
+def _shape_of(obj):
+    if obj is None:
+        return None
+    if hasattr(obj, "sizes"):
+        return dict(obj.sizes)
+    if hasattr(obj, "shape"):
+        return {f"dim_{n}": size for (n, size) in enumerate(np.shape(obj))}
+    return None
+
+
+@contextlib.contextmanager
+def instrument(callbacks=(), trace_memory=False):
+    """
+    Collect records of the regridding stages run within this context,
+    returning a `Report`. Each of `callbacks` is called with every
+    `StageRecord` as the stage completes. With `trace_memory=True` the peak
+    memory allocated in each stage is recorded using `tracemalloc` (which
+    slows down execution).
+
+    Note that for dask-backed data the regridding is lazy, so that the
+    duration of applying the weights only includes building the task graph.
+    """
+    report = Report()
+    entry = (report, tuple(callbacks), trace_memory)
+
+    started_tracing = False
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        started_tracing = True
+
+    token = _active_reports.set(_active_reports.get() + (entry,))
+    try:
+        yield report
+    finally:
+        _active_reports.reset(token)
+        if started_tracing:
+            tracemalloc.stop()
+
+
+class _StageInfo:
+    def __init__(self):
+        self.output = None
+
+
+@contextlib.contextmanager
+def stage(name, input=None, cache=None):
+    """
+    Record the stage `name` of regridding run within this context (if
+    instrumentation is active). `input` is the object the stage operates on
+    and the output of the stage should be set on the returned object (as
+    `.output`) so that their shapes are recorded. The cache hits and misses
+    of `cache` (a `regridcart.cache.LRUCache`) during the stage are recorded
+    too.
+    """
+    entries = _active_reports.get()
+    info = _StageInfo()
+    if len(entries) == 0:
+        yield info
+        return
+
+    trace_memory = any(trace for (_, _, trace) in entries) and tracemalloc.is_tracing()
+    if trace_memory:
+        mem_start, _ = tracemalloc.get_traced_memory()
+        # `reset_peak` is only available from python 3.9, before that the
+        # peak may have been reached before the stage started so that the
+        # memory allocated is over-estimated
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+    cache_info_start = cache.info() if cache is not None else None
+    t_start = time.perf_counter()
+
+    yield info
+
+    duration = time.perf_counter() - t_start
+    bytes_allocated = None
+    if trace_memory:
+        _, mem_peak = tracemalloc.get_traced_memory()
+        bytes_allocated = max(mem_peak - mem_start, 0)
+    cache_hits = cache_misses = None
+    if cache is not None:
+        cache_info = cache.info()
+        cache_hits = cache_info.hits - cache_info_start.hits
+        cache_misses = cache_info.misses - cache_info_start.misses
+
+    record = StageRecord(
+        name=name,
+        duration=duration,
+        input_shape=_shape_of(input),
+        output_shape=_shape_of(info.output),
+        bytes_allocated=bytes_allocated,
+        cache_hits=cache_hits,
+        cache_misses=cache_misses,
+    )
+
+    for report, callbacks, _ in entries:
+        report.stages.append(record)
+        for callback in callbacks:
+            callback(record)
+
+
+def log_stage(record, level=logging.INFO):
+    """
+    Callback for `instrument` which logs each stage record (with the record
+    fields available as `extra` on the log record, for structured logging)
+    """
+    logger.log(
+        level,
+        f"regridcart stage `{record.name}` took {record.duration * 1.0e3:.2f}ms",
+        extra=dict(regridcart_stage=record._asdict()),
+    )
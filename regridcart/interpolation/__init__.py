@@ -1 +1 @@
-from .common import resample
+from .common import Regridder, resample, resample_many, weights_cache
@@ -1,24 +1,205 @@
 """
-Common interface for lat/lon interpolation backends
+Common interface for lat/lon interpolation backends. Each backend computes a
+sparse matrix of regridding weights (of shape `(n_out, n_in)`, with the grid
+points of the old and new grids flattened in C-order over their horizontal
+dimensions), which are then applied to the data by `apply_weights`.
+
+The block methods (`block_mean`, `block_median` and `block_max`), which bin
+the source points into the target grid cells, are implemented by regridcart
+itself and so are available for every backend. For these the weights only
+record which source points are in each target cell and the aggregation
+(ignoring missing values) is done when the weights are applied
 """
-from .xesmf import resample as xesmf_resample
+import numpy as np
+import xarray as xr
 
+from .scipy import build_weights as scipy_build_weights
 
-def resample(
-    da, old_grid, new_grid, keep_attrs=True, method="bilinear", backend="xemsf"
+# the reduction used to aggregate the source values in each target cell for
+# each of the block methods
+BLOCK_REDUCTIONS = dict(block_mean="mean", block_median="median", block_max="max")
+
+
+def horizontal_dims(grid):
+    """
+    The dimensions spanning a grid with `lat` and `lon` coordinates, for lat/lon
+    aligned grids these are the dimensions of the 1D `lat` and `lon`
+    coordinates (in that order)
+    """
+    if len(grid.lat.dims) == 1:
+        return (grid.lat.dims[0], grid.lon.dims[0])
+    return grid.lon.dims
+
+
+def weights_nbytes(weights):
+    return weights.data.nbytes + weights.indices.nbytes + weights.indptr.nbytes
+
+
+def build_weights(
+    old_grid, new_grid, method="bilinear", backend="scipy", nearest_max_distance=None
 ):
-    if backend == "xesmf":
-        da_resampled = xesmf_resample(
-            da=da,
+    if method in BLOCK_REDUCTIONS:
+        weights = scipy_build_weights(
+            old_grid=old_grid, new_grid=new_grid, method=method
+        )
+    elif backend == "xesmf":
+        try:
+            from .xesmf import build_weights as xesmf_build_weights
+        except ImportError as ex:
+            raise ImportError(
+                "The `xesmf` regridding backend requires the xesmf package (and"
+                " ESMF), either install xesmf or use `backend='scipy'`"
+            ) from ex
+
+        weights = xesmf_build_weights(
+            old_grid=old_grid, new_grid=new_grid, method=method
+        )
+    elif backend == "pyresample":
+        try:
+            from .pyresample import build_weights as pyresample_build_weights
+        except ImportError as ex:
+            raise ImportError(
+                "The `pyresample` regridding backend requires the pyresample"
+                " package to be installed"
+            ) from ex
+
+        weights = pyresample_build_weights(
+            old_grid=old_grid, new_grid=new_grid, method=method
+        )
+    elif backend == "scipy":
+        weights = scipy_build_weights(
             old_grid=old_grid,
             new_grid=new_grid,
             method=method,
-            keep_attrs=keep_attrs,
+            nearest_max_distance=nearest_max_distance,
         )
     else:
         raise NotImplementedError(backend)
 
-    if keep_attrs:
-        da_resampled.attrs.update(da.attrs)
+    return weights
+
+
+def _block_mean(arr_flat, weights):
+    valid = np.isfinite(arr_flat)
+    total = weights.dot(np.where(valid, arr_flat, 0.0).T).T
+    count = weights.dot(valid.T.astype(np.float64)).T
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, total / count, np.nan)
+
+
+def _block_max(arr_flat, weights):
+    arr_grouped = arr_flat[:, weights.indices]
+    nonempty = np.diff(weights.indptr) > 0
+    arr_max = np.full((arr_flat.shape[0], weights.shape[0]), np.nan)
+    if arr_grouped.shape[1] > 0:
+        # the source values of each target cell are contiguous in the csr
+        # matrix, `fmax` ignores missing values
+        arr_max[:, nonempty] = np.fmax.reduceat(
+            arr_grouped, weights.indptr[:-1][nonempty], axis=1
+        )
+    return arr_max
+
+
+def _block_median(arr_flat, weights):
+    n_per_row = np.diff(weights.indptr)
+    rows = np.repeat(np.arange(weights.shape[0]), n_per_row)
+    starts = weights.indptr[:-1]
+    arr_median = np.full((arr_flat.shape[0], weights.shape[0]), np.nan)
+    for n, values in enumerate(arr_flat[:, weights.indices]):
+        # sort the values within each target cell (missing values last)
+        values = values[np.lexsort((values, rows))]
+        n_valid = np.bincount(
+            rows, weights=np.isfinite(values), minlength=weights.shape[0]
+        ).astype(np.int64)
+        has_values = n_valid > 0
+        i_lo = (starts + (n_valid - 1) // 2)[has_values]
+        i_hi = (starts + n_valid // 2)[has_values]
+        arr_median[n, has_values] = 0.5 * (values[i_lo] + values[i_hi])
+    return arr_median
+
+
+def _apply_weights_to_array(arr, weights, shape_out, dtype, reduction=None):
+    shape_extra = arr.shape[:-2]
+    arr_flat = arr.reshape((-1, arr.shape[-2] * arr.shape[-1]))
+    if reduction is None:
+        arr_resampled = weights.dot(arr_flat.T).T
+    else:
+        reduce_fn = dict(mean=_block_mean, median=_block_median, max=_block_max)[
+            reduction
+        ]
+        arr_resampled = reduce_fn(arr_flat.astype(np.float64), weights)
+    return arr_resampled.reshape(shape_extra + shape_out).astype(dtype, copy=False)
+
+
+def apply_weights(da, weights, old_grid, new_grid, keep_attrs=False, reduction=None):
+    """
+    Apply regridding `weights` (computed by `build_weights`) to `da`, which
+    must be defined on `old_grid`. Any dimensions of `da` other than the
+    horizontal ones are kept as is.
+
+    For the block methods `reduction` gives how the source values in each
+    target cell are aggregated (`mean`, `median` or `max`, see
+    `BLOCK_REDUCTIONS`) with `weights` marking which source points are in
+    each cell.
+
+    If `da` is backed by a dask array the regridding is lazy and the weights
+    are applied chunk-by-chunk along the non-horizontal dimensions (e.g. time),
+    so that only a single chunk is held in memory at a time by each worker.
+    For this the data is rechunked to have a single chunk along the horizontal
+    dimensions.
+    """
+    in_dims = horizontal_dims(old_grid)
+    out_dims = horizontal_dims(new_grid)
+    shape_out = tuple(new_grid[d].size for d in out_dims)
+
+    if np.issubdtype(da.dtype, np.floating):
+        dtype = da.dtype
+    else:
+        dtype = np.float64
+
+    if da.chunks is not None:
+        da = da.chunk({d: -1 for d in in_dims})
+
+    da_resampled = xr.apply_ufunc(
+        _apply_weights_to_array,
+        da,
+        kwargs=dict(
+            weights=weights, shape_out=shape_out, dtype=dtype, reduction=reduction
+        ),
+        input_core_dims=[list(in_dims)],
+        output_core_dims=[list(out_dims)],
+        exclude_dims=set(in_dims),
+        dask="parallelized",
+        output_dtypes=[dtype],
+        dask_gufunc_kwargs=dict(output_sizes=dict(zip(out_dims, shape_out))),
+        keep_attrs=keep_attrs,
+    )
+
+    # add cartesian and lat/lon coordinates to regridded data
+    for c in ["x", "y", "lat", "lon"]:
+        if c in new_grid:
+            da_resampled.coords[c] = new_grid[c]
+
+    # for plotting later using the grid's transform (crs) the y-coordinates
+    # must be first
+    da_resampled = da_resampled.transpose(..., "y", "x")
+
+    return da_resampled
+
+
+def resample(
+    da, old_grid, new_grid, keep_attrs=True, method="bilinear", backend="scipy"
+):
+    weights = build_weights(
+        old_grid=old_grid, new_grid=new_grid, method=method, backend=backend
+    )
+    da_resampled = apply_weights(
+        da=da,
+        weights=weights,
+        old_grid=old_grid,
+        new_grid=new_grid,
+        keep_attrs=keep_attrs,
+        reduction=BLOCK_REDUCTIONS.get(method),
+    )
 
     return da_resampled
@@ -1,28 +1,204 @@
-from pyresample import geometry
+"""
+interface for using pyresample interpolation backend. The neighbour
+information pyresample computes for `nearest_s2d` (or `nearest`) and
+`bilinear` resampling is turned into a sparse matrix of regridding weights so
+that it can be cached and applied (lazily for dask arrays) in the same way as
+for the other backends
+"""
+import warnings
 
+import numpy as np
+import pyproj
+import scipy.sparse
+from pyresample import geometry, kd_tree
+from pyresample.bilinear import NumpyBilinearResampler
 
-def get_pyresample_area_def(N, domain):
+from .scipy import _latlon_arrays
+
+
+def _make_area_def(crs, width, height, area_extent):
+    return geometry.AreaDefinition(
+        "tile",
+        "Tile local cartesian grid",
+        "tile",
+        pyproj.CRS.from_user_input(crs),
+        width,
+        height,
+        area_extent,
+    )
+
+
+def get_pyresample_area_def(domain, dx):
     """
+    Create a pyresample `AreaDefinition` for `domain` at resolution `dx`.
+
     When using satpy scenes we're better off using pyresample instead of
     xesmf since it appears faster (I think because it uses dask)
     """
+    # the grid positions are relative to the center of the domain, see
+    # `LocalCartesianDomain.get_grid`
+    nx = int(np.round(domain.l_zonal / dx))
+    ny = int(np.round(domain.l_meridional / dx))
+    x0 = -domain.l_zonal / 2.0
+    y0 = -domain.l_meridional / 2.0
+    area_extent = (x0, y0, x0 + nx * dx, y0 + ny * dx)
+    return _make_area_def(crs=domain.crs, width=nx, height=ny, area_extent=area_extent)
+
+
+def _area_def_from_grid(grid):
+    x, y = grid.x.values, grid.y.values
+    dx = x[1] - x[0]
+    dy = y[1] - y[0]
+    area_extent = (
+        x[0] - 0.5 * dx,
+        y[0] - 0.5 * dy,
+        x[-1] + 0.5 * dx,
+        y[-1] + 0.5 * dy,
+    )
+    return _make_area_def(
+        crs=grid.attrs["crs"], width=x.size, height=y.size, area_extent=area_extent
+    )
+
+
+def _area_to_grid_index(new_grid):
+    """
+    Index mapping points in the flattened pyresample area (rows from north to
+    south) to the flattened target grid (with dimensions `(x, y)` and `y`
+    increasing)
+    """
+    nx, ny = new_grid.x.size, new_grid.y.size
+    i_row, i_col = np.divmod(np.arange(nx * ny), nx)
+    return i_col * ny + (ny - 1 - i_row)
+
+
+def _estimate_radius_of_influence(old_grid, new_grid):
+    """
+    Estimate the radius of influence (in meters) to use when searching for
+    neighbours from the spacing of the source and target grid points
+    """
+    lat, lon = _latlon_arrays(old_grid)
+    geod = pyproj.Geod(ellps="WGS84")
+    spacings = [abs(new_grid.x.values[1] - new_grid.x.values[0])]
+    for axis in [0, 1]:
+        if lat.shape[axis] > 1:
+            sl1 = [slice(None), slice(None)]
+            sl2 = [slice(None), slice(None)]
+            sl1[axis] = slice(0, -1)
+            sl2[axis] = slice(1, None)
+            _, _, dist = geod.inv(
+                lon[tuple(sl1)], lat[tuple(sl1)], lon[tuple(sl2)], lat[tuple(sl2)]
+            )
+            spacings.append(np.nanmax(dist))
+    return 2.0 * max(spacings)
 
-    L = domain.size
-    area_id = "tile"
-    description = "Tile local cartesian grid"
-    proj_id = "ease_tile"
-    x_size = N
-    y_size = N
-    area_extent = (-L, -L, L, L)
-    proj_dict = {
-        "a": 6371228.0,
-        "units": "m",
-        "proj": "laea",
-        "lon_0": domain.lon0,
-        "lat_0": domain.lat0,
-    }
-    area_def = geometry.AreaDefinition(
-        area_id, description, proj_id, proj_dict, x_size, y_size, area_extent
+
+def _nearest_weights(source_def, area_def, radius_of_influence):
+    (
+        valid_input_index,
+        valid_output_index,
+        index_array,
+        _,
+    ) = kd_tree.get_neighbour_info(
+        source_geo_def=source_def,
+        target_geo_def=area_def,
+        radius_of_influence=radius_of_influence,
+        neighbours=1,
     )
+    i_input = np.flatnonzero(valid_input_index)
+    i_output = np.flatnonzero(valid_output_index)
+
+    # points without a neighbour within the radius of influence are given an
+    # index one beyond the valid source points
+    found = index_array < i_input.size
+    rows = [i_output[found], i_output[~found]]
+    cols = [i_input[index_array[found]], np.zeros(np.count_nonzero(~found), int)]
+    vals = [np.ones(np.count_nonzero(found)), np.full(np.count_nonzero(~found), np.nan)]
 
-    return area_def
+    # and those outside of the source data entirely are set to NaN too
+    i_outside = np.flatnonzero(~valid_output_index)
+    rows.append(i_outside)
+    cols.append(np.zeros_like(i_outside))
+    vals.append(np.full(i_outside.shape, np.nan))
+
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(vals)
+
+
+def _bilinear_weights(source_def, area_def, radius_of_influence):
+    resampler = NumpyBilinearResampler(
+        source_geo_def=source_def,
+        target_geo_def=area_def,
+        radius_of_influence=radius_of_influence,
+    )
+    with warnings.catch_warnings():
+        # pyresample converts the target projection to a PROJ string
+        warnings.simplefilter("ignore")
+        resampler.get_bil_info()
+
+    s = resampler.bilinear_s
+    t = resampler.bilinear_t
+    if s.size != area_def.size:
+        raise Exception(
+            "Some of the target grid points aren't valid lat/lon positions and"
+            " so can't be used with the pyresample bilinear resampler"
+        )
+
+    # source grid indices of the four corner points around each target point
+    nx_src = source_def.shape[1]
+    i_corners = resampler.slices_y * nx_src + resampler.slices_x
+
+    mapped = np.isfinite(s) & np.isfinite(t) & ~np.any(resampler.mask_slices, axis=1)
+    i_pt = np.flatnonzero(mapped)
+    s, t = s[mapped], t[mapped]
+
+    rows, cols, vals = [], [], []
+    # the corner-points are weighted in the same manner as in pyresample's
+    # `bilinear._resample`
+    for n, w in enumerate([(1 - s) * (1 - t), s * (1 - t), (1 - s) * t, s * t]):
+        rows.append(i_pt)
+        cols.append(i_corners[mapped, n])
+        vals.append(w)
+
+    i_unmapped = np.flatnonzero(~mapped)
+    rows.append(i_unmapped)
+    cols.append(np.zeros_like(i_unmapped))
+    vals.append(np.full(i_unmapped.shape, np.nan))
+
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(vals)
+
+
+def build_weights(old_grid, new_grid, method, radius_of_influence=None):
+    """
+    Compute the regridding weights with pyresample and return them as a
+    `scipy.sparse.csr_matrix`
+    """
+    lat, lon = _latlon_arrays(old_grid)
+    source_def = geometry.SwathDefinition(lons=lon, lats=lat)
+    area_def = _area_def_from_grid(new_grid)
+    n_in = lat.size
+
+    if radius_of_influence is None:
+        radius_of_influence = _estimate_radius_of_influence(
+            old_grid=old_grid, new_grid=new_grid
+        )
+
+    kwargs = dict(
+        source_def=source_def,
+        area_def=area_def,
+        radius_of_influence=radius_of_influence,
+    )
+    if method in ["nearest_s2d", "nearest"]:
+        rows, cols, vals = _nearest_weights(**kwargs)
+    elif method == "bilinear":
+        rows, cols, vals = _bilinear_weights(**kwargs)
+    else:
+        raise NotImplementedError(
+            f"Regridding method `{method}` isn't implemented for the pyresample"
+            " backend"
+        )
+
+    weights = scipy.sparse.csr_matrix(
+        (vals, (_area_to_grid_index(new_grid)[rows], cols)),
+        shape=(area_def.size, n_in),
+    )
+    weights.eliminate_zeros()
+    return weights
@@ -0,0 +1,448 @@
+"""
+interpolation backend using only numpy and scipy (i.e. without requiring
+ESMF). Both the source and target grid points are projected onto a plane
+(using the projection of the target grid) in which the regridding weights are
+computed:
+
+- `bilinear`: for each target point the source grid cell containing it is
+  found (using a KD-tree over the source grid points to find candidate cells)
+  and the bilinear weights are computed by inverting the bilinear mapping of
+  that cell
+- `nearest_s2d` (or `nearest`): each target point is given the value of the
+  nearest source point, target points further than `nearest_max_distance`
+  (in meters, see `rc.resample`) from any source point
+  (e.g. outside of a satellite swath) are set to NaN
+- `conservative` and `conservative_normed`: the weights are given by the
+  area of overlap between the source and target grid cells (computed from the
+  cell corners `lat_b` and `lon_b`) relative to the area of the target cell
+  (`conservative`) or relative to the area of the target cell covered by
+  source cells (`conservative_normed`), as for xesmf. The grid cells are
+  treated as quadrilaterals in the plane of the target grid projection, which
+  is equal-area for `LocalCartesianDomain` grids
+- `block_mean`, `block_median` and `block_max`: each source point is binned
+  into the target grid cell (of the regular x/y target grid) it falls into.
+  The weights here only record which source points fall into each target
+  cell, the aggregation is done when the weights are applied (see
+  `regridcart.interpolation.backends.common.apply_weights`)
+
+The KD-tree over the projected source grid points is cached (in-memory in
+`kdtree_cache` and pickled in the cache directory if one is set with
+`rc.set_options(cache_dir=...)`) so that it is only built once per source
+grid and target projection, and it is queried in parallel on all CPUs.
+"""
+import pickle
+
+import cartopy.crs as ccrs
+import numpy as np
+import scipy.sparse
+from scipy.spatial import cKDTree
+
+from ...cache import LRUCache, fingerprint, get_disk_cache, get_or_compute
+from ...transform import lonlat_to_xy
+
+# number of target points for which the bilinear weights are computed at a
+# time, this limits the memory used
+CHUNK_SIZE = 2 ** 16
+
+# tolerance used when determining if a point is inside a grid cell, given in
+# the normalised cell coordinates
+CELL_EPS = 1.0e-6
+
+# in-memory cache of the KD-trees built over the projected source grid points
+# (together with the indices of the valid source points in the tree)
+kdtree_cache = LRUCache(maxsize=8, maxbytes=1024 ** 3)
+
+
+def _latlon_arrays(grid):
+    """
+    Return lat/lon of every grid point as 2D arrays with dimensions in the
+    same order as `horizontal_dims(grid)`
+    """
+    if len(grid.lat.dims) == 1:
+        lon, lat = np.meshgrid(grid.lon.values, grid.lat.values)
+    else:
+        lat = grid.lat.transpose(*grid.lon.dims).values
+        lon = grid.lon.values
+    return lat, lon
+
+
+def _grid_size(grid):
+    if len(grid.lat.dims) == 1:
+        return grid.lat.size * grid.lon.size
+    return grid.lat.size
+
+
+def _get_plane_crs(new_grid):
+    crs = new_grid.attrs.get("crs")
+    if crs is None:
+        lat, lon = _latlon_arrays(new_grid)
+        lon_rad = np.deg2rad(lon)
+        lon_c = np.rad2deg(
+            np.arctan2(np.nanmean(np.sin(lon_rad)), np.nanmean(np.cos(lon_rad)))
+        )
+        crs = ccrs.LambertAzimuthalEqualArea(
+            central_latitude=np.nanmean(lat), central_longitude=lon_c
+        )
+    return crs
+
+
+def _latlon_bounds_arrays(grid):
+    """
+    Return lat/lon of the corners of every grid cell as 2D arrays with
+    dimensions in the same order as `horizontal_dims(grid)`
+    """
+    if len(grid.lat_b.dims) == 1:
+        lon_b, lat_b = np.meshgrid(grid.lon_b.values, grid.lat_b.values)
+    else:
+        lat_b = grid.lat_b.transpose(*grid.lon_b.dims).values
+        lon_b = grid.lon_b.values
+    return lat_b, lon_b
+
+
+def _project(crs, lat, lon):
+    return lonlat_to_xy(lon=lon, lat=lat, crs=crs)
+
+
+def _kdtree_nbytes(tree, idx_valid):
+    # the tree stores the points and an index array of the same length
+    return 2 * tree.data.nbytes + idx_valid.nbytes
+
+
+def _build_kdtree(x_src, y_src):
+    valid = np.isfinite(x_src) & np.isfinite(y_src)
+    idx_valid = np.flatnonzero(valid)
+    tree = cKDTree(np.stack([x_src[valid], y_src[valid]], axis=-1))
+    return tree, idx_valid
+
+
+def _load_pickle(filename):
+    with open(filename, "rb") as fh:
+        return pickle.load(fh)
+
+
+def _dump_pickle(value, filename):
+    with open(filename, "wb") as fh:
+        pickle.dump(value, fh, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _get_kdtree(old_grid, crs, xy_src=None):
+    """
+    Get the KD-tree over the source grid points of `old_grid` projected with
+    `crs` and the (flattened) indices of the valid source points in the tree,
+    either from the in-memory cache, the cache directory on disk (if
+    `regridcart.set_options(cache_dir=...)` is set) or by building it. The
+    projected source points can be given with `xy_src` if already computed
+    """
+    lat, lon = _latlon_arrays(old_grid)
+
+    def _compute():
+        x_src, y_src = xy_src if xy_src is not None else _project(crs, lat, lon)
+        return _build_kdtree(x_src, y_src)
+
+    return get_or_compute(
+        fingerprint(crs.to_wkt(), lat, lon),
+        compute_fn=_compute,
+        memory_cache=kdtree_cache,
+        disk_cache=get_disk_cache("kdtree", suffix=".pkl"),
+        load_fn=_load_pickle,
+        dump_fn=_dump_pickle,
+        nbytes_fn=lambda value: _kdtree_nbytes(*value),
+    )
+
+
+def _inverse_bilinear(corners, xp, yp, n_iter=8):
+    """
+    Compute the normalised cell coordinates `(s, t)` of points `(xp, yp)` in
+    the quadrilateral cells with corners `corners` (given as
+    `[(x00, y00), (x10, y10), (x01, y01), (x11, y11)]`) by Newton iteration of
+    the bilinear mapping
+
+        p(s, t) = p00 + s * (p10 - p00) + t * (p01 - p00)
+                  + s * t * (p11 - p10 - p01 + p00)
+    """
+    (x00, y00), (x10, y10), (x01, y01), (x11, y11) = corners
+    ax, ay = x10 - x00, y10 - y00
+    bx, by = x01 - x00, y01 - y00
+    cx, cy = x11 - x10 - x01 + x00, y11 - y10 - y01 + y00
+
+    s = np.full_like(xp, 0.5)
+    t = np.full_like(xp, 0.5)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for _ in range(n_iter):
+            fx = x00 + ax * s + bx * t + cx * s * t - xp
+            fy = y00 + ay * s + by * t + cy * s * t - yp
+            j11, j12 = ax + cx * t, bx + cx * s
+            j21, j22 = ay + cy * t, by + cy * s
+            det = j11 * j22 - j12 * j21
+            s = s - (j22 * fx - j12 * fy) / det
+            t = t - (j11 * fy - j21 * fx) / det
+    return s, t
+
+
+def _bilinear_weights(x_src, y_src, x_dst, y_dst, kdtree):
+    ny, nx = x_src.shape
+    if ny < 2 or nx < 2:
+        raise ValueError(
+            "Bilinear interpolation requires at least two source grid points"
+            " in each horizontal direction"
+        )
+
+    tree, idx_valid = kdtree
+    k = min(4, idx_valid.size)
+
+    # offsets of the lower-left corners of the four cells sharing a grid point
+    dj = np.array([0, -1, 0, -1])
+    di = np.array([0, 0, -1, -1])
+
+    rows, cols, vals = [], [], []
+    n_out = x_dst.size
+    for i_start in range(0, n_out, CHUNK_SIZE):
+        xp = x_dst[i_start : i_start + CHUNK_SIZE]
+        yp = y_dst[i_start : i_start + CHUNK_SIZE]
+        n = xp.size
+
+        # candidate cells are those sharing a corner with one of the nearest
+        # source grid points
+        _, nn = tree.query(np.stack([xp, yp], axis=-1), k=k, workers=-1)
+        nn = nn.reshape((n, k))
+        j_nn, i_nn = np.divmod(idx_valid[np.clip(nn, 0, idx_valid.size - 1)], nx)
+        j0 = np.clip(j_nn[:, :, None] + dj, 0, ny - 2).reshape((n, -1))
+        i0 = np.clip(i_nn[:, :, None] + di, 0, nx - 2).reshape((n, -1))
+
+        corners = [
+            (x_src[j0 + oj, i0 + oi], y_src[j0 + oj, i0 + oi])
+            for (oj, oi) in [(0, 0), (0, 1), (1, 0), (1, 1)]
+        ]
+        s, t = _inverse_bilinear(corners, xp[:, None], yp[:, None])
+
+        with np.errstate(invalid="ignore"):
+            inside = (
+                (s >= -CELL_EPS)
+                & (s <= 1.0 + CELL_EPS)
+                & (t >= -CELL_EPS)
+                & (t <= 1.0 + CELL_EPS)
+            )
+        mapped = inside.any(axis=1)
+        i_cand = inside.argmax(axis=1)[mapped]
+        i_pt = np.flatnonzero(mapped)
+
+        s = np.clip(s[i_pt, i_cand], 0.0, 1.0)
+        t = np.clip(t[i_pt, i_cand], 0.0, 1.0)
+        j0 = j0[i_pt, i_cand]
+        i0 = i0[i_pt, i_cand]
+
+        for (oj, oi), w in [
+            ((0, 0), (1.0 - s) * (1.0 - t)),
+            ((0, 1), s * (1.0 - t)),
+            ((1, 0), (1.0 - s) * t),
+            ((1, 1), s * t),
+        ]:
+            rows.append(i_start + i_pt)
+            cols.append((j0 + oj) * nx + (i0 + oi))
+            vals.append(w)
+
+        # target points outside the source grid are set to NaN
+        i_unmapped = np.flatnonzero(~mapped)
+        rows.append(i_start + i_unmapped)
+        cols.append(np.zeros_like(i_unmapped))
+        vals.append(np.full(i_unmapped.shape, np.nan))
+
+    weights = scipy.sparse.csr_matrix(
+        (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(n_out, nx * ny),
+    )
+    weights.eliminate_zeros()
+    return weights
+
+
+def _nearest_weights(x_dst, y_dst, kdtree, n_in, max_distance=None):
+    tree, idx_valid = kdtree
+    _, nn = tree.query(
+        np.stack([x_dst, y_dst], axis=-1),
+        k=1,
+        distance_upper_bound=np.inf if max_distance is None else max_distance,
+        workers=-1,
+    )
+
+    # target points without a source point within `max_distance` are given
+    # an index one beyond the points in the tree, these are set to NaN
+    n_out = x_dst.size
+    found = nn < idx_valid.size
+    vals = np.where(found, 1.0, np.nan)
+    cols = idx_valid[np.where(found, nn, 0)]
+    return scipy.sparse.csr_matrix(
+        (vals, (np.arange(n_out), cols)),
+        shape=(n_out, n_in),
+    )
+
+
+def _import_shapely():
+    # the vectorized geometry functions used here are only available from
+    # shapely 2.0
+    try:
+        import shapely
+    except ImportError as ex:
+        raise ImportError(
+            "Conservative regridding with the `scipy` backend requires shapely"
+            " (>=2.0), install it with `pip install regridcart[conservative]`"
+        ) from ex
+    if not hasattr(shapely, "polygons"):
+        raise ImportError(
+            "Conservative regridding with the `scipy` backend requires shapely"
+            f" >= 2.0 (found {shapely.__version__}), upgrade it with"
+            " `pip install regridcart[conservative]`"
+        )
+    return shapely
+
+
+def _cell_polygons(x_b, y_b):
+    """
+    Polygons for the grid cells with corners `(x_b, y_b)` (each with shape
+    `(N0+1, N1+1)`), flattened in C-order over the cells
+    """
+    shapely = _import_shapely()
+
+    corners = [
+        (x_b[:-1, :-1], y_b[:-1, :-1]),
+        (x_b[:-1, 1:], y_b[:-1, 1:]),
+        (x_b[1:, 1:], y_b[1:, 1:]),
+        (x_b[1:, :-1], y_b[1:, :-1]),
+    ]
+    coords = np.stack(
+        [np.stack([x.ravel(), y.ravel()], axis=-1) for (x, y) in corners], axis=1
+    )
+    valid = np.all(np.isfinite(coords), axis=(1, 2))
+    polygons = np.full(coords.shape[0], None, dtype=object)
+    polygons[valid] = shapely.polygons(coords[valid])
+    # cells which are folded over themselves (e.g. where the projection is
+    # singular) can't be used
+    polygons[valid & ~shapely.is_valid(polygons)] = None
+    return polygons
+
+
+def _conservative_weights(old_grid, new_grid, crs, normed):
+    shapely = _import_shapely()
+
+    src_polygons = _cell_polygons(*_project(crs, *_latlon_bounds_arrays(old_grid)))
+    dst_polygons = _cell_polygons(*_project(crs, *_latlon_bounds_arrays(new_grid)))
+    n_in, n_out = src_polygons.size, dst_polygons.size
+
+    # find all pairs of overlapping source and target cells
+    i_src_valid = np.flatnonzero(src_polygons != None)  # noqa
+    tree = shapely.STRtree(src_polygons[i_src_valid])
+    i_dst, i_tree = tree.query(dst_polygons, predicate="intersects")
+    i_src = i_src_valid[i_tree]
+
+    overlap = shapely.area(
+        shapely.intersection(dst_polygons[i_dst], src_polygons[i_src])
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if normed:
+            norm = np.bincount(i_dst, weights=overlap, minlength=n_out)
+        else:
+            norm = shapely.area(dst_polygons).astype(np.float64)
+        vals = overlap / norm[i_dst]
+
+    mapped = vals > 0.0
+    rows, cols, vals = i_dst[mapped], i_src[mapped], vals[mapped]
+
+    # target cells not overlapping any source cells are set to NaN
+    i_unmapped = np.setdiff1d(np.arange(n_out), rows)
+    rows = np.concatenate([rows, i_unmapped])
+    cols = np.concatenate([cols, np.zeros_like(i_unmapped)])
+    vals = np.concatenate([vals, np.full(i_unmapped.shape, np.nan)])
+
+    return scipy.sparse.csr_matrix((vals, (rows, cols)), shape=(n_out, n_in))
+
+
+def _block_weights(old_grid, new_grid, crs):
+    """
+    Sparse matrix (with value 1) assigning each source point to the target
+    cell it falls in, the target cells are given by the regular 1D `x` and `y`
+    coordinates of `new_grid` in the plane of `crs`
+    """
+    if "x" not in new_grid.coords or "y" not in new_grid.coords:
+        raise Exception(
+            "Binning into blocks requires a target grid with regularly spaced"
+            " `x` and `y` coordinates"
+        )
+    x_src, y_src = _project(crs, *_latlon_arrays(old_grid))
+
+    # target cells are flattened in C-order over the dimensions of the
+    # target lat/lon (see `horizontal_dims`)
+    out_dims = new_grid.lon.dims
+    idx = {}
+    for d, coord_src in [("x", x_src.ravel()), ("y", y_src.ravel())]:
+        coord = new_grid[d].values
+        dx = coord[1] - coord[0]
+        with np.errstate(invalid="ignore"):
+            idx[d] = np.floor((coord_src - (coord[0] - 0.5 * dx)) / dx)
+    n_cells = {d: new_grid[d].size for d in out_dims}
+
+    inside = np.ones(x_src.size, dtype=bool)
+    for d in out_dims:
+        inside &= (idx[d] >= 0) & (idx[d] < n_cells[d])
+    i_src = np.flatnonzero(inside)
+    i_dst = np.ravel_multi_index(
+        tuple(idx[d][inside].astype(np.int64) for d in out_dims),
+        tuple(n_cells[d] for d in out_dims),
+    )
+
+    n_out = int(np.prod(list(n_cells.values())))
+    return scipy.sparse.csr_matrix(
+        (np.ones(i_src.size), (i_dst, i_src)), shape=(n_out, x_src.size)
+    )
+
+
+def build_weights(old_grid, new_grid, method, nearest_max_distance=None):
+    """
+    Compute the regridding weights and return them as a
+    `scipy.sparse.csr_matrix`. For nearest-neighbour regridding target points
+    further than `nearest_max_distance` (in meters, `None` for no limit) from
+    any source point are given no weights
+    """
+    crs = _get_plane_crs(new_grid=new_grid)
+
+    if method in ["conservative", "conservative_normed"]:
+        for grid in [old_grid, new_grid]:
+            if "lat_b" not in grid or "lon_b" not in grid:
+                raise Exception(
+                    "Conservative regridding requires the cell corners (`lat_b`"
+                    " and `lon_b`) of both the source and target grids"
+                )
+        return _conservative_weights(
+            old_grid=old_grid,
+            new_grid=new_grid,
+            crs=crs,
+            normed=method == "conservative_normed",
+        )
+
+    if method in ["block_mean", "block_median", "block_max"]:
+        return _block_weights(old_grid=old_grid, new_grid=new_grid, crs=crs)
+
+    x_dst, y_dst = _project(crs, *_latlon_arrays(new_grid))
+    x_dst, y_dst = x_dst.ravel(), y_dst.ravel()
+
+    if method == "bilinear":
+        x_src, y_src = _project(crs, *_latlon_arrays(old_grid))
+        weights = _bilinear_weights(
+            x_src=x_src,
+            y_src=y_src,
+            x_dst=x_dst,
+            y_dst=y_dst,
+            kdtree=_get_kdtree(old_grid=old_grid, crs=crs, xy_src=(x_src, y_src)),
+        )
+    elif method in ["nearest_s2d", "nearest"]:
+        weights = _nearest_weights(
+            x_dst=x_dst,
+            y_dst=y_dst,
+            kdtree=_get_kdtree(old_grid=old_grid, crs=crs),
+            n_in=_grid_size(old_grid),
+            max_distance=nearest_max_distance,
+        )
+    else:
+        raise NotImplementedError(
+            f"Regridding method `{method}` isn't implemented for the scipy backend"
+        )
+
+    return weights
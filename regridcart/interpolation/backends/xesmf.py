@@ -4,62 +4,101 @@ interface for using xesmf interpolation backend
 import warnings
 from pathlib import Path
 
+import scipy.sparse
+import xarray as xr
 import xesmf
-from xesmf.backend import esmf_regrid_build, esmf_regrid_finalize
 
+from ...cache import DiskCache, fingerprint
+from ...options import OPTIONS
 
-class SilentRegridder(xesmf.Regridder):
+
+def _grid_shape(grid):
+    if len(grid.lat.shape) == 1:
+        return (grid.lat.shape[0], grid.lon.shape[0])
+    return grid.lat.shape
+
+
+def _weights_cache_key(old_grid, new_grid, method):
     """
-    Wrapper class for xesmf regridder which doesn't print logging info to console
+    Key identifying the regridding weights for regridding between `old_grid`
+    and `new_grid` with `method`. The grid shapes are included to make the
+    filenames in the cache directory easier to interpret
     """
+    Ny_in, Nx_in = _grid_shape(old_grid)
+    Ny_out, Nx_out = _grid_shape(new_grid)
+    grid_vars = ["lat", "lon", "lat_b", "lon_b"]
+    grid_hash = fingerprint(
+        *[old_grid[v] for v in grid_vars if v in old_grid],
+        *[new_grid[v] for v in grid_vars if v in new_grid],
+        method,
+    )
+    return f"{method}_{Ny_in}x{Nx_in}_{Ny_out}x{Nx_out}_{grid_hash}"
 
-    def _write_weight_file(self):
-        if Path(self.filename).exists():
-            if self.reuse_weights:
-                return  # do not compute it again, just read it
-            else:
-                Path(self.filename).unlink()
 
-        regrid = esmf_regrid_build(
-            self._grid_in, self._grid_out, self.method, filename=self.filename
-        )
-        esmf_regrid_finalize(regrid)  # only need weights, not regrid object
+def _build_regridder(old_grid, new_grid, method, **kwargs):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return xesmf.Regridder(ds_in=old_grid, ds_out=new_grid, method=method, **kwargs)
 
 
-def _save_weights(da, new_grid, regridder_tmpdir, method):
-    Nx_in, Ny_in = da.x.shape[0], da.y.shape[0]
-    Nx_out, Ny_out = int(new_grid.x.count()), int(new_grid.y.count())
+def _get_regridder(old_grid, new_grid, method):
+    """
+    Create a xesmf regridder, loading the weights from the cache directory
+    (set with `regridcart.set_options(cache_dir=...)`) if they have been
+    computed before and storing them there if they haven't
+    """
+    if OPTIONS["cache_dir"] is None:
+        return _build_regridder(old_grid=old_grid, new_grid=new_grid, method=method)
 
-    regridder_weights_fn = "{method}_{Ny_in}x{Nx_in}_{Ny_out}x{Nx_out}" ".nc".format(
-        method=method,
-        Ny_in=Ny_in,
-        Nx_in=Nx_in,
-        Nx_out=Nx_out,
-        Ny_out=Ny_out,
+    cache = DiskCache(
+        path=Path(OPTIONS["cache_dir"]) / "weights" / "xesmf",
+        max_bytes=OPTIONS["cache_max_bytes"],
     )
+    key = _weights_cache_key(old_grid=old_grid, new_grid=new_grid, method=method)
 
-    Path(regridder_tmpdir).mkdir(exist_ok=True, parents=True)
-    regridder_weights_fn = str(regridder_tmpdir / regridder_weights_fn)
+    fp_weights = cache.get(key)
+    if fp_weights is not None:
+        try:
+            return _build_regridder(
+                old_grid=old_grid,
+                new_grid=new_grid,
+                method=method,
+                filename=str(fp_weights),
+                reuse_weights=True,
+            )
+        except (FileNotFoundError, OSError):
+            # the weights file was evicted by another process after we
+            # looked it up, so we compute the weights again below
+            pass
 
+    regridders = []
 
-def resample(da, old_grid, new_grid, method, keep_attrs):
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore")
-        regridder = xesmf.Regridder(
-            ds_in=old_grid,
-            ds_out=new_grid,
-            method=method,
+    def _write_weights(filename):
+        # xesmf writes the weights to `filename` when `reuse_weights=False`
+        regridders.append(
+            _build_regridder(
+                old_grid=old_grid,
+                new_grid=new_grid,
+                method=method,
+                filename=filename,
+                reuse_weights=False,
+            )
         )
-        da_resampled = regridder(da)
 
-    da_resampled = regridder(da)
+    cache.put(key, _write_weights)
+    return regridders[0]
 
-    # add cartesian coordinates to regridded data
-    da_resampled["x"] = new_grid.x
-    da_resampled["y"] = new_grid.y
 
-    # for plotting later using the grid's transform (crs) the y-coordinates
-    # must be first
-    da_resampled = da_resampled.transpose(..., "y", "x")
+def build_weights(old_grid, new_grid, method):
+    """
+    Compute the regridding weights with xesmf and return them as a
+    `scipy.sparse.csr_matrix`
+    """
+    regridder = _get_regridder(old_grid=old_grid, new_grid=new_grid, method=method)
 
-    return da_resampled
+    weights = regridder.weights
+    # since xesmf v0.6 the weights are stored as a `sparse.COO` array
+    # wrapped in a xr.DataArray, before that as a `scipy.sparse.coo_matrix`
+    if isinstance(weights, xr.DataArray):
+        weights = weights.data
+    return scipy.sparse.csr_matrix(weights.tocsr())
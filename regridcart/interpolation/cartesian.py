@@ -0,0 +1,262 @@
+"""
+Resampling of data which is already on a regular Cartesian (x, y) grid in the
+same projection as the target domain (for example model output on the
+tangent plane of a `LocalCartesianDomain`). Here no lat/lon coordinates or
+regridding weights over the full grid are needed: the regridding is
+separable into 1D operations along `x` and `y`, and coarsening by an integer
+factor onto aligned grid cells is a block average
+"""
+import numpy as np
+import pyproj
+import scipy.sparse
+import xarray as xr
+
+from ..coords import has_latlon_coords, parse_crs
+from ..cropping import _has_spatial_coord
+
+METHODS = ["bilinear", "nearest_s2d", "conservative", "conservative_normed"]
+
+# tolerance (in degrees) used when checking that lat/lon coordinates of the
+# source data match the projection of the domain
+LATLON_ATOL = 1.0e-5
+
+
+def _is_regular(x):
+    dx = np.diff(x)
+    return dx.size > 0 and np.allclose(dx, dx[0], rtol=1.0e-6, atol=0.0)
+
+
+def _latlon_matches_domain(domain, da):
+    """
+    Check that the lat/lon coordinates of the corners of `da` are where the
+    (x, y) coordinates of `da` are in the projection of `domain`
+    """
+    corners = dict(x=[0, -1, 0, -1], y=[0, 0, -1, -1])
+    x = da.x.values[corners["x"]]
+    y = da.y.values[corners["y"]]
+    lons, lats = domain.latlon_from_xy(x=x, y=y)
+    indexers = {d: xr.DataArray(idx, dims=("corner",)) for (d, idx) in corners.items()}
+    da_lat = da.lat.isel({d: idx for (d, idx) in indexers.items() if d in da.lat.dims})
+    da_lon = da.lon.isel({d: idx for (d, idx) in indexers.items() if d in da.lon.dims})
+    dlon = (np.broadcast_to(da_lon.values, lons.shape) - lons + 180.0) % 360.0 - 180.0
+    dlat = np.broadcast_to(da_lat.values, lats.shape) - lats
+    return bool(
+        np.all(np.abs(dlon) < LATLON_ATOL) and np.all(np.abs(dlat) < LATLON_ATOL)
+    )
+
+
+def is_on_domain_projection(domain, da):
+    """
+    Check whether `da` is given on a regular grid with 1D `x` and `y`
+    coordinates (in meters) in the same projection as `domain` so that it
+    can be resampled without going through lat/lon coordinates. For domains
+    without a projection (`CartesianDomain`) this only requires `x` and `y`
+    coordinates in meters, for a `LocalCartesianDomain` the projection
+    information of `da` (or otherwise its lat/lon coordinates) must match
+    the domain's projection
+    """
+    for c in ["x", "y"]:
+        if not _has_spatial_coord(da, c) or da[c].dims != (c,) or da[c].size < 2:
+            return False
+
+    if not hasattr(domain, "crs"):
+        return True
+
+    crs = parse_crs(da)
+    if crs is not None:
+        return pyproj.CRS.from_user_input(crs).equals(
+            domain.crs, ignore_axis_order=True
+        )
+    elif has_latlon_coords(da):
+        return _latlon_matches_domain(domain=domain, da=da)
+    return False
+
+
+def _cell_edges(x, dx=None):
+    """
+    Edges of the grid cells with (sorted) centres `x`, with cells spanning
+    halfway to the neighbouring centres, or of width `dx` if given
+    """
+    if dx is not None:
+        return np.append(x - 0.5 * dx, x[-1] + 0.5 * dx)
+    x_mid = 0.5 * (x[1:] + x[:-1])
+    return np.concatenate([[2.0 * x[0] - x_mid[0]], x_mid, [2.0 * x[-1] - x_mid[-1]]])
+
+
+def _weights_1d(x_in, x_out, dx_out, method):
+    """
+    Sparse 1D regridding weights of shape `(x_out.size, x_in.size)` from the
+    grid points `x_in` (sorted in either direction) onto `x_out` (regularly
+    spaced by `dx_out`). Rows of target points outside of the source grid
+    have no weights
+    """
+    order = np.argsort(x_in)
+    xs = x_in[order]
+    n_in = xs.size
+
+    if method == "bilinear":
+        j = np.clip(np.searchsorted(xs, x_out) - 1, 0, n_in - 2)
+        t = (x_out - xs[j]) / (xs[j + 1] - xs[j])
+        valid = (x_out >= xs[0]) & (x_out <= xs[-1])
+        rows = np.repeat(np.nonzero(valid)[0], 2)
+        cols = np.stack([j[valid], j[valid] + 1], axis=-1).ravel()
+        values = np.stack([1.0 - t[valid], t[valid]], axis=-1).ravel()
+    elif method == "nearest_s2d":
+        edges = _cell_edges(xs)
+        j = np.searchsorted(edges, x_out, side="right") - 1
+        valid = (j >= 0) & (j < n_in)
+        rows = np.nonzero(valid)[0]
+        cols = j[valid]
+        values = np.ones(rows.size)
+    elif method.startswith("conservative"):
+        edges_in = _cell_edges(xs)
+        edges_out = _cell_edges(x_out, dx=dx_out)
+        # range of source cells overlapping each of the target cells
+        j_start = np.searchsorted(edges_in[1:], edges_out[:-1], side="right")
+        j_end = np.searchsorted(edges_in[:-1], edges_out[1:], side="left")
+        n_overlap = np.maximum(j_end - j_start, 0)
+        rows = np.repeat(np.arange(x_out.size), n_overlap)
+        cols = np.concatenate(
+            [np.arange(j0, j1) for (j0, j1) in zip(j_start, j_end)] + [[]]
+        ).astype(int)
+        overlap = np.minimum(edges_out[1:][rows], edges_in[1:][cols]) - np.maximum(
+            edges_out[:-1][rows], edges_in[:-1][cols]
+        )
+        values = overlap / dx_out
+        keep = values > 0.0
+        rows, cols, values = rows[keep], cols[keep], values[keep]
+    else:
+        raise NotImplementedError(method)
+
+    return scipy.sparse.csr_matrix(
+        (values, (rows, order[cols])), shape=(x_out.size, n_in)
+    )
+
+
+def _apply_weights_1d(values, weights, axis):
+    values = np.moveaxis(values, axis, 0)
+    shape = values.shape
+    values_new = weights @ values.reshape(shape[0], -1)
+    return np.moveaxis(values_new.reshape((weights.shape[0],) + shape[1:]), 0, axis)
+
+
+def _apply_separable_weights(values, weights_x, weights_y, normed, dtype):
+    # `values` has the horizontal dimensions last as (..., y, x)
+    values = values.astype(np.float64)
+    if normed:
+        mask = np.isfinite(values)
+        values = np.where(mask, values, 0.0)
+
+    values_new = _apply_weights_1d(values, weights_x, axis=-1)
+    values_new = _apply_weights_1d(values_new, weights_y, axis=-2)
+
+    if normed:
+        coverage = _apply_weights_1d(mask.astype(np.float64), weights_x, axis=-1)
+        coverage = _apply_weights_1d(coverage, weights_y, axis=-2)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            values_new = values_new / coverage
+        values_new[coverage == 0.0] = np.nan
+
+    # target points with no source points mapped onto them are missing
+    unmapped_x = np.diff(weights_x.indptr) == 0
+    unmapped_y = np.diff(weights_y.indptr) == 0
+    values_new[..., unmapped_y, :] = np.nan
+    values_new[..., :, unmapped_x] = np.nan
+
+    return values_new.astype(dtype)
+
+
+def _block_mean_slices(x_in, x_out, dx_out):
+    """
+    If the target cells (centred on `x_out` with width `dx_out`) are each made
+    up of exactly `n` of the (regular, ascending) source cells centred on
+    `x_in`, return `n` and the slice selecting the source cells covered by
+    the target grid. Otherwise `None` is returned
+    """
+    if not _is_regular(x_in) or x_in[1] < x_in[0]:
+        return None
+    dx_in = x_in[1] - x_in[0]
+    n = dx_out / dx_in
+    i_start = (x_out[0] - 0.5 * dx_out - (x_in[0] - 0.5 * dx_in)) / dx_in
+    if not (np.isclose(n, np.round(n)) and np.isclose(i_start, np.round(i_start))):
+        return None
+    n = int(np.round(n))
+    i_start = int(np.round(i_start))
+    i_end = i_start + n * x_out.size
+    if n < 1 or i_start < 0 or i_end > x_in.size:
+        return None
+    return n, slice(i_start, i_end)
+
+
+def _drop_horizontal_coords(da):
+    return da.drop_vars([c for c in da.coords if set(da[c].dims) & {"x", "y"}])
+
+
+def cartesian_resample(da, new_grid, method="bilinear", keep_attrs=False):
+    """
+    Resample `da`, given on a regular grid with 1D `x` and `y` coordinates,
+    onto the grid `new_grid` (as returned by `domain.get_grid(dx)`) in the
+    same projection. Conservative coarsening by an integer factor onto
+    aligned cells is done by block averaging (with `da.coarsen`), otherwise
+    the regridding is applied as separate 1D sparse interpolations along `x`
+    and `y`. `da` may be a data-array or a dataset with all data variables
+    defined on the (x, y) grid.
+    """
+    if method not in METHODS:
+        raise NotImplementedError(method)
+
+    x_out, y_out = new_grid.x.values, new_grid.y.values
+    dx_out = x_out[1] - x_out[0]
+    dy_out = y_out[1] - y_out[0]
+    x_in, y_in = da.x.values, da.y.values
+
+    block_slices = None
+    if method.startswith("conservative"):
+        block_slices = [
+            _block_mean_slices(x_in, x_out, dx_out),
+            _block_mean_slices(y_in, y_out, dy_out),
+        ]
+
+    if block_slices is not None and None not in block_slices:
+        (nx, slice_x), (ny, slice_y) = block_slices
+        da_resampled = _drop_horizontal_coords(da.isel(x=slice_x, y=slice_y))
+        da_coarsened = da_resampled.coarsen(x=nx, y=ny)
+        if method == "conservative_normed":
+            # missing values are skipped, i.e. the mean is renormalised by the
+            # number of valid values
+            da_resampled = da_coarsened.mean()
+        else:
+            da_resampled = da_coarsened.reduce(np.mean)
+    else:
+        weights_x = _weights_1d(x_in, x_out, dx_out=dx_out, method=method)
+        weights_y = _weights_1d(y_in, y_out, dx_out=dy_out, method=method)
+        if da.chunks is not None:
+            da = da.chunk(dict(x=-1, y=-1))
+        dtype = da.dtype if np.issubdtype(da.dtype, np.floating) else np.float64
+        da_resampled = xr.apply_ufunc(
+            _apply_separable_weights,
+            _drop_horizontal_coords(da),
+            kwargs=dict(
+                weights_x=weights_x,
+                weights_y=weights_y,
+                normed=method == "conservative_normed",
+                dtype=dtype,
+            ),
+            input_core_dims=[["y", "x"]],
+            output_core_dims=[["y", "x"]],
+            exclude_dims={"x", "y"},
+            dask="parallelized",
+            output_dtypes=[dtype],
+            dask_gufunc_kwargs=dict(output_sizes=dict(x=x_out.size, y=y_out.size)),
+        )
+
+    for c in ["x", "y", "lat", "lon"]:
+        if c in new_grid:
+            da_resampled.coords[c] = new_grid[c]
+
+    da_resampled.attrs = dict(da.attrs) if keep_attrs else {}
+    if isinstance(da, xr.Dataset):
+        for v in da_resampled.data_vars:
+            da_resampled[v].attrs = dict(da[v].attrs) if keep_attrs else {}
+
+    return da_resampled.transpose(..., "y", "x")
@@ -1,18 +1,367 @@
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import xarray as xr
 
+from ..cache import LRUCache, fingerprint
 from ..coords import (
     NoProjectionInformationFound,
+    get_latlon_bounds,
     get_latlon_coords_using_crs,
     has_latlon_coords,
+    latlon_coords_cache,
+    parse_crs,
+)
+from ..cropping import SpatialIndex, _apply_crop_indexers, get_crop_indexers
+from ..domain import grid_cache
+from ..instrumentation import stage
+from ..options import OPTIONS
+from . import cartesian
+from .backends.common import (
+    BLOCK_REDUCTIONS,
+    apply_weights,
+    build_weights,
+    horizontal_dims,
+    weights_nbytes,
 )
-from ..cropping import crop_field_to_domain
-from .backends.common import resample as resample_common
 
+# in-memory cache of regridding weights so that repeatedly regridding data on
+# the same source grid onto the same domain skips computing the weights. Use
+# `weights_cache.info()` for hit/miss statistics and change the limits by
+# setting `weights_cache.maxsize` and `weights_cache.maxbytes`
+weights_cache = LRUCache(maxsize=32, maxbytes=1024 ** 3)
+
+
+# variables of the source and target grids used to compute regridding
+# weights, `lat_b` and `lon_b` (the cell corners) are only needed for
+# conservative regridding
+GRID_VARIABLES = ["lat", "lon", "lat_b", "lon_b"]
+
+
+def _needs_bounds(method):
+    return method.startswith("conservative")
+
+
+def _isel_grid(grid, indexers):
+    """
+    Index `grid` with `indexers` (slices, or integer arrays for longitudes
+    cropped across the seam of global grids, along the horizontal
+    dimensions), also indexing the cell corners (along the `{dim}_b`
+    dimensions) if present
+    """
+    indexers_grid = {}
+    for d, idx in indexers.items():
+        if d not in grid.dims:
+            continue
+        indexers_grid[d] = idx
+        if f"{d}_b" in grid.dims:
+            if isinstance(idx, slice):
+                start, stop, _ = idx.indices(grid.sizes[d])
+                indexers_grid[f"{d}_b"] = slice(start, stop + 1)
+            else:
+                indexers_grid[f"{d}_b"] = np.append(idx, idx[-1] + 1)
+    return _apply_crop_indexers(grid, indexers_grid)
+
+
+def _use_cartesian_resample(domain, da, method):
+    return method in cartesian.METHODS and cartesian.is_on_domain_projection(
+        domain=domain, da=da
+    )
+
+
+def _cartesian_resample(domain, da, dx, method, keep_attrs):
+    """
+    Resample `da`, which is already on a regular (x, y) grid in the
+    projection of `domain`, directly onto the domain's grid (see
+    `regridcart.interpolation.cartesian`)
+    """
+    with stage("target_grid", cache=grid_cache) as info:
+        new_grid = domain.get_grid(dx=dx)
+        info.output = new_grid
+
+    with stage("apply", input=da) as info:
+        info.output = cartesian.cartesian_resample(
+            da=da, new_grid=new_grid, method=method, keep_attrs=keep_attrs
+        )
+    return info.output
+
+
+def get_weights(
+    domain, dx, old_grid, new_grid, method, backend, nearest_max_distance=None
+):
+    """
+    Get the regridding weights from `old_grid` onto `domain` at resolution
+    `dx`, either from the in-memory cache or by computing them. For
+    nearest-neighbour regridding `nearest_max_distance` defaults to the
+    `nearest_max_distance` option
+    """
+    if not method.startswith("nearest"):
+        nearest_max_distance = None
+    elif nearest_max_distance is None:
+        nearest_max_distance = OPTIONS["nearest_max_distance"]
+
+    key = (
+        fingerprint(*[old_grid[v] for v in GRID_VARIABLES if v in old_grid]),
+        domain.__class__.__name__,
+        fingerprint(domain.serialize()),
+        float(dx),
+        method,
+        backend,
+        nearest_max_distance,
+    )
+    weights = weights_cache.get(key)
+    if weights is None:
+        weights = build_weights(
+            old_grid=old_grid,
+            new_grid=new_grid,
+            method=method,
+            backend=backend,
+            nearest_max_distance=nearest_max_distance,
+        )
+        weights_cache.put(key, weights, nbytes=weights_nbytes(weights))
+
+    return weights
+
+
+def _get_variable(ds, name):
+    """
+    Get variable `name` from `ds`, including the CF grid-mapping variable
+    (if there is one) as a coordinate so that the projection information is
+    available from the returned data-array
+    """
+    da = ds[name]
+    grid_mapping = da.attrs.get("grid_mapping")
+    if grid_mapping in ds.variables and grid_mapping not in da.coords:
+        da = da.assign_coords({grid_mapping: ds[grid_mapping]})
+    return da
+
+
+def _grid_dims(da):
+    """
+    Get the dimensions spanned by the horizontal grid of `da` (or `None` if
+    no lat/lon coordinates or projection information is available for `da`)
+    """
+    if has_latlon_coords(da):
+        return tuple(sorted(set(da.lat.dims) | set(da.lon.dims)))
+    if "x" in da.dims and "y" in da.dims and parse_crs(da) is not None:
+        return ("x", "y")
+    return None
+
+
+def _split_dataset_by_grid(ds):
+    """
+    Group the data variables in `ds` by the horizontal grid they are defined
+    on, returning a dict of `{grid dims: [variable names]}` and a list of the
+    variables which aren't defined on a horizontal grid
+    """
+    groups = {}
+    other_vars = []
+    for name in ds.data_vars:
+        dims = _grid_dims(_get_variable(ds, name))
+        if dims is None:
+            other_vars.append(name)
+        else:
+            groups.setdefault(dims, []).append(name)
+
+    grid_dims = set().union(*groups.keys())
+    # variables which only span some of the horizontal dimensions (e.g. cell
+    # bounds) can't be regridded and are dropped
+    other_vars = [v for v in other_vars if grid_dims.isdisjoint(ds[v].dims)]
+    return groups, other_vars
+
+
+def get_source_grid(da, bounds=False, ds=None):
+    """
+    Get the lat/lon coordinates of every point in `da` as a xr.Dataset, either
+    from `lat` and `lon` coordinates of `da` or by using projection
+    information stored in `da`. With `bounds=True` the positions of the cell
+    corners are included too (as `lat_b` and `lon_b`, see
+    `rc.coords.get_latlon_bounds`, CF bounds variables are looked up in `ds`)
+    """
+    old_grid = None
+
+    if has_latlon_coords(da):
+        coords = {}
+        coords["lat"] = da.coords["lat"]
+        coords["lon"] = da.coords["lon"]
+        old_grid = xr.Dataset(coords=coords)
+
+    if old_grid is None:
+        try:
+            coords = get_latlon_coords_using_crs(da=da)
+            old_grid = xr.Dataset(coords=coords)
+        except NoProjectionInformationFound:
+            pass
+
+    if old_grid is None:
+        raise NotImplementedError(da.coords)
+
+    if bounds:
+        old_grid = old_grid.assign_coords(get_latlon_bounds(da=da, ds=ds))
+
+    return old_grid
+
+
+class Regridder:
+    """
+    Regrid data-arrays on the same grid as `source_template` onto `domain` at
+    resolution `dx` (given in meters).
+
+    All the geometry calculations (working out how to crop the source data,
+    the lat/lon coordinates of the source data, the target grid and the
+    regridding weights) are done once when the regridder is created, so that
+    regridding a data-array only slices it and applies the (sparse) weights:
+
+    >>> regridder = rc.Regridder(domain, source_template=da.isel(time=0), dx=dx)
+    >>> da_resampled = regridder(da)
+
+    The data-arrays regridded must have the same horizontal grid as
+    `source_template`, but may have any other additional dimensions (for
+    example time).
+
+    If they have already been computed, the indexers used to crop
+    `source_template` (as returned by `rc.cropping.get_crop_indexers`) and the
+    lat/lon coordinates of `source_template` before cropping (as returned by
+    `get_source_grid`) can be given with `crop_indexers` and `source_grid`.
+    A `rc.SpatialIndex` of the source grid can be given with `spatial_index`
+    to speed up cropping. For `nearest_max_distance` see `resample`.
+    """
+
+    def __init__(
+        self,
+        domain,
+        source_template,
+        dx,
+        method="bilinear",
+        backend="scipy",
+        apply_crop=True,
+        crop_indexers=None,
+        source_grid=None,
+        spatial_index=None,
+        nearest_max_distance=None,
+    ):
+        self.domain = domain
+        self.dx = dx
+        self.method = method
+        self.backend = backend
+
+        with stage("target_grid", cache=grid_cache) as info:
+            if _needs_bounds(method):
+                self.new_grid = domain.get_grid(dx=dx, bounds=True)
+            else:
+                self.new_grid = domain.get_grid(dx=dx)
+            info.output = self.new_grid
+
+        with stage("crop", input=source_template) as info:
+            if crop_indexers is not None:
+                self.crop_indexers = crop_indexers
+            elif apply_crop:
+                self.crop_indexers = get_crop_indexers(
+                    domain=domain, da=source_template, spatial_index=spatial_index
+                )
+            else:
+                self.crop_indexers = {}
+            da_cropped = _apply_crop_indexers(source_template, self.crop_indexers)
+            info.output = da_cropped
+
+        with stage("source_grid", input=da_cropped, cache=latlon_coords_cache) as info:
+            if source_grid is not None:
+                self.old_grid = _isel_grid(source_grid, self.crop_indexers)
+            else:
+                self.old_grid = get_source_grid(
+                    da=da_cropped, bounds=_needs_bounds(method)
+                )
+            info.output = self.old_grid
+
+        self.source_sizes = {
+            d: source_template[d].size for d in horizontal_dims(self.old_grid)
+        }
 
-def _cartesian_resample(domain, da, dx):
-    new_grid = domain.get_grid(dx=dx)
-    da_resampled = da.interp_like(new_grid)
-    return da_resampled
+        with stage("weights", input=self.old_grid, cache=weights_cache) as info:
+            self.weights = get_weights(
+                domain=domain,
+                dx=dx,
+                old_grid=self.old_grid,
+                new_grid=self.new_grid,
+                method=method,
+                backend=backend,
+                nearest_max_distance=nearest_max_distance,
+            )
+            info.output = self.weights
+
+    def __call__(self, da, keep_attrs=False):
+        """
+        Regrid `da` (a data-array or dataset), which must be on the same
+        horizontal grid as the template used to create this regridder.
+
+        For datasets all data variables defined on this grid are regridded
+        (with variables with the same dimensions stacked so that the weights
+        are applied once for all of them), other variables not defined on
+        the horizontal grid are kept as they are
+        """
+        for d, size in self.source_sizes.items():
+            if d not in da.dims or da.sizes[d] != size:
+                raise ValueError(
+                    "The data-array being regridded doesn't have the same"
+                    f" horizontal grid as the template used to create the regridder"
+                    f" (expected {self.source_sizes}, got {dict(da.sizes)})"
+                )
+
+        if isinstance(da, xr.Dataset):
+            return self._regrid_dataset(ds=da, keep_attrs=keep_attrs)
+
+        with stage("apply", input=da) as info:
+            da_cropped = da.isel(self.crop_indexers)
+            info.output = apply_weights(
+                da=da_cropped,
+                weights=self.weights,
+                old_grid=self.old_grid,
+                new_grid=self.new_grid,
+                keep_attrs=keep_attrs,
+                reduction=BLOCK_REDUCTIONS.get(self.method),
+            )
+
+        return info.output
+
+    def _regrid_dataset(self, ds, keep_attrs):
+        grid_dims = set(self.source_sizes.keys())
+
+        stacks = {}
+        other_vars = []
+        for name, da in ds.data_vars.items():
+            if grid_dims.issubset(da.dims):
+                stacks.setdefault(da.dims, []).append(name)
+            elif grid_dims.isdisjoint(da.dims):
+                other_vars.append(name)
+
+        data_vars = {}
+        for names in stacks.values():
+            da_stacked = ds[names].to_array(dim="variable")
+            da_stacked_regridded = self(da_stacked)
+            for name in names:
+                da_regridded = da_stacked_regridded.sel(variable=name, drop=True)
+                if np.issubdtype(ds[name].dtype, np.floating):
+                    da_regridded = da_regridded.astype(ds[name].dtype)
+                if keep_attrs:
+                    da_regridded.attrs.update(ds[name].attrs)
+                data_vars[name] = da_regridded
+
+        for name in other_vars:
+            data_vars[name] = ds[name]
+
+        ds_regridded = xr.Dataset(
+            {name: data_vars[name] for name in ds.data_vars if name in data_vars}
+        )
+        if keep_attrs:
+            ds_regridded.attrs.update(ds.attrs)
+        return ds_regridded
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(domain={self.domain}, dx={self.dx:g},"
+            f" method={self.method}, backend={self.backend})"
+        )
 
 
 def resample(
@@ -21,8 +370,10 @@ def resample(
     dx,
     method="bilinear",
     keep_attrs=False,
-    backend="xesmf",
+    backend="scipy",
     apply_crop=True,
+    spatial_index=None,
+    nearest_max_distance=None,
 ):
     """
     Resample a data-array onto a domain at specific resolution `dx` (given in
@@ -42,39 +393,280 @@ def resample(
        available via `da.rio.crs`
 
     By default the input array will be cropped before resampling
-    (`apply_crop=True`)
+    (`apply_crop=True`). When resampling many domains from the same grid of
+    lat/lon positions cropping can be sped up by building a spatial index of
+    the grid once with `rc.SpatialIndex(da)` and passing it with
+    `spatial_index`.
 
-    """
+    When coarsening (e.g. from source pixels much smaller than `dx`) use
+    `method="block_mean"` (or `"block_median"`, `"block_max"`) to aggregate
+    all the source points falling into each target grid cell (ignoring
+    missing values), this is available with every `backend`.
 
-    old_grid = None
-    new_grid = domain.get_grid(dx=dx)
+    With nearest-neighbour regridding (`method="nearest_s2d"`) and the
+    `scipy` backend, target points further than `nearest_max_distance` (in
+    meters) from any source point (e.g. outside of a satellite swath) are set
+    to NaN. This defaults to the `nearest_max_distance` option (see
+    `rc.set_options`), which is `None` (no limit) unless set.
 
-    if apply_crop:
-        da = crop_field_to_domain(domain=domain, da=da)
+    Data already on a regular grid with 1D `x` and `y` coordinates (in
+    meters) in the same projection as `domain` (for example model output on
+    the domain's tangent plane, or any (x, y) data for a `CartesianDomain`)
+    is resampled directly on the Cartesian grid, by separable 1D
+    interpolation or by block averaging when conservatively coarsening by an
+    integer factor, without working out the lat/lon coordinates or full
+    regridding weights (only for the `bilinear`, `nearest_s2d`,
+    `conservative` and `conservative_normed` methods, `backend` is ignored)
 
-    if has_latlon_coords(da):
-        coords = {}
-        coords["lat"] = da.coords["lat"]
-        coords["lon"] = da.coords["lon"]
-        old_grid = xr.Dataset(coords=coords)
+    If `da` is a dataset, its data variables are grouped by the horizontal
+    grid they are defined on and the variables in each group are regridded
+    together with a single set of weights. Variables without a horizontal
+    grid are kept as they are.
+    """
+    if isinstance(da, xr.Dataset):
+        return _resample_dataset(
+            domain=domain,
+            ds=da,
+            dx=dx,
+            method=method,
+            keep_attrs=keep_attrs,
+            backend=backend,
+            apply_crop=apply_crop,
+            spatial_index=spatial_index,
+            nearest_max_distance=nearest_max_distance,
+        )
 
-    if old_grid is None:
-        try:
-            coords = get_latlon_coords_using_crs(da=da)
-            old_grid = xr.Dataset(coords=coords)
-        except NoProjectionInformationFound:
-            pass
+    if _use_cartesian_resample(domain=domain, da=da, method=method):
+        return _cartesian_resample(
+            domain=domain, da=da, dx=dx, method=method, keep_attrs=keep_attrs
+        )
 
-    if old_grid is None:
-        raise NotImplementedError(da.coords)
+    regridder = Regridder(
+        domain=domain,
+        source_template=da,
+        dx=dx,
+        method=method,
+        backend=backend,
+        apply_crop=apply_crop,
+        spatial_index=spatial_index,
+        nearest_max_distance=nearest_max_distance,
+    )
+
+    return regridder(da, keep_attrs=keep_attrs)
 
-    da_resampled = resample_common(
-        da=da,
-        old_grid=old_grid,
-        new_grid=new_grid,
+
+def _resample_dataset(
+    domain,
+    ds,
+    dx,
+    method,
+    keep_attrs,
+    backend,
+    apply_crop,
+    spatial_index=None,
+    nearest_max_distance=None,
+):
+    regrid = _dataset_regridder(
+        domain=domain,
+        ds_template=ds,
+        dx=dx,
         method=method,
         backend=backend,
-        keep_attrs=keep_attrs,
+        apply_crop=apply_crop,
+        spatial_index=spatial_index,
+        nearest_max_distance=nearest_max_distance,
     )
+    return regrid(ds, keep_attrs=keep_attrs)
+
+
+def _dataset_regridder(
+    domain,
+    ds_template,
+    dx,
+    method,
+    backend,
+    apply_crop,
+    spatial_index=None,
+    nearest_max_distance=None,
+):
+    """
+    Create a function which regrids datasets with the same variables and
+    horizontal grids as `ds_template` (see `resample`), with a `Regridder`
+    created once for each group of variables on the same grid
+    """
+    groups, other_vars = _split_dataset_by_grid(ds_template)
+    if len(groups) == 0:
+        raise NotImplementedError(ds_template.coords)
+
+    # for each group of variables either the regridder to use, or `None` to
+    # resample directly on the Cartesian grid of the domain
+    regridders = []
+    for names in groups.values():
+        da_template = _get_variable(ds_template, names[0])
+        if _use_cartesian_resample(domain=domain, da=da_template, method=method):
+            regridders.append((names, None))
+            continue
+
+        source_grid = None
+        if _needs_bounds(method):
+            # CF bounds of the lat/lon coordinates can only be found in the
+            # dataset, not the data-array
+            source_grid = get_source_grid(da=da_template, bounds=True, ds=ds_template)
+
+        regridder = Regridder(
+            domain=domain,
+            source_template=da_template,
+            dx=dx,
+            method=method,
+            backend=backend,
+            apply_crop=apply_crop,
+            source_grid=source_grid,
+            # the index only applies to variables on the grid it was built for
+            spatial_index=(
+                spatial_index
+                if spatial_index is not None and spatial_index.matches(da_template)
+                else None
+            ),
+            nearest_max_distance=nearest_max_distance,
+        )
+        regridders.append((names, regridder))
+
+    def _regrid(ds, keep_attrs):
+        datasets = []
+        for names, regridder in regridders:
+            if regridder is None:
+                datasets.append(
+                    _cartesian_resample(
+                        domain=domain,
+                        da=ds[names],
+                        dx=dx,
+                        method=method,
+                        keep_attrs=keep_attrs,
+                    )
+                )
+            else:
+                datasets.append(regridder(ds[names], keep_attrs=keep_attrs))
+        datasets.append(ds[other_vars])
+
+        ds_regridded = xr.merge(datasets, combine_attrs="override")
+        # keep the variables in the same order as in the input
+        ds_regridded = ds_regridded[[v for v in ds.data_vars if v in ds_regridded]]
+        ds_regridded.attrs = dict(ds.attrs) if keep_attrs else {}
+        return ds_regridded
+
+    return _regrid
+
+
+def _union_of_indexers(indexers_list, sizes):
+    """
+    Get the indexers for the smallest region which contains the regions
+    selected by each of the indexers in `indexers_list`. Only slices are
+    combined, dimensions indexed in any other way aren't cropped
+    """
+    union = {}
+    for indexers in indexers_list:
+        for d, idx in indexers.items():
+            if not isinstance(idx, slice) or idx.step not in [None, 1]:
+                union[d] = None
+            elif d not in union:
+                union[d] = idx.indices(sizes[d])[:2]
+            elif union[d] is not None:
+                start, stop = idx.indices(sizes[d])[:2]
+                union[d] = (min(union[d][0], start), max(union[d][1], stop))
+
+    return {d: slice(*v) for (d, v) in union.items() if v is not None}
+
+
+def _offset_indexers(indexers, union, sizes):
+    """
+    Shift `indexers` so that they index into the region selected by `union`
+    """
+    indexers_offset = {}
+    for d, idx in indexers.items():
+        if d not in union:
+            indexers_offset[d] = idx
+            continue
+        offset = union[d].start
+        start, stop = idx.indices(sizes[d])[:2]
+        indexers_offset[d] = slice(start - offset, stop - offset)
+    return indexers_offset
+
+
+def resample_many(
+    domains,
+    da,
+    dx,
+    method="bilinear",
+    keep_attrs=False,
+    backend="scipy",
+    apply_crop=True,
+    n_workers=None,
+    spatial_index=None,
+    nearest_max_distance=None,
+):
+    """
+    Resample a data-array onto each of `domains` at resolution `dx` (given in
+    meters). This is equivalent to calling `resample` for each domain, but the
+    source data is only cropped to the region covering all the domains and the
+    lat/lon coordinates of the source grid are only worked out once and shared
+    between the domains.
+
+    `domains` may either be a list of domains (in which case a list of
+    resampled data-arrays is returned) or a dict of domains (for which a dict
+    with the same keys is returned). The regridding onto the different
+    domains can be done in parallel with a pool of `n_workers` threads.
+
+    For source grids with 2D lat/lon positions a `rc.SpatialIndex` of the grid
+    is built (unless one is given with `spatial_index`) to crop to each
+    domain.
+    """
+    if isinstance(domains, Mapping):
+        names = list(domains.keys())
+        domains = list(domains.values())
+    else:
+        names = None
+        domains = list(domains)
+
+    sizes = dict(da.sizes)
+    if apply_crop:
+        on_aux_grid = has_latlon_coords(da) and da.lat.ndim == 2
+        if spatial_index is None and on_aux_grid and len(domains) > 1:
+            spatial_index = SpatialIndex(da)
+        crop_indexers = [
+            get_crop_indexers(domain=domain, da=da, spatial_index=spatial_index)
+            for domain in domains
+        ]
+        union = _union_of_indexers(crop_indexers, sizes=sizes)
+        crop_indexers = [
+            _offset_indexers(indexers, union=union, sizes=sizes)
+            for indexers in crop_indexers
+        ]
+    else:
+        union = {}
+        crop_indexers = [{} for _ in domains]
+
+    da_union = da.isel(union)
+    source_grid = get_source_grid(da=da_union, bounds=_needs_bounds(method))
+
+    def _resample_domain(domain, indexers):
+        regridder = Regridder(
+            domain=domain,
+            source_template=da_union,
+            dx=dx,
+            method=method,
+            backend=backend,
+            crop_indexers=indexers,
+            source_grid=source_grid,
+            nearest_max_distance=nearest_max_distance,
+        )
+        return regridder(da_union, keep_attrs=keep_attrs)
+
+    if n_workers is None:
+        results = list(map(_resample_domain, domains, crop_indexers))
+    else:
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            results = list(executor.map(_resample_domain, domains, crop_indexers))
 
-    return da_resampled
+    if names is not None:
+        return dict(zip(names, results))
+    return results
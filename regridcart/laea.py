@@ -0,0 +1,271 @@
+"""
+Closed-form Lambert azimuthal equal-area (LAEA) projection on the ellipsoid
+(Snyder 1987, "Map projections: A working manual", USGS Professional Paper
+1395, pp. 182-190), which is the projection used by `LocalCartesianDomain`.
+
+Transforming with these vectorized formulas avoids going through PROJ point
+by point. The transforms are done with numpy, or compiled with numba and run
+on all CPUs with `rc.set_options(laea_engine="numba")`. Only the oblique and
+equatorial aspects are implemented, for projections centred on the poles
+`params_from_crs` returns `None` (and PROJ is used instead).
+"""
+import functools
+import math
+from collections import namedtuple
+
+import numpy as np
+
+LAEAParams = namedtuple("LAEAParams", ["lat_0", "lon_0", "x_0", "y_0", "a", "e"])
+LAEAParams.__doc__ = """
+Parameters of a LAEA projection: the latitude and longitude (in degrees) of
+the projection centre, false easting and northing (in meters) and the
+semi-major axis (in meters) and eccentricity of the ellipsoid (`e=0` for a
+sphere)
+"""
+
+# projections centred closer than this to the poles (in degrees) are
+# treated as polar
+POLE_EPS = 1.0e-8
+
+# points for which `1 + cos(c)` (with `c` the angular distance from the
+# projection centre) is smaller than this are treated as the antipode of the
+# centre
+ANTIPODE_EPS = 1.0e-10
+
+# number of points transformed at a time, so that the temporary arrays fit
+# in the CPU cache
+BLOCK_SIZE = 2 ** 16
+
+PROJ_METHODS = [
+    "Lambert Azimuthal Equal Area",
+    "Lambert Azimuthal Equal Area (Spherical)",
+]
+
+
+@functools.lru_cache(maxsize=64)
+def _params_from_wkt(crs_wkt):
+    import pyproj
+
+    crs = pyproj.CRS.from_wkt(crs_wkt)
+    op = crs.coordinate_operation
+    if op is None or op.method_name not in PROJ_METHODS:
+        return None
+    if any(axis.unit_name != "metre" for axis in crs.axis_info):
+        return None
+
+    values = {p.name: p.value for p in op.params}
+    ellipsoid = crs.ellipsoid
+    if op.method_name.endswith("(Spherical)") or ellipsoid.inverse_flattening == 0.0:
+        e = 0.0
+    else:
+        f = 1.0 / ellipsoid.inverse_flattening
+        e = math.sqrt(f * (2.0 - f))
+    params = LAEAParams(
+        lat_0=values["Latitude of natural origin"],
+        lon_0=values["Longitude of natural origin"],
+        x_0=values.get("False easting", 0.0),
+        y_0=values.get("False northing", 0.0),
+        a=ellipsoid.semi_major_metre,
+        e=e,
+    )
+    if abs(abs(params.lat_0) - 90.0) < POLE_EPS:
+        return None
+    return params
+
+
+def params_from_crs(crs):
+    """
+    Get the `LAEAParams` of `crs` (a cartopy/pyproj projection or WKT
+    string), or `None` if `crs` isn't a (non-polar) LAEA projection
+    """
+    crs_wkt = crs if isinstance(crs, str) else crs.to_wkt()
+    return _params_from_wkt(crs_wkt)
+
+
+def _authalic_q(sin_phi, e):
+    # `q` of Snyder eqn. (3-12), for the sphere q = 2 sin(phi)
+    if e == 0.0:
+        return 2.0 * sin_phi
+    e_sin = e * sin_phi
+    return (1.0 - e * e) * (
+        sin_phi / (1.0 - e_sin * e_sin)
+        - 1.0 / (2.0 * e) * np.log((1.0 - e_sin) / (1.0 + e_sin))
+    )
+
+
+def _constants(lat_0, a, e):
+    """
+    Constants of the projection: `q_p` and `R_q` (Snyder eqns. 3-12, 3-13),
+    the authalic latitude of the centre `beta_1` (3-11) and `D` (24-20)
+    """
+    q_p = _authalic_q(1.0, e)
+    r_q = a * math.sqrt(q_p / 2.0)
+    sin_phi_1 = math.sin(math.radians(lat_0))
+    beta_1 = math.asin(_authalic_q(sin_phi_1, e) / q_p)
+    m_1 = math.cos(math.radians(lat_0)) / math.sqrt(1.0 - (e * sin_phi_1) ** 2)
+    d = a * m_1 / (r_q * math.cos(beta_1))
+    return q_p, r_q, math.sin(beta_1), math.cos(beta_1), d
+
+
+def _inverse_kernel(x, y, lat_0, lon_0, x_0, y_0, a, e):
+    """
+    Transform 1D arrays of `(x, y)` to `(lon, lat)`, writing the result into
+    `x` and `y`
+    """
+    q_p, r_q, sin_beta_1, cos_beta_1, d = _constants(lat_0, a, e)
+    x_ = x - x_0
+    y_ = y - y_0
+
+    # Snyder eqns. (24-28), (24-29), (24-30) and (24-26), with the sine and
+    # cosine of `c_e = 2 asin(r)` written as `2 r sqrt(1 - r^2)` and
+    # `1 - 2 r^2` and the common factor `rho` divided out, so that the
+    # projection centre (rho = 0) isn't a special case
+    r2 = ((x_ / d) ** 2 + (d * y_) ** 2) / (4.0 * r_q * r_q)
+    # points outside of the disc `r <= 1` (whose rim is the antipode of the
+    # projection centre) can't be transformed and are set to inf (as PROJ
+    # does)
+    outside = r2 > 1.0
+    r2 = np.minimum(r2, 1.0)
+    k = np.sqrt(1.0 - r2) / r_q
+    cos_ce = 1.0 - 2.0 * r2
+    sin_beta = cos_ce * sin_beta_1 + d * y_ * k * cos_beta_1
+    sin_beta = np.minimum(np.maximum(sin_beta, -1.0), 1.0)
+    lon = lon_0 + np.degrees(
+        np.arctan2(x_ * k, d * cos_beta_1 * cos_ce - d * d * y_ * sin_beta_1 * k)
+    )
+
+    # geodetic latitude from the authalic latitude, by series (Snyder eqn.
+    # 3-18) refined with a Newton step on `q` (3-16)
+    phi = np.arcsin(sin_beta)
+    if e != 0.0:
+        e2 = e * e
+        e4 = e2 * e2
+        e6 = e4 * e2
+        sin_2beta = 2.0 * sin_beta * np.sqrt(1.0 - sin_beta * sin_beta)
+        cos_2beta = 1.0 - 2.0 * sin_beta * sin_beta
+        phi = phi + sin_2beta * (
+            (e2 / 3.0 + 31.0 * e4 / 180.0 + 517.0 * e6 / 5040.0)
+            + (23.0 * e4 / 360.0 + 251.0 * e6 / 3780.0) * 2.0 * cos_2beta
+            + (761.0 * e6 / 45360.0) * (3.0 - 4.0 * sin_2beta * sin_2beta)
+        )
+        sin_phi = np.sin(phi)
+        cos_phi = np.sqrt(1.0 - sin_phi * sin_phi)
+        w = 1.0 - e2 * sin_phi * sin_phi
+        residual = (
+            q_p * sin_beta / (1.0 - e2)
+            - sin_phi / w
+            + 1.0 / (2.0 * e) * np.log((1.0 - e * sin_phi) / (1.0 + e * sin_phi))
+        )
+        # the Newton step is singular at the poles, where the series is exact
+        # (and the residual vanishes)
+        phi = phi + w * w / (2.0 * np.maximum(cos_phi, 1.0e-4)) * residual
+
+    x[:] = np.where(outside, np.inf, lon - 360.0 * np.floor((lon + 180.0) / 360.0))
+    y[:] = np.where(outside, np.inf, np.degrees(phi))
+
+
+def _forward_kernel(lon, lat, lat_0, lon_0, x_0, y_0, a, e):
+    """
+    Transform 1D arrays of `(lon, lat)` to `(x, y)`, writing the result into
+    `lon` and `lat`
+    """
+    q_p, r_q, sin_beta_1, cos_beta_1, d = _constants(lat_0, a, e)
+
+    # Snyder eqns. (3-11), (24-19), (24-21) and (24-22)
+    sin_beta = _authalic_q(np.sin(np.radians(lat)), e) / q_p
+    sin_beta = np.minimum(np.maximum(sin_beta, -1.0), 1.0)
+    cos_beta = np.sqrt(1.0 - sin_beta * sin_beta)
+    d_lon = np.radians(lon - lon_0)
+    cos_dlon = np.cos(d_lon)
+    denom = 1.0 + sin_beta_1 * sin_beta + cos_beta_1 * cos_beta * cos_dlon
+    # the antipode of the projection centre can't be projected and is set
+    # to inf (with the same tolerance as PROJ)
+    antipodal = denom < ANTIPODE_EPS
+    b = r_q * np.sqrt(2.0 / np.maximum(denom, ANTIPODE_EPS))
+    x = b * d * cos_beta * np.sin(d_lon) + x_0
+    y = b / d * (cos_beta_1 * sin_beta - sin_beta_1 * cos_beta * cos_dlon) + y_0
+
+    lon[:] = np.where(antipodal, np.inf, x)
+    lat[:] = np.where(antipodal, np.inf, y)
+
+
+KERNELS = dict(inverse=_inverse_kernel, forward=_forward_kernel)
+
+
+@functools.lru_cache(maxsize=None)
+def _numba_kernel(name):
+    try:
+        import numba
+    except ImportError as ex:
+        raise ImportError(
+            "The `numba` LAEA engine requires numba, install it with"
+            " `pip install regridcart[numba]` or use"
+            ' `rc.set_options(laea_engine="numpy")`'
+        ) from ex
+
+    # the numpy kernels are compiled as they are (with the functions they call
+    # compiled too) and run on blocks of points in parallel over all CPUs
+    kernel_globals = dict(np=np, math=math, ANTIPODE_EPS=ANTIPODE_EPS)
+
+    def _rebuild(fn):
+        return type(fn)(fn.__code__, kernel_globals, fn.__name__, fn.__defaults__)
+
+    for fn in [_authalic_q, _constants]:
+        kernel_globals[fn.__name__] = numba.njit(_rebuild(fn))
+    kernel = numba.njit(_rebuild(KERNELS[name]))
+    block_size = BLOCK_SIZE
+
+    @numba.njit(parallel=True)
+    def _apply_blocks(x, y, lat_0, lon_0, x_0, y_0, a, e):
+        n_blocks = (x.size + block_size - 1) // block_size
+        for i in numba.prange(n_blocks):
+            block = slice(i * block_size, (i + 1) * block_size)
+            kernel(x[block], y[block], lat_0, lon_0, x_0, y_0, a, e)
+
+    return _apply_blocks
+
+
+def _apply_kernel(name, xy, params, engine):
+    """
+    Apply the kernel `name` ("inverse" or "forward") in-place to the
+    float64 array `xy` of shape `(2, ...)`
+    """
+    xy_flat = xy.reshape((2, -1))
+    params = [float(v) for v in params]
+    if engine == "numpy":
+        kernel = KERNELS[name]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for i in range(0, xy_flat.shape[1], BLOCK_SIZE):
+                block = slice(i, i + BLOCK_SIZE)
+                kernel(xy_flat[0, block], xy_flat[1, block], *params)
+    elif engine == "numba":
+        _numba_kernel(name)(xy_flat[0], xy_flat[1], *params)
+    else:
+        raise NotImplementedError(engine)
+
+
+def inverse(x, y, params, engine="numpy"):
+    """
+    Transform positions `(x, y)` (broadcast against each other) in the LAEA
+    projection with `params` to `(lon, lat)`, positions which are outside of
+    the projection are returned as `inf`
+    """
+    shape = np.broadcast_shapes(np.shape(x), np.shape(y))
+    xy = np.empty((2,) + shape, dtype=np.float64)
+    xy[0] = x
+    xy[1] = y
+    _apply_kernel("inverse", xy, params=params, engine=engine)
+    return xy[0], xy[1]
+
+
+def forward(lon, lat, params, engine="numpy"):
+    """
+    Transform positions `(lon, lat)` (broadcast against each other) to
+    `(x, y)` in the LAEA projection with `params`
+    """
+    shape = np.broadcast_shapes(np.shape(lon), np.shape(lat))
+    xy = np.empty((2,) + shape, dtype=np.float64)
+    xy[0] = lon
+    xy[1] = lat
+    _apply_kernel("forward", xy, params=params, engine=engine)
+    return xy[0], xy[1]
@@ -0,0 +1,58 @@
+"""
+Global options for regridcart. The default values can be set with environment
+variables (see `ENV_VARS` below) and changed at runtime with
+`regridcart.set_options`, which can also be used as a context manager
+"""
+import os
+
+ENV_VARS = dict(
+    cache_dir="REGRIDCART_CACHE_DIR",
+    cache_max_bytes="REGRIDCART_CACHE_MAX_BYTES",
+)
+
+OPTIONS = dict(
+    # directory in which regridding weights are stored between calls (and
+    # between processes), caching to disk is disabled when this is `None`
+    cache_dir=os.environ.get(ENV_VARS["cache_dir"]),
+    # total size of the files in the cache directory above which the
+    # least-recently-used files are removed
+    cache_max_bytes=int(os.environ.get(ENV_VARS["cache_max_bytes"], 2 * 1024 ** 3)),
+    # maximum distance (in meters) to the nearest source point for target
+    # points with nearest-neighbour regridding (`scipy` backend), target
+    # points further away are set to NaN. `None` for no limit
+    nearest_max_distance=None,
+    # how transforms between the Lambert azimuthal equal-area projection of
+    # `LocalCartesianDomain` and lat/lon are computed: in closed form with
+    # `"numpy"` or `"numba"` (compiled and multithreaded), or with `"proj"`
+    laea_engine="numpy",
+)
+
+
+class set_options:
+    """
+    Set options for regridcart, either globally
+
+    >>> rc.set_options(cache_dir="/tmp/regridcart")
+
+    or only within a context
+
+    >>> with rc.set_options(cache_dir="/tmp/regridcart"):
+    ...     rc.resample(domain, da=da, dx=dx)
+    """
+
+    def __init__(self, **kwargs):
+        self.old = {}
+        for k, v in kwargs.items():
+            if k not in OPTIONS:
+                raise ValueError(
+                    f"`{k}` is not a valid option, valid options are:"
+                    f" {', '.join(OPTIONS.keys())}"
+                )
+            self.old[k] = OPTIONS[k]
+        OPTIONS.update(kwargs)
+
+    def __enter__(self):
+        return
+
+    def __exit__(self, type, value, traceback):
+        OPTIONS.update(self.old)
@@ -0,0 +1,132 @@
+"""
+Regridding of long time-series (for example opened with `xr.open_mfdataset`)
+block-by-block, writing each regridded block to a Zarr or netCDF store before
+the next block is regridded so that only a single block is held in memory at
+a time
+"""
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+from .interpolation import Regridder
+from .interpolation.common import _dataset_regridder
+
+# encoding attributes carried over from the variables already in a netCDF
+# file when appending to it
+NETCDF_ENCODING_KEYS = ["units", "calendar", "dtype", "scale_factor", "add_offset"]
+
+
+def _is_zarr_path(path):
+    return Path(path).suffix == ".zarr"
+
+
+def _append_netcdf(ds_block, path, dim):
+    """
+    Append `ds_block` along the (unlimited) dimension `dim` of the netCDF file
+    at `path`, which must have been created from a dataset with the same
+    variables
+    """
+    import netCDF4
+
+    with xr.open_dataset(path) as ds_existing:
+        encodings = {
+            v: {
+                k: ds_existing[v].encoding[k]
+                for k in NETCDF_ENCODING_KEYS
+                if k in ds_existing[v].encoding
+            }
+            for v in ds_existing.variables
+        }
+
+    with netCDF4.Dataset(path, "a") as nc:
+        nc.set_auto_maskandscale(False)
+        n_existing = nc.dimensions[dim].size
+        for name, var in ds_block.variables.items():
+            if dim not in var.dims:
+                continue
+            var = var.copy(deep=False)
+            var.encoding = encodings.get(name, {})
+            var_encoded = xr.conventions.encode_cf_variable(var, name=name)
+            if "dtype" in var.encoding:
+                var_encoded = var_encoded.astype(var.encoding["dtype"])
+            idx = tuple(
+                slice(n_existing, n_existing + var.sizes[dim])
+                if d == dim
+                else slice(None)
+                for d in var_encoded.dims
+            )
+            nc.variables[name][idx] = var_encoded.values
+
+
+def _set_append_encoding(ds, dim):
+    """
+    Make sure times along `dim` are encoded with units that can represent the
+    times in all the blocks appended later (xarray otherwise picks units to
+    suit only the times in the first block written)
+    """
+    if dim not in ds.coords:
+        return
+    var = ds.variables[dim]
+    if np.issubdtype(var.dtype, np.datetime64) and "units" not in var.encoding:
+        t0 = np.datetime_as_string(var.values[0], unit="s").replace("T", " ")
+        var.encoding.update(units=f"seconds since {t0}", dtype="float64")
+
+
+def _write_block(ds_block, path, dim, is_first):
+    if _is_zarr_path(path):
+        if is_first:
+            _set_append_encoding(ds_block, dim=dim)
+            ds_block.to_zarr(path, mode="w")
+        else:
+            ds_block.to_zarr(path, append_dim=dim)
+    else:
+        if is_first:
+            _set_append_encoding(ds_block, dim=dim)
+            ds_block.to_netcdf(path, unlimited_dims=[dim])
+        else:
+            _append_netcdf(ds_block, path=path, dim=dim)
+
+
+def resample_to_store(
+    domain,
+    da,
+    dx,
+    path,
+    dim="time",
+    block_size=1,
+    method="bilinear",
+    backend="scipy",
+    keep_attrs=False,
+    apply_crop=True,
+):
+    """
+    Resample `da` (a DataArray or Dataset) onto `domain` at resolution `dx`
+    (in meters) block-by-block along dimension `dim` (`block_size` entries at
+    a time), writing the regridded data to `path`. The output is written as
+    Zarr if `path` ends in `.zarr` and as netCDF otherwise (any existing
+    store at `path` is overwritten).
+
+    The regridding weights are only computed once and each block is loaded,
+    regridded and written before moving onto the next, so that the memory
+    used is proportional to the size of a single block. This is most useful
+    when `da` is backed by dask (e.g. opened with `xr.open_mfdataset`).
+    """
+    kwargs = dict(
+        domain=domain, dx=dx, method=method, backend=backend, apply_crop=apply_crop
+    )
+    if isinstance(da, xr.Dataset):
+        # the variables are grouped by grid with a regridder for each group,
+        # as for `resample`
+        regrid = _dataset_regridder(ds_template=da.isel({dim: 0}), **kwargs)
+    else:
+        regrid = Regridder(source_template=da.isel({dim: 0}), **kwargs)
+
+    for i_start in range(0, da.sizes[dim], block_size):
+        da_block = da.isel({dim: slice(i_start, i_start + block_size)})
+        ds_block = regrid(da_block, keep_attrs=keep_attrs)
+        if isinstance(ds_block, xr.DataArray):
+            ds_block = ds_block.to_dataset(name=da.name or "data")
+        _write_block(ds_block.load(), path=path, dim=dim, is_first=i_start == 0)
+
+    return path
@@ -0,0 +1,161 @@
+"""
+Transformation of coordinates between projections using pyproj. The
+`pyproj.Transformer` for each pair of projections is only created once per
+process and the coordinates are transformed in-place in a single
+preallocated array (rather than with cartopy's `transform_points`, which
+creates new projection objects and returns an `(N, 3)` array including
+heights).
+
+Transforms between a Lambert azimuthal equal-area projection (as used by
+`LocalCartesianDomain`) and its lat/lon coordinates are computed in
+closed form instead (see `regridcart.laea`), unless the `laea_engine` option
+is set to `"proj"`.
+
+Projections can be given as any object with a `to_wkt` method (cartopy and
+pyproj projections) or as WKT strings.
+"""
+import functools
+
+import numpy as np
+import pyproj
+
+from . import laea
+from .options import OPTIONS
+
+# number of points transformed at a time when returning types other than
+# float64
+BLOCK_SIZE = 2 ** 20
+
+
+def _wkt(crs):
+    if isinstance(crs, str):
+        return crs
+    return crs.to_wkt()
+
+
+@functools.lru_cache(maxsize=64)
+def _geodetic_wkt(crs_wkt):
+    crs = pyproj.CRS.from_wkt(crs_wkt).geodetic_crs
+    # the geodetic CRS of a derived geographic CRS (e.g. a rotated pole) is
+    # the derived CRS itself, so we go back to the CRS it is derived from to
+    # get true lat/lon
+    while crs.is_derived and crs.source_crs is not None:
+        crs = crs.source_crs
+    return crs.to_wkt()
+
+
+@functools.lru_cache(maxsize=64)
+def _get_transformer(crs_from_wkt, crs_to_wkt):
+    return pyproj.Transformer.from_crs(
+        pyproj.CRS.from_wkt(crs_from_wkt),
+        pyproj.CRS.from_wkt(crs_to_wkt),
+        always_xy=True,
+    )
+
+
+def get_transformer(crs_from, crs_to=None):
+    """
+    Get the (cached) transformer from `crs_from` to `crs_to`, which defaults
+    to the geodetic (lat/lon) coordinate system of `crs_from`. Coordinates are
+    always given as `(x, y)`, i.e. `(lon, lat)` for geodetic coordinates
+    """
+    crs_from_wkt = _wkt(crs_from)
+    if crs_to is None:
+        crs_to_wkt = _geodetic_wkt(crs_from_wkt)
+    else:
+        crs_to_wkt = _wkt(crs_to)
+    return _get_transformer(crs_from_wkt, crs_to_wkt)
+
+
+def _proj_transform(transformer, direction):
+    def _apply(xy):
+        transformer.transform(xy[0], xy[1], inplace=True, direction=direction)
+
+    return _apply
+
+
+def _laea_transform(crs, direction):
+    """
+    In-place transform with the closed-form LAEA projection between `crs`
+    and its lat/lon coordinates, or `None` if this isn't available for `crs`
+    """
+    engine = OPTIONS["laea_engine"]
+    if engine == "proj":
+        return None
+    params = laea.params_from_crs(crs)
+    if params is None:
+        return None
+
+    name = dict(FORWARD="inverse", INVERSE="forward")[direction]
+
+    def _apply(xy):
+        laea._apply_kernel(name, xy, params=params, engine=engine)
+
+    return _apply
+
+
+def _transform(apply_transform, x, y, dtype):
+    """
+    Transform `(x, y)` with the in-place transform `apply_transform`, which
+    is called with float64 arrays of shape `(2, ...)`
+    """
+    shape = np.broadcast_shapes(np.shape(x), np.shape(y))
+    dtype = np.dtype(dtype)
+
+    if dtype == np.float64 or len(shape) == 0:
+        xy = np.empty((2,) + shape, dtype=np.float64)
+        xy[0] = x
+        xy[1] = y
+        apply_transform(xy)
+        xy = xy.astype(dtype, copy=False)
+        return xy[0], xy[1]
+
+    # for other types the points are transformed in blocks (in float64) along
+    # the first axis so that full-size float64 arrays are never allocated
+    xy = np.empty((2,) + shape, dtype=dtype)
+    x, y = np.broadcast_to(x, shape), np.broadcast_to(y, shape)
+    n_block = max(1, BLOCK_SIZE // max(1, int(np.prod(shape[1:]))))
+    for i in range(0, shape[0], n_block):
+        block = slice(i, i + n_block)
+        xy[0, block], xy[1, block] = _transform(
+            apply_transform, x[block], y[block], dtype=np.float64
+        )
+    return xy[0], xy[1]
+
+
+def transform(x, y, crs_from, crs_to, dtype=np.float64):
+    """
+    Transform the positions `(x, y)` (which are broadcast against each other,
+    so that a grid can be given by 1D `x` and `y` with shapes `(1, N)` and
+    `(M, 1)`) from `crs_from` to `crs_to`. The transform is done in float64
+    and the result cast to `dtype`. Points which can't be transformed are
+    returned as `inf`
+    """
+    transformer = get_transformer(crs_from=crs_from, crs_to=crs_to)
+    return _transform(_proj_transform(transformer, "FORWARD"), x, y, dtype=dtype)
+
+
+def _lonlat_transform(crs, direction):
+    apply_transform = _laea_transform(crs, direction=direction)
+    if apply_transform is None:
+        transformer = get_transformer(crs_from=crs)
+        apply_transform = _proj_transform(transformer, direction=direction)
+    return apply_transform
+
+
+def xy_to_lonlat(x, y, crs, dtype=np.float64):
+    """
+    Transform the positions `(x, y)` in projection `crs` to `(lon, lat)` (see
+    `transform`)
+    """
+    apply_transform = _lonlat_transform(crs, direction="FORWARD")
+    return _transform(apply_transform, x, y, dtype=dtype)
+
+
+def lonlat_to_xy(lon, lat, crs, dtype=np.float64):
+    """
+    Transform the positions `(lon, lat)` to `(x, y)` in projection `crs` (see
+    `transform`)
+    """
+    apply_transform = _lonlat_transform(crs, direction="INVERSE")
+    return _transform(apply_transform, lon, lat, dtype=dtype)
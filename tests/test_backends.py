@@ -0,0 +1,340 @@
+import sys
+
+import numpy as np
+import pytest
+import xarray as xr
+
+import regridcart as rc
+
+
+def _phi(lat, lon):
+    return np.sin(np.deg2rad(lat) * 5.0) * np.cos(np.deg2rad(lon) * 3.0)
+
+
+def _make_latlon_aligned_data():
+    ds = xr.Dataset(
+        coords=dict(lat=np.arange(5.0, 20.0, 0.1), lon=np.arange(-70.0, -30.0, 0.1))
+    )
+    ds["phi"] = _phi(ds.lat, ds.lon)
+    return ds.phi
+
+
+def _make_latlon_aux_coord_data():
+    ds = xr.Dataset(
+        coords=dict(x=np.arange(-20.0, 20.0, 0.25), y=np.arange(-10.0, 10.0, 0.25))
+    )
+    theta = np.deg2rad(20.0)
+    ds.coords["lon"] = np.cos(theta) * ds.x - np.sin(theta) * ds.y - 48.0
+    ds.coords["lat"] = np.sin(theta) * ds.x + np.cos(theta) * ds.y + 14.0
+    ds["phi"] = _phi(ds.lat, ds.lon)
+    return ds.phi
+
+
+TARGET_DOMAIN = rc.LocalCartesianDomain(
+    central_latitude=12.5,
+    central_longitude=-48.0,
+    l_meridional=1000.0e3,
+    l_zonal=2000.0e3,
+)
+
+
+@pytest.mark.parametrize(
+    "method, tolerance", [("bilinear", 1.0e-3), ("nearest_s2d", 1.0e-2)]
+)
+@pytest.mark.parametrize(
+    "make_data", [_make_latlon_aligned_data, _make_latlon_aux_coord_data]
+)
+@pytest.mark.parametrize("backend", ["scipy", "pyresample"])
+def test_backend(backend, method, tolerance, make_data):
+    pytest.importorskip(backend)
+
+    da = make_data()
+    da_resampled = rc.resample(
+        TARGET_DOMAIN, da=da, dx=25.0e3, method=method, backend=backend
+    )
+
+    assert da_resampled.dims == ("y", "x")
+    assert int(da_resampled.isnull().sum()) == 0
+    da_phi_true = _phi(da_resampled.lat, da_resampled.lon)
+    assert float(np.abs(da_resampled - da_phi_true).max()) < tolerance
+
+
+def test_scipy_backend_matches_xesmf():
+    pytest.importorskip("xesmf")
+
+    da = _make_latlon_aux_coord_data()
+    kwargs = dict(domain=TARGET_DOMAIN, da=da, dx=25.0e3, method="bilinear")
+    da_scipy = rc.resample(backend="scipy", **kwargs)
+    da_xesmf = rc.resample(backend="xesmf", **kwargs)
+
+    # xesmf computes the weights on the sphere rather than in the plane of
+    # the target projection so the values aren't identical
+    np.testing.assert_allclose(da_scipy.values, da_xesmf.values, atol=1.0e-3)
+
+
+def test_pyresample_backend_lazy():
+    pytest.importorskip("pyresample")
+    pytest.importorskip("dask")
+
+    import dask.array
+
+    da = _make_latlon_aux_coord_data()
+    da = xr.concat([da, 2.0 * da], dim="time")
+    da = da.copy(data=dask.array.from_array(da.values, chunks=(1, -1, -1)))
+    da_resampled = rc.resample(
+        TARGET_DOMAIN, da=da, dx=25.0e3, method="bilinear", backend="pyresample"
+    )
+    assert da_resampled.chunks is not None
+
+    da_resampled = da_resampled.compute()
+    np.testing.assert_allclose(
+        da_resampled.isel(time=1), 2.0 * da_resampled.isel(time=0)
+    )
+
+
+def test_pyresample_area_def():
+    pytest.importorskip("pyresample")
+    from regridcart.interpolation.backends.pyresample import get_pyresample_area_def
+
+    dx = 25.0e3
+    area_def = get_pyresample_area_def(domain=TARGET_DOMAIN, dx=dx)
+    ds_grid = TARGET_DOMAIN.get_grid(dx=dx)
+
+    # pyresample area definitions have the first row in the north
+    lons, lats = area_def.get_lonlats()
+    np.testing.assert_allclose(lons[::-1, :].T, ds_grid.lon.values)
+    np.testing.assert_allclose(lats[::-1, :].T, ds_grid.lat.values)
+
+
+@pytest.mark.parametrize(
+    "make_data", [_make_latlon_aligned_data, _make_latlon_aux_coord_data]
+)
+@pytest.mark.parametrize("n_workers", [None, 2])
+def test_resample_many(make_data, n_workers):
+    da = make_data()
+    domains = {
+        f"tile{n}": rc.LocalCartesianDomain(
+            central_latitude=lat,
+            central_longitude=lon,
+            l_meridional=500.0e3,
+            l_zonal=500.0e3,
+        )
+        for n, (lat, lon) in enumerate([(12.0, -50.0), (14.0, -46.0), (10.0, -45.0)])
+    }
+    kwargs = dict(dx=25.0e3, backend="scipy")
+
+    results = rc.resample_many(domains=domains, da=da, n_workers=n_workers, **kwargs)
+    assert list(results.keys()) == list(domains.keys())
+    for name, domain in domains.items():
+        da_resampled = rc.resample(domain=domain, da=da, **kwargs)
+        np.testing.assert_allclose(results[name].values, da_resampled.values)
+
+    results_list = rc.resample_many(domains=list(domains.values()), da=da, **kwargs)
+    assert len(results_list) == len(domains)
+
+
+@pytest.mark.parametrize(
+    "make_data", [_make_latlon_aligned_data, _make_latlon_aux_coord_data]
+)
+def test_resample_dataset(make_data):
+    da = make_data()
+    ds = xr.Dataset(
+        dict(
+            a=da.astype(np.float32),
+            b=2.0 * da,
+            c=da.expand_dims(time=3),
+            n_obs=xr.DataArray(42),
+        )
+    )
+    ds.a.attrs["units"] = "K"
+    ds.attrs["title"] = "test data"
+
+    kwargs = dict(domain=TARGET_DOMAIN, dx=50.0e3, backend="scipy")
+    ds_resampled = rc.resample(da=ds, keep_attrs=True, **kwargs)
+
+    assert list(ds_resampled.data_vars) == list(ds.data_vars)
+    assert ds_resampled.a.dtype == np.float32
+    assert ds_resampled.a.attrs == ds.a.attrs
+    assert ds_resampled.attrs == ds.attrs
+    assert ds_resampled.c.dims == ("time", "y", "x")
+    assert ds_resampled.n_obs == 42
+    np.testing.assert_allclose(
+        ds_resampled.b.values, rc.resample(da=ds.b, **kwargs).values
+    )
+
+    # a regridder created from a data-array can be applied to a dataset too
+    regridder = rc.Regridder(source_template=da, **kwargs)
+    xr.testing.assert_allclose(regridder(ds), rc.resample(da=ds, **kwargs))
+
+
+def test_instrument(caplog, monkeypatch):
+    import logging
+
+    from regridcart.instrumentation import log_stage
+
+    da = _make_latlon_aux_coord_data()
+    kwargs = dict(domain=TARGET_DOMAIN, dx=50.0e3, backend="scipy")
+
+    records = []
+    rc.interpolation.weights_cache.clear()
+    with caplog.at_level(logging.INFO, logger="regridcart.instrumentation"):
+        with rc.instrument(callbacks=[records.append, log_stage]) as report:
+            rc.resample(da=da, **kwargs)
+            rc.resample(da=da, **kwargs)
+
+    stage_names = ["target_grid", "crop", "source_grid", "weights", "apply"]
+    assert [s.name for s in report.stages] == 2 * stage_names
+    assert records == report.stages
+    assert len(caplog.records) == len(records)
+
+    weight_stages = [s for s in report.stages if s.name == "weights"]
+    assert (weight_stages[0].cache_hits, weight_stages[0].cache_misses) == (0, 1)
+    assert (weight_stages[1].cache_hits, weight_stages[1].cache_misses) == (1, 0)
+    apply_stage = report.stages[4]
+    assert apply_stage.input_shape == dict(da.sizes)
+    assert apply_stage.output_shape == dict(y=20, x=40)
+
+    with rc.instrument(trace_memory=True) as report:
+        rc.resample(da=da, **kwargs)
+    assert all(s.bytes_allocated is not None for s in report.stages)
+    assert set(report.by_stage().keys()) == set(stage_names)
+
+    # `tracemalloc.reset_peak` isn't available before python 3.9
+    monkeypatch.delattr("tracemalloc.reset_peak", raising=False)
+    with rc.instrument(trace_memory=True) as report:
+        rc.resample(da=da, **kwargs)
+    assert all(s.bytes_allocated >= 0 for s in report.stages)
+
+    # nothing should be recorded outside of the context
+    rc.resample(da=da, **kwargs)
+    assert len(report.stages) == len(stage_names)
+
+
+@pytest.mark.parametrize(
+    "make_data", [_make_latlon_aligned_data, _make_latlon_aux_coord_data]
+)
+@pytest.mark.parametrize("method", ["conservative", "conservative_normed"])
+def test_conservative(make_data, method):
+    da = make_data()
+    kwargs = dict(domain=TARGET_DOMAIN, dx=50.0e3, method=method, backend="scipy")
+
+    # a constant field should stay constant
+    da_resampled = rc.resample(da=xr.ones_like(da), **kwargs)
+    np.testing.assert_allclose(da_resampled.values, 1.0)
+
+    # and averaging onto a grid coarser than the source grid should be close
+    # to interpolating
+    da_resampled = rc.resample(da=da, **kwargs)
+    da_bilinear = rc.resample(da=da, domain=TARGET_DOMAIN, dx=50.0e3, backend="scipy")
+    np.testing.assert_allclose(da_resampled.values, da_bilinear.values, atol=1.0e-3)
+
+
+def test_conservative_without_shapely(monkeypatch):
+    # importing a module set to `None` in `sys.modules` raises ImportError
+    monkeypatch.setitem(sys.modules, "shapely", None)
+    rc.interpolation.weights_cache.clear()
+    with pytest.raises(ImportError, match=r"regridcart\[conservative\]"):
+        rc.resample(
+            da=_make_latlon_aligned_data(),
+            domain=TARGET_DOMAIN,
+            dx=50.0e3,
+            method="conservative",
+            backend="scipy",
+        )
+
+
+def test_scipy_backend_conservative_matches_xesmf():
+    pytest.importorskip("xesmf")
+
+    da = _make_latlon_aligned_data()
+    kwargs = dict(domain=TARGET_DOMAIN, da=da, dx=50.0e3, method="conservative")
+    da_scipy = rc.resample(backend="scipy", **kwargs)
+    da_xesmf = rc.resample(backend="xesmf", **kwargs)
+    np.testing.assert_allclose(da_scipy.values, da_xesmf.values, atol=1.0e-3)
+
+
+@pytest.mark.parametrize("method", ["block_mean", "block_median", "block_max"])
+def test_block_methods(method):
+    # fine (~1km) source data coarsened to 25km
+    ds = xr.Dataset(
+        coords=dict(lat=np.arange(5.0, 20.0, 0.01), lon=np.arange(-60.0, -36.0, 0.01))
+    )
+    da = _phi(ds.lat, ds.lon)
+    da = da.where(da.lat < 15.0).chunk(dict(lat=500))
+
+    da_resampled = rc.resample(
+        TARGET_DOMAIN, da=da, dx=25.0e3, method=method, backend="scipy"
+    )
+    assert da_resampled.dims == ("y", "x")
+
+    # compare with aggregating the source points in each target cell directly
+    regridder = rc.Regridder(
+        TARGET_DOMAIN, source_template=da, dx=25.0e3, method=method, backend="scipy"
+    )
+    values = da.isel(regridder.crop_indexers).values.ravel()
+    ix, iy = 12, 10
+    i_cell = np.ravel_multi_index(
+        (ix, iy), (regridder.new_grid.x.size, regridder.new_grid.y.size)
+    )
+    cell_values = values[regridder.weights[i_cell].indices]
+    reduce_fn = dict(block_mean=np.nanmean, block_median=np.nanmedian)
+    expected = reduce_fn.get(method, np.nanmax)(cell_values)
+    np.testing.assert_allclose(da_resampled.isel(x=ix, y=iy), expected)
+    assert cell_values.size > 500
+
+    # cells where all the source points are missing are missing
+    assert da_resampled.isel(y=-1).isnull().all()
+    assert da_resampled.isel(y=0).notnull().all()
+
+
+def test_scipy_nearest_kdtree(tmp_path):
+    from regridcart.interpolation.backends.scipy import kdtree_cache
+
+    # a categorical field on a narrow "swath" which only covers part of the
+    # domain
+    da = _make_latlon_aux_coord_data().isel(y=slice(30, 50))
+    da = (da > da.median()).astype(int)
+    kwargs = dict(domain=TARGET_DOMAIN, da=da, dx=25.0e3, method="nearest_s2d")
+
+    kdtree_cache.clear()
+    rc.interpolation.weights_cache.clear()
+    with rc.set_options(cache_dir=tmp_path):
+        da_resampled = rc.resample(backend="scipy", **kwargs)
+        assert kdtree_cache.info().misses == 1
+        assert len(list((tmp_path / "kdtree").glob("*.pkl"))) == 1
+
+        # the tree is loaded from disk when not in memory
+        kdtree_cache.clear()
+        rc.interpolation.weights_cache.clear()
+        da_resampled_cached = rc.resample(backend="scipy", **kwargs)
+        np.testing.assert_equal(da_resampled.values, da_resampled_cached.values)
+
+    assert int(da_resampled.isnull().sum()) == 0
+    assert set(np.unique(da_resampled.values)) == {0.0, 1.0}
+
+    # points more than 30km outside of the swath are masked out
+    with rc.set_options(nearest_max_distance=30.0e3):
+        da_masked = rc.resample(backend="scipy", **kwargs)
+    n_valid = int(da_masked.notnull().sum())
+    assert 0 < n_valid < da_masked.size
+    np.testing.assert_equal(
+        da_masked.values[da_masked.notnull().values],
+        da_resampled.values[da_masked.notnull().values],
+    )
+
+    # the distance can also be given for a single call, without changing the
+    # option
+    da_masked_kwarg = rc.resample(
+        backend="scipy", nearest_max_distance=30.0e3, **kwargs
+    )
+    np.testing.assert_equal(da_masked_kwarg.values, da_masked.values)
+    regridder = rc.Regridder(
+        source_template=kwargs["da"],
+        domain=kwargs["domain"],
+        dx=kwargs["dx"],
+        method=kwargs["method"],
+        backend="scipy",
+        nearest_max_distance=30.0e3,
+    )
+    np.testing.assert_equal(regridder(kwargs["da"]).values, da_masked.values)
+    assert int(rc.resample(backend="scipy", **kwargs).isnull().sum()) == 0
@@ -0,0 +1,117 @@
+import json
+import multiprocessing
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+import xarray as xr
+
+import regridcart as rc
+from regridcart.batch import main, open_input, regrid_files
+
+from .test_backends import TARGET_DOMAIN, _make_latlon_aligned_data
+from .test_coords import _make_cf_geostationary_data
+
+
+@pytest.mark.parametrize("n_workers", [None, 2])
+def test_regrid_files(tmp_path, n_workers):
+    paths = []
+    for n in range(3):
+        path = tmp_path / f"input{n}.nc"
+        (_make_latlon_aligned_data() * n).to_netcdf(path)
+        paths.append(str(path))
+    # a file that can't be read shouldn't stop the other files being regridded
+    bad_path = tmp_path / "bad.nc"
+    bad_path.write_text("not a netCDF file")
+    paths.insert(1, str(bad_path))
+
+    kwargs = dict(domain=TARGET_DOMAIN, dx=50.0e3, backend="scipy")
+    results = regrid_files(
+        paths=paths, output_dir=tmp_path / "out", n_workers=n_workers, **kwargs
+    )
+
+    assert [r.input_path for r in results] == paths
+    assert [r.error is None for r in results] == [True, False, True, True]
+
+    da_regridded = rc.resample(da=_make_latlon_aligned_data() * 2, **kwargs)
+    ds_output = xr.open_dataset(results[-1].output_path)
+    np.testing.assert_allclose(ds_output.phi.values, da_regridded.values)
+    assert rc.deserialise_domain(json.loads(ds_output.domain)).serialize() == (
+        TARGET_DOMAIN.serialize()
+    )
+
+
+def test_regrid_cf_grid_mapping_file(tmp_path):
+    # in CF files the grid-mapping is a separate (data) variable
+    da = _make_cf_geostationary_data(nx=100, ny=50).rename("phi")
+    grid_mapping = da.attrs["grid_mapping"]
+    ds = xr.Dataset({"phi": da.drop_vars(grid_mapping), grid_mapping: da[grid_mapping]})
+    path = tmp_path / "input.nc"
+    ds.to_netcdf(path)
+
+    domain = rc.LocalCartesianDomain(
+        central_latitude=18.0,
+        central_longitude=-60.0,
+        l_meridional=300.0e3,
+        l_zonal=500.0e3,
+    )
+    kwargs = dict(domain=domain, dx=20.0e3, backend="scipy")
+    (result,) = regrid_files(paths=[str(path)], output_dir=tmp_path / "out", **kwargs)
+    assert result.error is None
+
+    da_regridded = rc.resample(da=da, **kwargs)
+    with xr.open_dataset(result.output_path) as ds_output:
+        assert list(ds_output.data_vars) == ["phi"]
+        np.testing.assert_allclose(ds_output.phi.values, da_regridded.values)
+
+
+def test_cli(tmp_path):
+    _make_latlon_aligned_data().to_netcdf(tmp_path / "input.nc")
+    domain_path = tmp_path / "domain.json"
+    domain_path.write_text(json.dumps(TARGET_DOMAIN.serialize()))
+
+    argv = [str(tmp_path / "*.nc"), "--domain", str(domain_path), "--dx", "50e3"]
+    argv += ["--backend", "scipy", "--output-dir", str(tmp_path / "out")]
+    assert main(argv) == 0
+    assert (tmp_path / "out" / "input.nc").exists()
+
+
+def test_regrid_files_same_output(tmp_path):
+    paths = []
+    for subdir in ["a", "b"]:
+        (tmp_path / subdir).mkdir()
+        path = tmp_path / subdir / "input.nc"
+        _make_latlon_aligned_data().to_netcdf(path)
+        paths.append(str(path))
+
+    kwargs = dict(domain=TARGET_DOMAIN, dx=50.0e3, backend="scipy")
+    with pytest.raises(ValueError, match="same output file"):
+        regrid_files(paths=paths, output_dir=tmp_path / "out", **kwargs)
+
+
+def _open_input_or_crash(path, variable=None):
+    if Path(path).stem == "crash":
+        os._exit(1)
+    return open_input(path, variable=variable)
+
+
+@pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork",
+    reason="the patched function is only used by forked workers",
+)
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_regrid_files_worker_crash(tmp_path, monkeypatch, n_workers):
+    monkeypatch.setattr(rc.batch, "open_input", _open_input_or_crash)
+    paths = []
+    for name in ["input0", "crash", "input1", "input2"]:
+        path = tmp_path / f"{name}.nc"
+        _make_latlon_aligned_data().to_netcdf(path)
+        paths.append(str(path))
+
+    kwargs = dict(domain=TARGET_DOMAIN, dx=50.0e3, backend="scipy")
+    results = regrid_files(
+        paths=paths, output_dir=tmp_path / "out", n_workers=n_workers, **kwargs
+    )
+    assert [r.error is None for r in results] == [True, False, True, True]
+    assert "BrokenProcessPool" in results[1].error
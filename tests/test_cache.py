@@ -0,0 +1,112 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from regridcart.cache import DiskCache, LRUCache, fingerprint, get_or_compute
+
+
+def test_fingerprint():
+    ds = xr.Dataset(coords=dict(lat=np.arange(5.0), lon=np.arange(10.0)))
+
+    assert fingerprint(ds.lat, "bilinear") == fingerprint(ds.lat.copy(), "bilinear")
+    assert fingerprint(ds.lat, "bilinear") != fingerprint(ds.lat, "conservative")
+    assert fingerprint(ds.lat) != fingerprint(ds.lat + 1.0e-6)
+    assert fingerprint(ds.lat) != fingerprint(ds.lat.astype(np.float32))
+
+
+def test_disk_cache_lru_eviction(tmp_path):
+    cache = DiskCache(path=tmp_path, max_bytes=250, suffix=".bin")
+
+    def _writer(content):
+        def _write(fn):
+            with open(fn, "wb") as fh:
+                fh.write(content)
+
+        return _write
+
+    for n, key in enumerate(["a", "b", "c"]):
+        cache.put(key, _writer(b"0" * 100))
+        # make sure the modification times are distinct and ordered
+        os.utime(cache.filepath(key), (n, n))
+
+    # "c" was added last, so the cache now exceeds `max_bytes` and "a" is
+    # least recently used
+    cache.evict()
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+    assert cache.get("c") is not None
+
+    # "b" was just used, so "c" will be evicted to make room for "d"
+    os.utime(cache.filepath("c"), (0, 0))
+    cache.put("d", _writer(b"0" * 100))
+    assert cache.get("c") is None
+    assert cache.get("b") is not None
+    assert cache.get("d") is not None
+
+    # no temporary files should be left behind
+    assert sorted(fp.name for fp in tmp_path.iterdir()) == ["b.bin", "d.bin"]
+
+
+def test_lru_cache_limits_and_stats():
+    cache = LRUCache(maxsize=2, maxbytes=100)
+
+    cache.put("a", 1, nbytes=10)
+    cache.put("b", 2, nbytes=10)
+    assert cache.get("a") == 1
+    # "b" is now least recently used and is evicted when adding "c"
+    cache.put("c", 3, nbytes=10)
+    assert cache.get("b") is None
+    assert "a" in cache and "c" in cache
+
+    # adding a large entry evicts until the total size is below the limit
+    cache.put("d", 4, nbytes=85)
+    assert cache.get("a") is None
+    assert cache.get("d") == 4
+
+    info = cache.info()
+    assert info.hits == 2
+    assert info.misses == 2
+    assert info.currsize == 2
+    assert info.currbytes == 95
+
+
+def _load_pickle(filename):
+    with open(filename, "rb") as fh:
+        return pickle.load(fh)
+
+
+def _dump_pickle(value, filename):
+    with open(filename, "wb") as fh:
+        pickle.dump(value, fh)
+
+
+@pytest.mark.parametrize("content", [b"", pickle.dumps(list(range(100)))[:-10]])
+def test_get_or_compute_corrupt_file(tmp_path, content):
+    memory_cache = LRUCache()
+    disk_cache = DiskCache(path=tmp_path, suffix=".pkl")
+    kwargs = dict(
+        memory_cache=memory_cache,
+        disk_cache=disk_cache,
+        load_fn=_load_pickle,
+        dump_fn=_dump_pickle,
+    )
+    calls = []
+
+    def _compute():
+        calls.append(None)
+        return [1, 2, 3]
+
+    assert get_or_compute("a", _compute, **kwargs) == [1, 2, 3]
+    memory_cache.clear()
+    assert get_or_compute("a", _compute, **kwargs) == [1, 2, 3]
+    assert len(calls) == 1
+
+    # a truncated or corrupt file is treated as a cache miss (and replaced)
+    memory_cache.clear()
+    disk_cache.filepath("a").write_bytes(content)
+    assert get_or_compute("a", _compute, **kwargs) == [1, 2, 3]
+    assert len(calls) == 2
+    assert _load_pickle(disk_cache.filepath("a")) == [1, 2, 3]
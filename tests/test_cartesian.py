@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+import regridcart as rc
+from regridcart.interpolation.cartesian import is_on_domain_projection
+
+from .test_backends import TARGET_DOMAIN, _make_latlon_aux_coord_data, _phi
+
+
+def _make_domain_data(dx):
+    # data on the tangent plane of the target domain, as for example produced
+    # by regridding onto the domain or by a model run on the domain
+    return rc.resample(
+        TARGET_DOMAIN, da=_make_latlon_aux_coord_data(), dx=dx, backend="scipy"
+    )
+
+
+def test_cartesian_resample_detection():
+    da = _make_domain_data(dx=50.0e3)
+    assert is_on_domain_projection(domain=TARGET_DOMAIN, da=da)
+
+    other_domain = rc.LocalCartesianDomain(
+        central_latitude=10.0,
+        central_longitude=-45.0,
+        l_meridional=1000.0e3,
+        l_zonal=2000.0e3,
+    )
+    assert not is_on_domain_projection(domain=other_domain, da=da)
+    assert not is_on_domain_projection(
+        domain=TARGET_DOMAIN, da=_make_latlon_aux_coord_data()
+    )
+
+
+@pytest.mark.parametrize("method", ["conservative", "conservative_normed"])
+def test_cartesian_coarsen(method):
+    da = _make_domain_data(dx=10.0e3)
+    with rc.instrument() as report:
+        da_coarse = rc.resample(TARGET_DOMAIN, da=da, dx=50.0e3, method=method)
+    # no lat/lon coordinates or regridding weights are computed
+    assert "weights" not in report.by_stage()
+
+    da_true = da.coarsen(x=5, y=5).mean()
+    np.testing.assert_allclose(da_coarse.values, da_true.values)
+    np.testing.assert_allclose(da_coarse.lat, TARGET_DOMAIN.get_grid(dx=50.0e3).lat.T)
+    assert da_coarse.dims == ("y", "x")
+
+
+@pytest.mark.parametrize(
+    "method, tolerance", [("bilinear", 1.0e-3), ("nearest_s2d", 2.0e-2)]
+)
+def test_cartesian_interpolation(method, tolerance):
+    da = _make_domain_data(dx=10.0e3)
+    da_resampled = rc.resample(TARGET_DOMAIN, da=da, dx=25.0e3, method=method)
+
+    assert da_resampled.dims == ("y", "x")
+    assert int(da_resampled.isnull().sum()) == 0
+    da_phi_true = _phi(da_resampled.lat, da_resampled.lon)
+    assert float(np.abs(da_resampled - da_phi_true).max()) < tolerance
+
+
+def test_cartesian_domain_separable():
+    domain = rc.CartesianDomain(l_meridional=105.0e3, l_zonal=210.0e3)
+    ds = domain.get_grid(dx=3.0e3)
+    # a linear field is reproduced exactly by bilinear interpolation and its
+    # area-integral is kept by conservative regridding (with a non-integer
+    # ratio of resolutions here)
+    ds["phi"] = 2.0 * ds.x + 3.0 * ds.y + 1.0e6
+    ds["phi"] = ds.phi.chunk(dict(x=10))
+
+    da_bilinear = rc.resample(domain, da=ds.phi, dx=7.0e3, method="bilinear")
+    da_true = 2.0 * da_bilinear.x + 3.0 * da_bilinear.y + 1.0e6
+    da_true = da_true.transpose("y", "x")
+    inside = (
+        (da_true.x >= ds.x.min())
+        & (da_true.x <= ds.x.max())
+        & (da_true.y >= ds.y.min())
+        & (da_true.y <= ds.y.max())
+    )
+    np.testing.assert_allclose(
+        da_bilinear.where(inside).values, da_true.where(inside).values, atol=1.0e-6
+    )
+    assert da_bilinear.isnull().sum() == (~inside).sum()
+
+    for method in ["conservative", "conservative_normed"]:
+        da_cons = rc.resample(domain, da=ds.phi, dx=7.0e3, method=method)
+        np.testing.assert_allclose(
+            float(da_cons.sum()) * 7.0e3 ** 2, float(ds.phi.sum()) * 3.0e3 ** 2
+        )
+
+
+def test_cartesian_resample_dataset():
+    da = _make_domain_data(dx=10.0e3)
+    ds = xr.Dataset(dict(phi=da, phi2=2.0 * da))
+    ds["phi"].attrs["units"] = "K"
+
+    ds_coarse = rc.resample(
+        TARGET_DOMAIN, da=ds, dx=50.0e3, method="conservative", keep_attrs=True
+    )
+    np.testing.assert_allclose(ds_coarse.phi2, 2.0 * ds_coarse.phi)
+    assert ds_coarse.phi.attrs["units"] == "K"
@@ -0,0 +1,200 @@
+import numpy as np
+import xarray as xr
+
+import regridcart as rc
+from regridcart.coords import get_latlon_coords_using_crs, latlon_coords_cache
+
+
+def _make_cf_geostationary_data(nx=200, ny=100):
+    """
+    Create a data-array on a grid in the geostationary projection (as used
+    for GOES satellite data) with the projection information given in a
+    CF-compliant manner
+    """
+    h = 35786023.0
+    da_proj = xr.DataArray(
+        0,
+        attrs=dict(
+            grid_mapping_name="geostationary",
+            perspective_point_height=h,
+            semi_major_axis=6378137.0,
+            semi_minor_axis=6356752.31414,
+            longitude_of_projection_origin=-75.0,
+            latitude_of_projection_origin=0.0,
+            sweep_angle_axis="x",
+        ),
+    )
+    # scanning angles (in radians) covering the Caribbean
+    x = np.linspace(0.02, 0.06, nx) * h
+    y = np.linspace(0.05, 0.07, ny) * h
+    da = xr.DataArray(
+        np.random.random((ny, nx)),
+        dims=("y", "x"),
+        coords=dict(x=x, y=y, goes_imager_projection=da_proj),
+        attrs=dict(grid_mapping="goes_imager_projection"),
+    )
+    return da
+
+
+def test_latlon_coords_using_crs_cached(tmp_path):
+    da = _make_cf_geostationary_data()
+
+    latlon_coords_cache.clear()
+    with rc.set_options(cache_dir=str(tmp_path)):
+        coords = get_latlon_coords_using_crs(da)
+        coords_cached = get_latlon_coords_using_crs(da)
+
+        assert latlon_coords_cache.info().hits == 1
+        for c in ["lat", "lon"]:
+            assert coords_cached[c].values is coords[c].values
+            assert np.all(np.isfinite(coords[c]))
+
+        # with the in-memory cache cleared the values should be read from disk
+        latlon_coords_cache.clear()
+        assert len(list((tmp_path / "coords").glob("*.npz"))) == 1
+        coords_disk = get_latlon_coords_using_crs(da)
+        for c in ["lat", "lon"]:
+            np.testing.assert_equal(coords_disk[c].values, coords[c].values)
+
+    # a different grid shouldn't use the cached values
+    coords_cropped = get_latlon_coords_using_crs(da.isel(x=slice(10, 20)))
+    np.testing.assert_equal(
+        coords_cropped["lat"].values, coords["lat"].isel(x=slice(10, 20)).values
+    )
+
+
+def test_crop_projected_grid_without_full_latlon():
+    da = _make_cf_geostationary_data(nx=400, ny=200)
+    domain = rc.LocalCartesianDomain(
+        central_latitude=18.0,
+        central_longitude=-60.0,
+        l_meridional=300.0e3,
+        l_zonal=500.0e3,
+    )
+
+    latlon_coords_cache.clear()
+    da_cropped = rc.crop_field_to_domain(domain=domain, da=da)
+    # cropping shouldn't require the lat/lon position of every grid point
+    assert len(latlon_coords_cache) == 0
+    assert da_cropped.x.size < da.x.size
+
+    # but the cropped data should still cover the whole domain
+    coords = get_latlon_coords_using_crs(da_cropped)
+    grid = domain.get_grid(dx=10.0e3)
+    assert coords["lat"].min() < grid.lat.min() and coords["lat"].max() > grid.lat.max()
+    assert coords["lon"].min() < grid.lon.min() and coords["lon"].max() > grid.lon.max()
+
+
+def test_latlon_bounds():
+    from regridcart.coords import get_latlon_bounds
+
+    # lat/lon aligned, with the bounds inferred from the cell centres
+    lat = np.arange(10.0, 12.0, 0.5)
+    lon = np.arange(-50.0, -47.0, 0.5)
+    da = xr.DataArray(
+        np.zeros((lat.size, lon.size)),
+        dims=("lat", "lon"),
+        coords=dict(lat=lat, lon=lon),
+    )
+    bounds = get_latlon_bounds(da)
+    np.testing.assert_allclose(bounds["lat_b"], np.arange(9.75, 12.0, 0.5))
+    np.testing.assert_allclose(bounds["lon_b"], np.arange(-50.25, -47.0, 0.5))
+
+    # and with CF bounds (which can only be stored in a dataset)
+    ds = da.to_dataset(name="phi")
+    ds["lat_bnds"] = (("lat", "nv"), np.stack([lat - 0.1, lat + 0.4], axis=-1))
+    ds.lat.attrs["bounds"] = "lat_bnds"
+    bounds = get_latlon_bounds(ds.phi, ds=ds)
+    np.testing.assert_allclose(bounds["lat_b"], np.arange(9.9, 12.0, 0.5))
+
+    # for projected data the corners are computed from the projection
+    da = _make_cf_geostationary_data(nx=20, ny=10)
+    bounds = get_latlon_bounds(da)
+    assert bounds["lat_b"].shape == (11, 21)
+    coords = get_latlon_coords_using_crs(da)
+    assert np.all(bounds["lat_b"].values[:-1, :-1] < coords["lat"].values)
+    assert np.all(bounds["lat_b"].values[1:, 1:] > coords["lat"].values)
+
+
+def test_spatial_index_crop():
+    from regridcart.cropping import get_crop_indexers
+
+    from .test_backends import _make_latlon_aux_coord_data
+
+    da = _make_latlon_aux_coord_data().transpose("y", "x")
+    # missing positions (e.g. outside a satellite swath) are ignored
+    da.coords["lat"] = da.lat.where(da.x > -18.0)
+    index = rc.SpatialIndex(da, block_size=8)
+
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        domain = rc.LocalCartesianDomain(
+            central_latitude=rng.uniform(5.0, 23.0),
+            central_longitude=rng.uniform(-65.0, -31.0),
+            l_meridional=rng.uniform(50.0e3, 1000.0e3),
+            l_zonal=rng.uniform(50.0e3, 1000.0e3),
+        )
+        indexers = get_crop_indexers(domain=domain, da=da)
+        assert get_crop_indexers(domain=domain, da=da, spatial_index=index) == indexers
+
+    # the index can also be built from projection information
+    da_geos = _make_cf_geostationary_data()
+    domain = rc.LocalCartesianDomain(
+        central_latitude=18.0,
+        central_longitude=-60.0,
+        l_meridional=300.0e3,
+        l_zonal=500.0e3,
+    )
+    index = rc.SpatialIndex(da_geos)
+    da_cropped = rc.crop_field_to_domain(domain, da_geos, spatial_index=index)
+    assert da_cropped.x.size < da_geos.x.size
+    assert da_cropped.y.size < da_geos.y.size
+
+    da_resampled = rc.resample(
+        domain, da=da_geos, dx=25.0e3, backend="scipy", spatial_index=index
+    )
+    xr.testing.assert_equal(
+        da_resampled, rc.resample(domain, da=da_geos, dx=25.0e3, backend="scipy")
+    )
+
+
+def test_crop_latlon_aligned_across_seam():
+    from regridcart.cropping import get_crop_indexers
+
+    lat = np.arange(-89.75, 90.0, 0.5)
+    for lon_start, lon_c in [(-180.0, 178.0), (0.0, 2.0), (0.0, -45.0)]:
+        lon = np.arange(lon_start, lon_start + 360.0, 0.5)
+        da = xr.DataArray(
+            np.cos(np.deg2rad(lat))[:, None] * np.sin(np.deg2rad(lon))[None, :],
+            dims=("lat", "lon"),
+            coords=dict(lat=lat, lon=lon),
+        )
+        domain = rc.LocalCartesianDomain(
+            central_latitude=-20.0,
+            central_longitude=lon_c,
+            l_meridional=1000.0e3,
+            l_zonal=2000.0e3,
+        )
+        indexers = get_crop_indexers(domain=domain, da=da)
+        # only the domain's longitudes are selected, for domains crossing the
+        # seam where the longitudes wrap around by joining the longitudes on
+        # either side
+        assert isinstance(indexers["lon"], np.ndarray) == (lon_c != -45.0)
+        da_cropped = rc.crop_field_to_domain(domain=domain, da=da)
+        assert da_cropped.lon.size < 100
+        assert np.all(np.diff(da_cropped.lon) == 0.5)
+        dlon = (da_cropped.lon.values - lon_c + 180.0) % 360.0 - 180.0
+        assert dlon.min() < -10.0 and dlon.max() > 10.0
+
+        # regridding gives the same as with the seam rolled away from the domain
+        da_rolled = da.roll(lon=da.lon.size // 2, roll_coords=True)
+        da_rolled["lon"] = np.where(
+            da_rolled.lon < da_rolled.lon[0], da_rolled.lon + 360.0, da_rolled.lon
+        )
+        for method in ["bilinear", "conservative"]:
+            kwargs = dict(domain=domain, dx=50.0e3, method=method, backend="scipy")
+            da_resampled = rc.resample(da=da, **kwargs)
+            assert int(da_resampled.isnull().sum()) == 0
+            np.testing.assert_allclose(
+                da_resampled, rc.resample(da=da_rolled, **kwargs), atol=1.0e-12
+            )
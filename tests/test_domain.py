@@ -0,0 +1,39 @@
+import cartopy.crs as ccrs
+import numpy as np
+
+import regridcart as rc
+from regridcart.domain import grid_cache
+
+
+def test_local_cartesian_grid():
+    domain = rc.LocalCartesianDomain(
+        central_latitude=12.5,
+        central_longitude=-48.0,
+        l_meridional=1000.0e3,
+        l_zonal=2000.0e3,
+        x_c=10.0e3,
+        y_c=-5.0e3,
+    )
+    dx = 20.0e3
+
+    grid_cache.clear()
+    ds_grid = domain.get_grid(dx=dx)
+    assert ds_grid.lat.dims == ("x", "y")
+    assert ds_grid.x.size == 100 and ds_grid.y.size == 50
+
+    # check against transforming the full meshgrid of positions with cartopy
+    x, y = np.meshgrid(ds_grid.x, ds_grid.y, indexing="ij")
+    pts = ccrs.PlateCarree().transform_points(domain.crs, x, y)
+    np.testing.assert_allclose(ds_grid.lon, pts[..., 0], atol=1.0e-9)
+    np.testing.assert_allclose(ds_grid.lat, pts[..., 1], atol=1.0e-9)
+
+    # the second time the grid should come from the cache
+    ds_grid_cached = domain.get_grid(dx=dx)
+    assert grid_cache.info().hits == 1
+    assert ds_grid_cached.lat.values is ds_grid.lat.values
+
+    ds_grid_lazy = domain.get_grid(dx=dx, dtype=np.float32, chunks=16)
+    assert ds_grid_lazy.lat.chunks is not None
+    assert ds_grid_lazy.lat.dtype == np.float32
+    np.testing.assert_allclose(ds_grid_lazy.lat, ds_grid.lat, atol=1.0e-4)
+    np.testing.assert_allclose(ds_grid_lazy.lon, ds_grid.lon, atol=1.0e-4)
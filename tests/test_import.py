@@ -0,0 +1,42 @@
+import subprocess
+import sys
+
+import pytest
+
+# modules which are slow to import and are only needed for some functionality
+# (plotting, the xesmf backend and reading raster files)
+HEAVY_MODULES = ["matplotlib", "xesmf", "ESMF", "esmpy", "rioxarray"]
+
+
+def _imported_modules(code):
+    code += "; import sys; print(','.join(sorted(sys.modules)))"
+    output = subprocess.check_output([sys.executable, "-c", code], text=True)
+    return set(output.strip().split(","))
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "import regridcart",
+        "import regridcart as rc; rc.resample; rc.LocalCartesianDomain",
+        "import regridcart.batch",
+    ],
+)
+def test_import_is_lazy(code):
+    modules = _imported_modules(code)
+    assert modules.isdisjoint(HEAVY_MODULES)
+
+
+def test_import_regridcart_only_imports_package():
+    # importing the package itself doesn't import any of the dependencies
+    modules = _imported_modules("import regridcart")
+    assert modules.isdisjoint(["numpy", "xarray", "cartopy", "scipy"])
+
+
+def test_lazy_attributes():
+    import regridcart as rc
+
+    assert rc.resample is rc.interpolation.resample
+    assert "LocalCartesianDomain" in dir(rc)
+    with pytest.raises(AttributeError):
+        rc.not_an_attribute
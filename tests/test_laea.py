@@ -0,0 +1,119 @@
+import warnings
+
+import cartopy.crs as ccrs
+import numpy as np
+import pytest
+
+import regridcart as rc
+from regridcart import laea
+from regridcart.transform import get_transformer, lonlat_to_xy, xy_to_lonlat
+
+
+@pytest.mark.parametrize("engine", ["numpy", "numba"])
+@pytest.mark.parametrize(
+    "crs",
+    [
+        ccrs.LambertAzimuthalEqualArea(central_latitude=14.0, central_longitude=-48.0),
+        ccrs.LambertAzimuthalEqualArea(central_latitude=0.0, central_longitude=170.0),
+        ccrs.LambertAzimuthalEqualArea(central_latitude=-65.0, central_longitude=20.0),
+        ccrs.Projection("+proj=laea +lat_0=40 +lon_0=5 +x_0=1.0e5 +R=6371000"),
+    ],
+)
+def test_laea_matches_proj(crs, engine):
+    if engine == "numba":
+        pytest.importorskip("numba")
+    params = laea.params_from_crs(crs)
+    assert params is not None
+    transformer = get_transformer(crs)
+
+    rng = np.random.default_rng(42)
+    lon = params.lon_0 + rng.uniform(-30.0, 30.0, 1000)
+    lat = np.clip(params.lat_0 + rng.uniform(-30.0, 30.0, 1000), -89.0, 89.0)
+    x_true, y_true = transformer.transform(lon, lat, direction="INVERSE")
+
+    # forward to well below a millimeter
+    x, y = laea.forward(lon, lat, params, engine=engine)
+    np.testing.assert_allclose(x, x_true, rtol=0.0, atol=1.0e-4)
+    np.testing.assert_allclose(y, y_true, rtol=0.0, atol=1.0e-4)
+
+    # 1.0e-8 degrees is about a millimeter
+    lon_new, lat_new = laea.inverse(x_true, y_true, params, engine=engine)
+    dlon = (lon_new - lon + 180.0) % 360.0 - 180.0
+    np.testing.assert_allclose(dlon, 0.0, rtol=0.0, atol=1.0e-8)
+    np.testing.assert_allclose(lat_new, lat, rtol=0.0, atol=1.0e-8)
+
+    # the projection centre itself
+    lon_c, lat_c = laea.inverse(params.x_0, params.y_0, params, engine=engine)
+    np.testing.assert_allclose([lon_c, lat_c], [params.lon_0, params.lat_0])
+
+
+@pytest.mark.parametrize("engine", ["numpy", "numba"])
+def test_laea_inverse_outside_of_projection(engine):
+    if engine == "numba":
+        pytest.importorskip("numba")
+    crs = ccrs.LambertAzimuthalEqualArea(central_latitude=14.0, central_longitude=-48.0)
+    params = laea.params_from_crs(crs)
+    transformer = get_transformer(crs)
+
+    # the projection is a disc of radius ~2R around the projection centre,
+    # points outside of it are returned as inf like PROJ does
+    x = np.array([0.0, 1.2e7, 1.3e7, 2.0e7])
+    y = np.array([0.0, 0.0, 0.0, -2.0e7])
+    lon, lat = laea.inverse(x, y, params, engine=engine)
+    lon_true, lat_true = transformer.transform(x, y)
+    assert np.all(np.isfinite(lon[:2])) and np.all(np.isfinite(lat[:2]))
+    np.testing.assert_array_equal(lon[2:], np.inf)
+    np.testing.assert_array_equal(lat[2:], np.inf)
+    # PROJ's inverse is only accurate to about a millimeter (see below)
+    np.testing.assert_allclose(lon, lon_true, rtol=0.0, atol=2.0e-8)
+    np.testing.assert_allclose(lat, lat_true, rtol=0.0, atol=2.0e-8)
+
+
+@pytest.mark.parametrize("engine", ["numpy", "numba"])
+def test_laea_forward_antipode(engine):
+    if engine == "numba":
+        pytest.importorskip("numba")
+    crs = ccrs.LambertAzimuthalEqualArea(central_latitude=14.0, central_longitude=-48.0)
+    params = laea.params_from_crs(crs)
+    transformer = get_transformer(crs)
+
+    # the antipode of the projection centre can't be projected, like PROJ it
+    # is returned as inf (without warnings about dividing by zero)
+    lon = np.array([132.0, 0.0])
+    lat = np.array([-14.0, 0.0])
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        x, y = laea.forward(lon, lat, params, engine=engine)
+    x_true, y_true = transformer.transform(lon, lat, direction="INVERSE")
+    np.testing.assert_array_equal([x[0], y[0]], [np.inf, np.inf])
+    np.testing.assert_allclose(x, x_true, rtol=0.0, atol=1.0e-4)
+    np.testing.assert_allclose(y, y_true, rtol=0.0, atol=1.0e-4)
+
+
+def test_laea_params():
+    assert laea.params_from_crs(ccrs.PlateCarree()) is None
+    # polar aspects are left to PROJ
+    assert (
+        laea.params_from_crs(ccrs.LambertAzimuthalEqualArea(central_latitude=90.0))
+        is None
+    )
+
+
+def test_laea_engine_option():
+    domain = rc.LocalCartesianDomain(
+        central_latitude=14.0,
+        central_longitude=-48.0,
+        l_meridional=1000.0e3,
+        l_zonal=1500.0e3,
+    )
+    x = np.linspace(-0.75e6, 0.75e6, 31)[None, :]
+    y = np.linspace(-0.5e6, 0.5e6, 21)[:, None]
+    lons, lats = xy_to_lonlat(x=x, y=y, crs=domain.crs)
+    with rc.set_options(laea_engine="proj"):
+        lons_proj, lats_proj = xy_to_lonlat(x=x, y=y, crs=domain.crs)
+        x_proj, _ = lonlat_to_xy(lon=lons, lat=lats, crs=domain.crs)
+    # the inverse in PROJ (before v9.6) converts from authalic latitude with a
+    # truncated series which is only accurate to about a millimeter
+    np.testing.assert_allclose(lons, lons_proj, rtol=0.0, atol=2.0e-8)
+    np.testing.assert_allclose(lats, lats_proj, rtol=0.0, atol=2.0e-8)
+    np.testing.assert_allclose(x_proj, np.broadcast_to(x, x_proj.shape), atol=1.0e-4)
@@ -84,3 +84,107 @@ def test_latlon_aux_coord_data():
     da_phi_resampled = rc.resample(target_domain, da=da_phi_cropped, dx=dx)
     assert da_phi_resampled.x.count() == Nx
     assert da_phi_resampled.y.count() == Ny
+
+
+def test_regridder_reuse():
+    """
+    Test that a regridder created once from a template can be applied to a
+    time-series of fields and gives the same result as `rc.resample`
+    """
+    target_domain = rc.LocalCartesianDomain(
+        central_latitude=12.0,
+        central_longitude=-50.0,
+        l_meridional=1000.0e3,
+        l_zonal=3000.0e3,
+    )
+
+    ds = xr.Dataset(
+        coords=dict(
+            lat=np.arange(5.0, 20.0, 0.1),
+            lon=np.arange(-70.0, -30.0, 0.1),
+            time=np.arange(4),
+        )
+    )
+    ds["phi"] = np.sin(ds.lat) * np.cos(ds.lon) + ds.time
+
+    dx = 50.0e3  # [m]
+    regridder = rc.Regridder(
+        domain=target_domain, source_template=ds.phi.isel(time=0), dx=dx
+    )
+    da_phi_resampled = regridder(ds.phi)
+
+    assert da_phi_resampled.dims == ("time", "y", "x")
+    for t in ds.time.values:
+        da_phi_resampled_t = rc.resample(target_domain, da=ds.phi.sel(time=t), dx=dx)
+        np.testing.assert_allclose(
+            da_phi_resampled.sel(time=t).values, da_phi_resampled_t.values
+        )
+
+
+def test_resample_dask_lazy():
+    """
+    Test that resampling dask-backed data (including chunked auxilliary
+    lat/lon coordinates) is lazy and regrids chunk-by-chunk along the
+    non-spatial dimensions
+    """
+    target_domain = rc.LocalCartesianDomain(
+        central_latitude=14.0,
+        central_longitude=-48,
+        l_meridional=1000.0e3,
+        l_zonal=3000.0e3,
+    )
+
+    ds = xr.Dataset(
+        coords=dict(
+            x=np.arange(-20.0, 20.0, 0.5),
+            y=np.arange(-10.0, 10.0, 0.5),
+            time=np.arange(6),
+        )
+    )
+    theta = 20.0 * 3.14 / 180.0
+    ds.coords["lon"] = np.cos(theta) * ds.x - np.sin(theta) * ds.y - 48.0
+    ds.coords["lat"] = np.sin(theta) * ds.x + np.cos(theta) * ds.y + 14.0
+    ds["phi"] = np.cos(ds.x / 4.0) * np.sin(ds.y) * (ds.time + 1)
+
+    da_phi = ds.phi.transpose("time", "y", "x")
+    da_phi_lazy = da_phi.chunk(dict(time=2, x=20, y=20))
+
+    dx = 50.0e3  # [m]
+    kwargs = dict(domain=target_domain, dx=dx, backend="scipy")
+    da_resampled = rc.resample(da=da_phi, **kwargs)
+    da_resampled_lazy = rc.resample(da=da_phi_lazy, **kwargs)
+
+    assert da_resampled_lazy.chunks is not None
+    assert da_resampled_lazy.chunksizes["time"] == (2, 2, 2)
+    np.testing.assert_allclose(da_resampled_lazy.values, da_resampled.values)
+
+
+def test_crop_latlon_aux_coord_data_is_view():
+    """
+    Cropping data with auxilliary lat/lon coordinates should be done by
+    slicing so that the cropped data is a view into the original data (even
+    when the grid has no coordinate values along its dimensions)
+    """
+    target_domain = rc.LocalCartesianDomain(
+        central_latitude=14.0,
+        central_longitude=-48,
+        l_meridional=1000.0e3,
+        l_zonal=2000.0e3,
+    )
+
+    x, y = np.meshgrid(np.arange(-20.0, 20.0, 0.5), np.arange(-10.0, 10.0, 0.5))
+    theta = 20.0 * 3.14 / 180.0
+    da_phi = xr.DataArray(
+        np.cos(x / 4.0) * np.sin(y),
+        dims=("y", "x"),
+        coords=dict(
+            lon=(("y", "x"), np.cos(theta) * x - np.sin(theta) * y - 48.0),
+            lat=(("y", "x"), np.sin(theta) * x + np.cos(theta) * y + 14.0),
+        ),
+    )
+
+    da_phi_cropped = rc.crop_field_to_domain(domain=target_domain, da=da_phi)
+
+    assert da_phi_cropped.x.size < da_phi.x.size
+    assert da_phi_cropped.y.size < da_phi.y.size
+    assert np.shares_memory(da_phi_cropped.values, da_phi.values)
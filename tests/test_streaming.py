@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+import regridcart as rc
+
+from .test_backends import TARGET_DOMAIN, _make_latlon_aligned_data
+from .test_coords import _make_cf_geostationary_data
+
+
+@pytest.mark.parametrize("store", ["output.nc", "output.zarr"])
+def test_resample_to_store(tmp_path, store):
+    if store.endswith(".zarr"):
+        pytest.importorskip("zarr")
+
+    times = pd.date_range("2020-01-01", periods=5, freq="90min")
+    da_scale = xr.DataArray(np.arange(5.0), dims=("time",), coords=dict(time=times))
+    da = (_make_latlon_aligned_data() * da_scale).rename("phi").chunk(dict(time=2))
+
+    kwargs = dict(domain=TARGET_DOMAIN, dx=50.0e3, backend="scipy")
+    path = tmp_path / store
+    rc.resample_to_store(da=da, path=path, block_size=2, **kwargs)
+
+    da_resampled = rc.resample(da=da, **kwargs)
+    with xr.open_dataset(
+        path, engine="zarr" if store.endswith(".zarr") else None
+    ) as ds:
+        np.testing.assert_array_equal(ds.time.values, times.values)
+        np.testing.assert_allclose(
+            ds.phi.transpose(*da_resampled.dims).values, da_resampled.values
+        )
+
+
+def test_resample_dataset_to_store(tmp_path):
+    times = pd.date_range("2020-01-01", periods=3, freq="90min")
+    da_scale = xr.DataArray(np.arange(3.0), dims=("time",), coords=dict(time=times))
+    da = _make_latlon_aligned_data() * da_scale
+    ds = xr.Dataset(dict(phi=da, psi=2.0 * da)).chunk(dict(time=1))
+
+    kwargs = dict(domain=TARGET_DOMAIN, dx=50.0e3, backend="scipy")
+    path = tmp_path / "output.nc"
+    rc.resample_to_store(da=ds, path=path, block_size=2, **kwargs)
+
+    ds_resampled = rc.resample(da=ds, **kwargs)
+    with xr.open_dataset(path) as ds_stored:
+        np.testing.assert_array_equal(ds_stored.time.values, times.values)
+        for v in ["phi", "psi"]:
+            np.testing.assert_allclose(
+                ds_stored[v].transpose(*ds_resampled[v].dims).values,
+                ds_resampled[v].values,
+            )
+
+
+@pytest.mark.parametrize("store", ["output.nc", "output.zarr"])
+def test_resample_to_store_without_dim_coord(tmp_path, store):
+    if store.endswith(".zarr"):
+        pytest.importorskip("zarr")
+
+    da_scale = xr.DataArray(np.arange(3.0), dims=("time",))
+    da = (_make_latlon_aligned_data() * da_scale).rename("phi")
+    assert "time" not in da.coords
+
+    kwargs = dict(domain=TARGET_DOMAIN, dx=50.0e3, backend="scipy")
+    path = tmp_path / store
+    rc.resample_to_store(da=da, path=path, block_size=2, **kwargs)
+
+    da_resampled = rc.resample(da=da, **kwargs)
+    with xr.open_dataset(
+        path, engine="zarr" if store.endswith(".zarr") else None
+    ) as ds:
+        np.testing.assert_allclose(
+            ds.phi.transpose(*da_resampled.dims).values, da_resampled.values
+        )
+
+
+@pytest.mark.parametrize("store", ["output.nc", "output.zarr"])
+def test_resample_cf_dataset_to_store(tmp_path, store):
+    if store.endswith(".zarr"):
+        pytest.importorskip("zarr")
+
+    # a dataset as read from a CF file, with the grid-mapping as a variable
+    da = _make_cf_geostationary_data(nx=100, ny=50)
+    grid_mapping = da.attrs["grid_mapping"]
+    times = pd.date_range("2020-01-01", periods=3, freq="90min")
+    da_scale = xr.DataArray(np.arange(3.0), dims=("time",), coords=dict(time=times))
+    da = da.drop_vars(grid_mapping) * da_scale
+    da.attrs["grid_mapping"] = grid_mapping
+    ds = xr.Dataset(dict(phi=da, psi=2.0 * da)).chunk(dict(time=1))
+    ds[grid_mapping] = _make_cf_geostationary_data()[grid_mapping]
+
+    domain = rc.LocalCartesianDomain(
+        central_latitude=18.0,
+        central_longitude=-60.0,
+        l_meridional=300.0e3,
+        l_zonal=500.0e3,
+    )
+    kwargs = dict(domain=domain, dx=20.0e3, backend="scipy")
+    path = tmp_path / store
+    rc.resample_to_store(da=ds, path=path, block_size=2, **kwargs)
+
+    ds_resampled = rc.resample(da=ds, **kwargs)
+    with xr.open_dataset(
+        path, engine="zarr" if store.endswith(".zarr") else None
+    ) as ds_stored:
+        np.testing.assert_array_equal(ds_stored.time.values, times.values)
+        for v in ["phi", "psi"]:
+            np.testing.assert_allclose(
+                ds_stored[v].transpose(*ds_resampled[v].dims).values,
+                ds_resampled[v].values,
+            )
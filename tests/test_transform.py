@@ -0,0 +1,62 @@
+import cartopy.crs as ccrs
+import numpy as np
+import pytest
+
+from regridcart.transform import get_transformer, lonlat_to_xy, transform, xy_to_lonlat
+
+CRSS = [
+    ccrs.LambertAzimuthalEqualArea(central_latitude=15.0, central_longitude=-50.0),
+    ccrs.Projection("+proj=geos +h=35786023 +lon_0=-75 +sweep=x +ellps=GRS80"),
+]
+
+
+@pytest.mark.parametrize("crs", CRSS)
+def test_xy_to_lonlat_matches_cartopy(crs):
+    x = np.linspace(-2.0e6, 2.0e6, 30)
+    y = np.linspace(-1.0e6, 1.0e6, 20)
+
+    latlon_pts = ccrs.PlateCarree().transform_points(crs, *np.meshgrid(x, y))
+    lons, lats = xy_to_lonlat(x=x[None, :], y=y[:, None], crs=crs)
+    assert lons.shape == (20, 30)
+    np.testing.assert_allclose(lons, latlon_pts[..., 0])
+    np.testing.assert_allclose(lats, latlon_pts[..., 1])
+
+    lons32, lats32 = xy_to_lonlat(x=x[None, :], y=y[:, None], crs=crs, dtype=np.float32)
+    assert lons32.dtype == np.float32
+    np.testing.assert_allclose(lons32, lons, atol=1.0e-4)
+    np.testing.assert_allclose(lats32, lats, atol=1.0e-4)
+
+    x_new, y_new = lonlat_to_xy(lon=lons, lat=lats, crs=crs)
+    np.testing.assert_allclose(x_new, np.broadcast_to(x, (20, 30)), atol=1.0e-3)
+    np.testing.assert_allclose(
+        y_new, np.broadcast_to(y[:, None], (20, 30)), atol=1.0e-3
+    )
+
+
+def test_transform_between_projections():
+    crs_from, crs_to = CRSS
+    # the transformers are only created once per pair of projections
+    assert get_transformer(crs_from, crs_to) is get_transformer(crs_from, crs_to)
+
+    x, y = np.array([0.0, 1.0e5]), np.array([0.0, -2.0e5])
+    pts = crs_to.transform_points(crs_from, x, y)
+    x_new, y_new = transform(x=x, y=y, crs_from=crs_from, crs_to=crs_to)
+    np.testing.assert_allclose(x_new, pts[..., 0])
+    np.testing.assert_allclose(y_new, pts[..., 1])
+
+
+def test_xy_to_lonlat_rotated_pole():
+    # rotated-pole coordinates must be transformed to true lat/lon, rather
+    # than to the (rotated) geographic CRS the projection is defined in
+    crs = ccrs.RotatedPole(pole_longitude=-170.0, pole_latitude=40.0)
+    x = np.linspace(-10.0, 10.0, 5)
+    y = np.linspace(-5.0, 5.0, 4)
+
+    latlon_pts = ccrs.PlateCarree().transform_points(crs, *np.meshgrid(x, y))
+    lons, lats = xy_to_lonlat(x=x[None, :], y=y[:, None], crs=crs)
+    np.testing.assert_allclose(lons, latlon_pts[..., 0])
+    np.testing.assert_allclose(lats, latlon_pts[..., 1])
+
+    x_new, y_new = lonlat_to_xy(lon=lons, lat=lats, crs=crs)
+    np.testing.assert_allclose(x_new, np.broadcast_to(x, (4, 5)), atol=1.0e-8)
+    np.testing.assert_allclose(y_new, np.broadcast_to(y[:, None], (4, 5)), atol=1.0e-8)